@@ -5,36 +5,22 @@ import json
 from datetime import timedelta
 from functools import wraps
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from apps.core.models import City, Country, ContactMessage, ErrorLog, SiteSettings
-from apps.vendors.models import ServiceType, VendorProfile, VendorImage, VendorApplication, ContactView
+from apps.core.models import City, Country, ContactMessage, ErrorLog, RouteTiming, SiteSettings, SlowQuery
+from apps.vendors.models import ServiceType, VendorProfile, VendorImage, VendorApplication, SearchQueryLog
 from apps.projects.models import EventType, Project, ProjectNote
 from apps.ads.models import Advertisement
 
 
-def _admin_build_cities_json():
-    from apps.core.models import City
-    cities_by_country = {}
-    for c in City.objects.filter(is_active=True).select_related('country').order_by('name'):
-        if c.country_id:
-            cities_by_country.setdefault(str(c.country_id), []).append({'id': c.id, 'name': c.name})
-    return json.dumps(cities_by_country)
-
-
-def _admin_build_countries_list_json():
-    from apps.core.models import Country
-    return json.dumps([
-        {'id': c.id, 'name': str(c)}
-        for c in Country.objects.filter(is_active=True).order_by('display_order', 'name')
-    ])
-
-
 def admin_required(view_func):
     """Décorateur pour les vues admin."""
     @wraps(view_func)
@@ -237,11 +223,12 @@ def admin_dashboard(request):
 
     # Aperçu opérationnel
     recent_projects = Project.objects.filter(status='new').order_by('-created_at')[:10]
-    seven_days_ago = timezone.now() - timedelta(days=7)
+    # Compteurs journaliers (ContactViewDaily) : aujourd'hui et les six jours précédents
+    week_start = timezone.localdate() - timedelta(days=6)
     top_contacted_vendors = (
         VendorProfile.objects
         .filter(is_active=True)
-        .annotate(views_7d=Count('contact_views', filter=Q(contact_views__viewed_at__gte=seven_days_ago)))
+        .annotate(views_7d=Sum('contact_daily__count', filter=Q(contact_daily__date__gte=week_start)))
         .filter(views_7d__gt=0)
         .order_by('-views_7d')[:5]
     )
@@ -591,9 +578,12 @@ def vendor_detail(request, pk):
     for country in vendor.countries.order_by('display_order', 'name'):
         cities_by_country[country] = list(vendor.cities.filter(country=country).order_by('name'))
 
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    contact_views_total = vendor.contact_views.count()
-    contact_views_30d = vendor.contact_views.filter(viewed_at__gte=thirty_days_ago).count()
+    thirty_days_ago = timezone.localdate() - timedelta(days=29)
+    contact_views = vendor.contact_daily.aggregate(
+        total=Sum('count'), last_30d=Sum('count', filter=Q(date__gte=thirty_days_ago)),
+    )
+    contact_views_total = contact_views['total'] or 0
+    contact_views_30d = contact_views['last_30d'] or 0
 
     return render(request, 'accounts/admin/vendor_detail.html', {
         'vendor': vendor,
@@ -650,8 +640,6 @@ def vendor_create(request):
     return render(request, 'accounts/admin/vendor_form.html', {
         'service_types': service_types,
         'countries': countries,
-        'cities_json': _admin_build_cities_json(),
-        'countries_list_json': _admin_build_countries_list_json(),
         'existing_locations_json': '[]',
     })
 
@@ -710,8 +698,6 @@ def vendor_edit(request, pk):
         'vendor': vendor,
         'service_types': service_types,
         'countries': countries,
-        'cities_json': _admin_build_cities_json(),
-        'countries_list_json': _admin_build_countries_list_json(),
         'existing_locations_json': json.dumps(existing_groups),
     })
 
@@ -1054,7 +1040,96 @@ def error_log_detail(request, pk):
         log.is_resolved = not log.is_resolved
         log.save(update_fields=['is_resolved'])
         return redirect('accounts:admin_error_log_detail', pk=pk)
-    return render(request, 'accounts/admin/error_log_detail.html', {'log': log})
+    samples = [
+        {**sample, 'at': parse_datetime(sample.get('at') or '')}
+        for sample in reversed(log.samples)
+    ]
+    return render(request, 'accounts/admin/error_log_detail.html', {'log': log, 'samples': samples})
+
+
+# ========== PERFORMANCES ==========
+
+@admin_required
+def route_timing_report(request):
+    """
+    Latences par route sur la période choisie, comparées aux 7 jours précédents :
+    une route dont la moyenne augmente nettement après une mise en production ressort.
+    """
+    from apps.core.timing import summarize
+    try:
+        period_hours = int(request.GET.get('period', 24))
+    except ValueError:
+        period_hours = 24
+    if period_hours not in (1, 6, 24, 168):
+        period_hours = 24
+    now = timezone.now()
+    since = now - timedelta(hours=period_hours)
+    reference_since = since - timedelta(days=7)
+
+    current = summarize(RouteTiming.objects.filter(hour__gte=since.replace(minute=0, second=0, microsecond=0)))
+    reference = {
+        row['route']: row
+        for row in summarize(RouteTiming.objects.filter(hour__gte=reference_since, hour__lt=since))
+    }
+    for row in current:
+        previous = reference.get(row['route'])
+        row['reference'] = previous
+        row['regressed'] = bool(previous and row['mean_ms'] > previous['mean_ms'] * 1.25)
+    current.sort(key=lambda row: row['requests'], reverse=True)
+    return render(request, 'accounts/admin/route_timing_report.html', {
+        'period_hours': period_hours,
+        'cache_stats': cache.stats() if hasattr(cache, 'stats') else None,
+        'routes': current,
+        'total_requests': sum(row['requests'] for row in current),
+    })
+
+
+@admin_required
+def slow_query_report(request):
+    """Formes de requêtes SQL lentes, classées par temps cumulé ; POST remet les compteurs à zéro"""
+    if request.method == 'POST':
+        SlowQuery.objects.all().delete()
+        messages.success(request, 'Compteurs de requêtes lentes remis à zéro.')
+        return redirect('accounts:admin_slow_query_report')
+    queries = SlowQuery.objects.all()
+    route = request.GET.get('route', '')
+    if route:
+        queries = queries.filter(route=route)
+    return render(request, 'accounts/admin/slow_query_report.html', {
+        'queries': queries.order_by('-total_ms')[:100],
+        'routes': SlowQuery.objects.order_by('route').values_list('route', flat=True).distinct(),
+        'route': route,
+        'enabled': settings.SLOW_QUERY_THRESHOLD_MS is not None,
+        'threshold': settings.SLOW_QUERY_THRESHOLD_MS,
+    })
+
+
+# ========== RECHERCHES ==========
+
+@admin_required
+def search_report(request):
+    """Recherches les plus fréquentes et recherches sans résultat sur une période"""
+    try:
+        period_days = int(request.GET.get('period', 30))
+    except ValueError:
+        period_days = 30
+    if period_days not in (7, 30, 90, 365):
+        period_days = 30
+    logs = SearchQueryLog.objects.filter(searched_at__gte=timezone.now() - timedelta(days=period_days))
+
+    by_query = logs.values('normalized_query').annotate(
+        count=Count('id'),
+        zero_count=Count('id', filter=Q(results_count=0)),
+        last_searched=Max('searched_at'),
+        example=Max('query'),
+    )
+    return render(request, 'accounts/admin/search_report.html', {
+        'period_days': period_days,
+        'total_searches': logs.count(),
+        'zero_searches': logs.filter(results_count=0).count(),
+        'top_queries': by_query.order_by('-count', 'normalized_query')[:50],
+        'zero_queries': by_query.filter(zero_count__gt=0).order_by('-zero_count', 'normalized_query')[:50],
+    })
 
 
 # ========== MESSAGES PRESTATAIRES ==========
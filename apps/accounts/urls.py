@@ -75,10 +75,17 @@ urlpatterns = [
     path('admin/vendors/<int:pk>/messages/<int:msg_pk>/mark-read/', admin_views.vendor_message_mark_read, name='admin_vendor_message_mark_read'),
     path('admin/vendors/<int:pk>/messages/<int:msg_pk>/mark-processed/', admin_views.vendor_message_mark_processed, name='admin_vendor_message_mark_processed'),
 
+    # Recherches
+    path('admin/searches/', admin_views.search_report, name='admin_search_report'),
+
     # Journal d'erreurs
     path('admin/errors/', admin_views.error_log_list, name='admin_error_log_list'),
     path('admin/errors/<int:pk>/', admin_views.error_log_detail, name='admin_error_log_detail'),
 
+    # Performances
+    path('admin/performance/', admin_views.route_timing_report, name='admin_route_timing_report'),
+    path('admin/performance/sql/', admin_views.slow_query_report, name='admin_slow_query_report'),
+
     # Publicités
     path('admin/ads/', admin_views.ad_list, name='admin_ad_list'),
     path('admin/ads/create/', admin_views.ad_create, name='admin_ad_create'),
@@ -5,3 +5,6 @@ class AdsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.ads'
     verbose_name = 'Publicités'
+
+    def ready(self):
+        from . import signals  # noqa: F401
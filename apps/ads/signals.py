@@ -0,0 +1,16 @@
+"""
+Invalidation des publicités : les pages publiques qui les affichent s'en
+servent comme validateur HTTP (ETag)
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core.cache_utils import bump_ads_version
+from .models import Advertisement
+
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def advertisement_changed(sender, **kwargs):
+    transaction.on_commit(bump_ads_version)
@@ -0,0 +1,162 @@
+"""
+Tampon d'écritures groupées : les lignes s'accumulent en mémoire dans le worker
+et sont écrites en une fois (bulk_create) toutes les N entrées ou après un délai.
+Évite une écriture en base par requête pour les journaux à fort volume.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Tous les tampons du processus, pour discard_all
+_buffers = weakref.WeakSet()
+
+
+class BulkBuffer:
+    """
+    `flush_func(items)` reçoit la liste des éléments accumulés.
+
+    Vidé quand il atteint `max_size` éléments, par un thread démon toutes les
+    `max_age` secondes, et à l'arrêt du worker. Le thread est démarré à la
+    première entrée dans chaque processus (gunicorn charge l'application avant
+    de forker les workers : un thread créé dans le maître n'existerait pas chez eux).
+    Perdre quelques entrées lors d'un arrêt brutal est accepté.
+    """
+
+    def __init__(self, flush_func, max_size=100, max_age=30):
+        self.flush_func = flush_func
+        self.max_size = max_size
+        self.max_age = max_age
+        self._items = self._new_items()
+        self._lock = threading.Lock()
+        self._oldest = None
+        self._pid = None
+        _buffers.add(self)
+
+    def add(self, item):
+        with self._lock:
+            self._ensure_worker()
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.append(item)
+            full = len(self._items) >= self.max_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            items, self._items = self._items, self._new_items()
+            self._oldest = None
+        if not items:
+            return 0
+        try:
+            self.flush_func(list(self._values(items)))
+        except Exception:
+            logger.exception('Échec du vidage de %d entrée(s) tamponnée(s)', len(items))
+            self._failed(items)
+            return 0
+        return len(items)
+
+    def _failed(self, items):
+        """Éléments d'un vidage en échec : abandonnés (voir MergingBuffer)"""
+
+    def discard(self):
+        """Abandonne les éléments en attente sans les écrire"""
+        with self._lock:
+            self._items = self._new_items()
+            self._oldest = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def _new_items(self):
+        return []
+
+    def _values(self, items):
+        return items
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._items = self._new_items()
+        thread = threading.Thread(target=self._run, name='bulk-buffer', daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.max_age)
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.max_age:
+                self.flush()
+                # Le thread a sa propre connexion : ne pas la laisser ouverte entre deux vidages
+                connections.close_all()
+
+
+class MergingBuffer(BulkBuffer):
+    """
+    Variante qui fusionne les entrées de même clé : `add(clé, élément)` appelle
+    `merge_func(existant, élément)` si la clé est déjà en attente. La taille
+    (et le coût du vidage) dépend du nombre de clés distinctes, pas du nombre
+    d'ajouts ; `flush_func` reçoit la liste des éléments fusionnés.
+
+    Après un vidage en échec, les éléments sont refusionnés dans le tampon et
+    réécrits au vidage suivant, pas avant `max_age` secondes (la base est
+    peut-être injoignable) ; au-delà de MAX_PENDING_FACTOR × `max_size` clés en
+    attente, le lot en échec est abandonné pour borner la mémoire.
+    """
+
+    MAX_PENDING_FACTOR = 10
+
+    def __init__(self, flush_func, merge_func, max_size=100, max_age=30):
+        super().__init__(flush_func, max_size=max_size, max_age=max_age)
+        self.merge_func = merge_func
+        self._retry_at = 0.0
+
+    def add(self, key, item):
+        with self._lock:
+            self._ensure_worker()
+            if not self._items:
+                self._oldest = time.monotonic()
+            if key in self._items:
+                self._items[key] = self.merge_func(self._items[key], item)
+            else:
+                self._items[key] = item
+            full = len(self._items) >= self.max_size and time.monotonic() >= self._retry_at
+        if full:
+            self.flush()
+
+    def _failed(self, items):
+        with self._lock:
+            now = time.monotonic()
+            self._retry_at = now + self.max_age
+            if len(items) + len(self._items) > self.max_size * self.MAX_PENDING_FACTOR:
+                logger.error('%d entrée(s) abandonnée(s) après un vidage en échec', len(items))
+                return
+            # Les éléments en échec sont les plus anciens : les ajouts faits depuis s'y fusionnent
+            for key, item in self._items.items():
+                items[key] = self.merge_func(items[key], item) if key in items else item
+            self._items = items
+            self._oldest = now
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _new_items(self):
+        return {}
+
+    def _values(self, items):
+        return items.values()
+
+
+def discard_all():
+    """Vide tous les tampons sans écrire (fin des tests : voir apps/core/test_runner.py)"""
+    for buffer in list(_buffers):
+        buffer.discard()
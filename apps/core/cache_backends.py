@@ -0,0 +1,235 @@
+"""
+Cache à deux niveaux : un LRU en mémoire du worker (L1) devant le cache
+partagé entre les workers (L2, un autre alias de CACHES).
+
+Seules les clés dont le préfixe est déclaré passent par L1 :
+- LOCAL_PREFIXES : données lues à chaque requête et rarement modifiées
+  (types de services, versions du catalogue…). Toute écriture d'une de ces
+  clés change la « génération » stockée dans L2 ; chaque worker la relit au
+  plus une fois par GENERATION_INTERVAL secondes et vide son L1 si elle a
+  changé. Une modification est donc visible partout en une seconde environ ;
+- IMMUTABLE_PREFIXES : clés dont la valeur ne change jamais (elles contiennent
+  déjà une version ou un chemin de fichier). Pas d'invalidation à propager.
+
+Les autres clés (compteurs de débit, résultats de recherche…) vont directement
+à L2. Une entrée de L1 expire au plus tard après L1_TIMEOUT secondes. Les
+valeurs de L1 ne sont pas copiées : elles doivent être traitées en lecture seule.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.core.cache_backends.TwoTierCache',
+            'LOCATION': 'lysangels-l1',
+            'OPTIONS': {'L2': 'shared', 'LOCAL_PREFIXES': [...], ...},
+        },
+        'shared': {...},
+    }
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+GENERATION_KEY = 'two_tier_cache_generation'
+_MISSING = object()
+
+# État L1 partagé par les threads d'un worker, par LOCATION (comme LocMemCache)
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class _Tier:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.next_check = 0.0
+        self.hits = {'l1': 0, 'l2': 0, 'miss': 0}
+
+
+class TwoTierCache(BaseCache):
+    """LRU local (L1) devant l'alias de cache OPTIONS['L2'] ; voir la docstring du module"""
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS') or {})
+        self._l2_alias = options.pop('L2')
+        self._local_prefixes = tuple(options.pop('LOCAL_PREFIXES', ()))
+        self._immutable_prefixes = tuple(options.pop('IMMUTABLE_PREFIXES', ()))
+        self._prefixes = self._local_prefixes + self._immutable_prefixes
+        self._l1_timeout = float(options.pop('L1_TIMEOUT', 300))
+        self._generation_interval = float(options.pop('GENERATION_INTERVAL', 1))
+        # MAX_ENTRIES (taille de L1), KEY_PREFIX, VERSION… : lus par BaseCache
+        super().__init__({**params, 'OPTIONS': options})
+        with _tiers_lock:
+            self._tier = _tiers.setdefault(location, _Tier())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # --- L1 ---
+
+    def _is_local(self, key):
+        return key.startswith(self._prefixes)
+
+    def _l1_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _check_generation(self):
+        """Vide L1 si un autre worker a modifié une clé LOCAL_PREFIXES (une lecture de L2 par intervalle)"""
+        tier = self._tier
+        now = time.monotonic()
+        if now < tier.next_check:
+            return
+        tier.next_check = now + self._generation_interval
+        generation = self.l2.get(GENERATION_KEY)
+        if generation != tier.generation:
+            with tier.lock:
+                tier.entries.clear()
+                tier.generation = generation
+
+    def _l1_get(self, l1_key):
+        tier = self._tier
+        with tier.lock:
+            entry = tier.entries.get(l1_key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del tier.entries[l1_key]
+                return False, None
+            tier.entries.move_to_end(l1_key)
+            return True, value
+
+    def _l1_set(self, l1_key, value, timeout):
+        timeout = self._l1_timeout if timeout is None else min(timeout, self._l1_timeout)
+        tier = self._tier
+        with tier.lock:
+            tier.entries[l1_key] = (time.monotonic() + timeout, value)
+            tier.entries.move_to_end(l1_key)
+            while len(tier.entries) > self._max_entries:
+                tier.entries.popitem(last=False)
+
+    def _l1_delete(self, l1_key):
+        with self._tier.lock:
+            self._tier.entries.pop(l1_key, None)
+
+    def _written(self, items, version, timeout=DEFAULT_TIMEOUT):
+        """
+        Après une écriture dans L2 : met à jour L1 ({clé: valeur}, None pour une
+        suppression) et, si une clé LOCAL_PREFIXES a changé, prévient les autres workers
+        """
+        invalidate = False
+        for key, value in items.items():
+            if not self._is_local(key):
+                continue
+            l1_key = self._l1_key(key, version)
+            if value is None:
+                self._l1_delete(l1_key)
+            else:
+                self._l1_set(l1_key, value, self.get_backend_timeout(timeout))
+            invalidate = invalidate or key.startswith(self._local_prefixes)
+        if invalidate:
+            self.l2.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+    def stats(self):
+        """Lectures servies par L1, par L2 et manquées depuis le démarrage du worker (compteurs approximatifs)"""
+        hits = dict(self._tier.hits)
+        total = sum(hits.values()) or 1
+        return {
+            **hits,
+            'entries': len(self._tier.entries),
+            'l1_ratio': hits['l1'] / total,
+            'l2_ratio': hits['l2'] / total,
+        }
+
+    # --- API du cache ---
+
+    def get(self, key, default=None, version=None):
+        local = self._is_local(key)
+        if local:
+            self._check_generation()
+            found, value = self._l1_get(self._l1_key(key, version))
+            if found:
+                self._tier.hits['l1'] += 1
+                return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._tier.hits['miss'] += 1
+            return default
+        self._tier.hits['l2'] += 1
+        if local:
+            self._l1_set(self._l1_key(key, version), value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remote = {}, []
+        if any(self._is_local(key) for key in keys):
+            self._check_generation()
+        for key in keys:
+            if self._is_local(key):
+                hit, value = self._l1_get(self._l1_key(key, version))
+                if hit:
+                    self._tier.hits['l1'] += 1
+                    found[key] = value
+                    continue
+            remote.append(key)
+        if remote:
+            values = self.l2.get_many(remote, version=version)
+            for key in remote:
+                if key not in values:
+                    self._tier.hits['miss'] += 1
+                    continue
+                self._tier.hits['l2'] += 1
+                if self._is_local(key):
+                    self._l1_set(self._l1_key(key, version), values[key], None)
+            found.update(values)
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._written({key: value}, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        self._written({key: value for key, value in data.items() if key not in failed}, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._written({key: value}, version, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        self._written({key: value}, version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        self._written({key: None}, version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        self._written(dict.fromkeys(keys), version)
+
+    def clear(self):
+        self.l2.clear()
+        with self._tier.lock:
+            self._tier.entries.clear()
+            self._tier.generation = None
+            self._tier.next_check = 0.0
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
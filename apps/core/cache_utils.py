@@ -1,45 +1,261 @@
 """
-Utilitaires de cache pour les données de référence
-Les types de services et événements changent rarement, on peut les mettre en cache
+Utilitaires de cache : versions partagées entre les workers et jeux de données
+de référence.
+
+Un jeu de données (`cached_dataset`) déclare les modèles dont il dépend ; toute
+écriture sur l'un d'eux (post_save, post_delete, m2m_changed, branchés par
+`connect_datasets` au démarrage) change sa version après le commit. La clé de
+cache contient la version : les données peuvent donc rester en cache plusieurs
+jours sans jamais être servies périmées.
 """
+import re
+import threading
+import uuid
+from functools import wraps
+
+from django.apps import apps
 from django.core.cache import cache
-from apps.vendors.models import ServiceType
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from apps.core.models import SiteSettings, VersionCounter
 from apps.projects.models import EventType
+from apps.vendors.models import ServiceType
 
 
-def get_cached_service_types(ordered=True):
+CATALOGUE_VERSION_KEY = 'catalogue_version'
+ADS_VERSION_KEY = 'ads_version'
+
+
+_VERSION_RE = re.compile(r'\d+\.[0-9a-f]{12}')
+
+
+def _new_version(sequence=0):
+    return f'{sequence}.{uuid.uuid4().hex[:12]}'
+
+
+def is_version(value):
+    """Vrai si `value` a le format d'une version ('12.ab34cd56ef78'), par exemple lue dans un curseur"""
+    return bool(_VERSION_RE.fullmatch(value))
+
+
+def version_sequence(version):
+    """Numéro d'ordre d'une version ('12.ab34…' → 12), None pour une version d'un autre format"""
+    try:
+        return int(str(version).split('.', 1)[0])
+    except ValueError:
+        return None
+
+
+def get_version(key):
     """
-    Récupère les types de services depuis le cache (durée: 1 heure)
-    Si pas en cache, requête DB et mise en cache
+    Version courante d'un ensemble de données, partagée entre les workers via
+    le cache : chaque worker compare sa copie locale à cette valeur pour savoir
+    s'il doit reconstruire ce qu'il en a dérivé
     """
-    cache_key = 'service_types_ordered' if ordered else 'service_types'
-    service_types = cache.get(cache_key)
-    
-    if service_types is None:
-        if ordered:
-            service_types = list(ServiceType.objects.all().order_by('name'))
-        else:
-            service_types = list(ServiceType.objects.all())
-        
-        # Cache pour 1 heure (3600 secondes)
-        cache.set(cache_key, service_types, 3600)
-    
-    return service_types
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
 
 
-def get_cached_event_types():
+def _next_sequence(key):
+    """Incrémente le compteur de `key` (table VersionCounter) et retourne sa nouvelle valeur"""
+    with transaction.atomic():
+        VersionCounter.objects.bulk_create([VersionCounter(key=key)], ignore_conflicts=True)
+        counter = VersionCounter.objects.filter(key=key)
+        # L'UPDATE verrouille la ligne jusqu'au commit : la lecture suivante voit notre valeur
+        counter.update(value=F('value') + 1)
+        return counter.values_list('value', flat=True).get()
+
+
+def bump_version(key):
+    """
+    Nouvelle version, numérotée par un compteur en base partagé par tous les
+    workers : la version N suit exactement la version N - 1, même si deux
+    workers changent la donnée au même moment (voir search_index.apply_change)
     """
-    Récupère les types d'événements depuis le cache (durée: 1 heure)
-    Si pas en cache, requête DB et mise en cache
+    version = _new_version(_next_sequence(key))
+    cache.set(key, version, None)
+    return version
+
+
+def get_catalogue_version():
+    """Version du catalogue (prestataires, images, types de services)"""
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    """Invalide toutes les données dérivées du catalogue, dans tous les workers"""
+    return bump_version(CATALOGUE_VERSION_KEY)
+
+
+def get_reference_version():
+    """Version des données de référence (pays, villes, types de services et d'événements)"""
+    return reference_data.version()
+
+
+def bump_reference_version():
+    return reference_data.invalidate()
+
+
+def get_ads_version():
+    """Version des publicités (toute création, modification ou suppression)"""
+    return get_version(ADS_VERSION_KEY)
+
+
+def bump_ads_version():
+    return bump_version(ADS_VERSION_KEY)
+
+
+def versioned_memo(version_func):
+    """
+    Décorateur : mémorise le résultat de `builder()` dans le worker courant et le
+    reconstruit seulement quand `version_func()` change.
+    Adapté aux structures dérivées (tries, index, projections) lues à chaque requête.
     """
-    event_types = cache.get('event_types')
+    def decorator(builder):
+        state = {'version': None, 'value': None}
+        lock = threading.Lock()
+
+        @wraps(builder)
+        def wrapper():
+            version = version_func()
+            if state['version'] != version:
+                with lock:
+                    if state['version'] != version:
+                        state['value'] = builder()
+                        state['version'] = version
+            return state['value']
+
+        def cache_clear():
+            state['version'] = None
+            state['value'] = None
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+# ========== JEUX DE DONNÉES DÉCLARÉS ==========
 
-    if event_types is None:
-        event_types = list(EventType.objects.all().order_by('name'))
-        cache.set('event_types', event_types, 3600)
+DATASET_TIMEOUT = 60 * 60 * 24 * 7
 
-    return event_types
+_datasets = {}
+
+
+class CachedDataset:
+    """
+    Données dérivées de quelques modèles, en cache sous `dataset:<nom>:<version>`.
+    Sans `builder`, seule la version est tenue (validateurs HTTP, mémos locaux).
+    """
+
+    def __init__(self, name, depends_on, builder=None, timeout=DATASET_TIMEOUT):
+        self.name = name
+        self.depends_on = tuple(depends_on)
+        self.builder = builder
+        self.timeout = timeout
+        self.version_key = f'{name}_version'
+
+    def version(self):
+        return get_version(self.version_key)
+
+    def invalidate(self):
+        return bump_version(self.version_key)
+
+    def __call__(self):
+        key = f'dataset:{self.name}:{self.version()}'
+        value = cache.get(key)
+        if value is None:
+            value = self.builder()
+            cache.set(key, value, self.timeout)
+        return value
+
+    def __repr__(self):
+        return f'<CachedDataset {self.name}>'
+
+
+def register_dataset(name, depends_on, builder=None, timeout=DATASET_TIMEOUT):
+    """`depends_on` : libellés de modèles ('vendors.ServiceType'), résolus par connect_datasets"""
+    if name in _datasets:
+        raise ValueError(f'Jeu de données déjà déclaré : {name!r}')
+    dataset = _datasets[name] = CachedDataset(name, depends_on, builder, timeout)
+    return dataset
+
+
+def cached_dataset(name, depends_on, timeout=DATASET_TIMEOUT):
+    """Décorateur : la fonction décorée construit le jeu de données, l'appel le lit depuis le cache"""
+    def decorator(builder):
+        return wraps(builder)(register_dataset(name, depends_on, builder, timeout))
+    return decorator
+
+
+def datasets_for(model):
+    return [dataset for dataset in _datasets.values() if model._meta.label in dataset.depends_on]
+
+
+# Table intermédiaire M2M → modèle qui déclare le champ
+_m2m_owners = {}
+
+
+def _invalidate(model):
+    for dataset in datasets_for(model):
+        transaction.on_commit(dataset.invalidate)
+
+
+def _model_changed(sender, **kwargs):
+    _invalidate(sender)
+
+
+def _m2m_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        _invalidate(_m2m_owners[sender])
+
+
+def connect_datasets():
+    """Branche les signaux de tous les modèles dont dépend un jeu de données (CoreConfig.ready)"""
+    labels = {label for dataset in _datasets.values() for label in dataset.depends_on}
+    for label in sorted(labels):
+        model = apps.get_model(label)
+        post_save.connect(_model_changed, sender=model, dispatch_uid=f'cached_dataset:{label}')
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=f'cached_dataset:{label}')
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            _m2m_owners[through] = model
+            m2m_changed.connect(_m2m_changed, sender=through, dispatch_uid=f'cached_dataset:{label}.{field.name}')
+
+
+reference_data = register_dataset(
+    'reference', ['core.Country', 'core.City', 'vendors.ServiceType', 'projects.EventType'],
+)
+
+
+@cached_dataset('service_types', ['vendors.ServiceType'])
+def _service_types():
+    return list(ServiceType.objects.order_by('name'))
+
+
+@cached_dataset('event_types', ['projects.EventType'])
+def get_cached_event_types():
+    """Types d'événements par nom, en cache jusqu'à la prochaine modification"""
+    return list(EventType.objects.order_by('name'))
+
+
+@cached_dataset('site_settings', ['core.SiteSettings'])
+def get_site_settings():
+    """Paramètres du site (singleton), en cache jusqu'à la prochaine modification"""
+    return SiteSettings.get()
+
+
+def get_cached_service_types(ordered=True):
+    """
+    Types de services par nom, en cache jusqu'à la prochaine modification
+    (`ordered` est conservé pour les appelants : la liste est toujours triée)
+    """
+    return _service_types()
 
 
-def clear_reference_cache():
-    cache.delete_many(['service_types_ordered', 'service_types', 'event_types'])
+catalogue_memo = versioned_memo(get_catalogue_version)
+reference_memo = versioned_memo(get_reference_version)
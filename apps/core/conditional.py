@@ -0,0 +1,48 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified → 304) pour les pages publiques.
+
+Réservées aux visiteurs anonymes sans message en attente : la page ne dépend
+alors que des données publiques décrites par le validateur. Les réponses
+sont marquées « private, no-cache » : le navigateur garde la page mais la
+revalide à chaque visite, et un cache partagé ne la stocke pas.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache_utils import get_ads_version, get_catalogue_version, get_reference_version
+
+
+def public_pages_version():
+    """
+    Ce qui change toutes les pages publiques : catalogue, données de référence,
+    publicités, et la date du jour (une publicité commence ou expire à minuit)
+    """
+    return ':'.join([
+        get_catalogue_version(), get_reference_version(), get_ads_version(),
+        timezone.localdate().isoformat(),
+    ])
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def public_condition(etag_func=None, last_modified_func=None):
+    """Comme django.views.decorators.http.condition, pour les visiteurs anonymes seulement"""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -19,8 +19,8 @@ def unresolved_errors(request):
 
 def global_stats(request):
     try:
-        from apps.vendors.models import VendorProfile
-        count = VendorProfile.objects.filter(is_active=True).count()
+        from apps.vendors.cards import get_vendor_cards
+        count = len(get_vendor_cards())
     except Exception:
         count = 0
     return {'vendor_count': count}
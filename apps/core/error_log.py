@@ -0,0 +1,128 @@
+"""
+Journal d'erreurs regroupé par empreinte.
+
+L'empreinte d'une exception est son type et la pile d'appels normalisée
+(fichier relatif au projet ou au paquet, nom de fonction ; sans numéros de
+ligne, qui changent à chaque modification du fichier). Chaque empreinte n'a
+qu'une ligne ErrorLog : compteur d'occurrences, première et dernière
+apparition, et les dernières requêtes concernées (SAMPLE_SIZE au plus).
+
+Les occurrences sont fusionnées en mémoire dans chaque worker puis écrites
+par lots : une panne qui fait échouer toutes les requêtes (base injoignable)
+coûte une écriture par erreur distincte et par vidage, pas une par requête.
+"""
+import hashlib
+import re
+import traceback as tb
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .buffers import MergingBuffer
+from .models import ErrorLog
+
+
+SAMPLE_SIZE = 10
+
+_LIBRARY_PREFIX = re.compile(r'^.*?[/\\](?:site-packages|dist-packages|lib[/\\]python\d+(?:\.\d+)?)[/\\]')
+_TRACEBACK_FRAME = re.compile(r'^  File "(?P<filename>[^"]+)", line \d+, in (?P<name>.+)$', re.MULTILINE)
+
+
+def _normalize_path(filename):
+    """Chemin indépendant de la machine : relatif au projet, au paquet installé ou à la bibliothèque standard"""
+    filename = filename.replace('\\', '/')
+    base_dir = str(settings.BASE_DIR).replace('\\', '/').rstrip('/') + '/'
+    if filename.startswith(base_dir):
+        return filename[len(base_dir):]
+    return _LIBRARY_PREFIX.sub('', filename)
+
+
+def fingerprint(error_type, frames):
+    """Empreinte (sha1) d'un type d'exception et d'une pile de couples (fichier, fonction)"""
+    signature = '\n'.join([error_type] + [f'{_normalize_path(filename)}:{name}' for filename, name in frames])
+    return hashlib.sha1(signature.encode()).hexdigest()
+
+
+def exception_fingerprint(exception):
+    frames = tb.extract_tb(exception.__traceback__)
+    return fingerprint(type(exception).__name__, [(frame.filename, frame.name) for frame in frames])
+
+
+def traceback_fingerprint(error_type, text):
+    """Même empreinte, à partir d'un traceback déjà formaté (lignes enregistrées avant le regroupement)"""
+    return fingerprint(error_type, [(m['filename'], m['name']) for m in _TRACEBACK_FRAME.finditer(text)])
+
+
+def _merge(pending, entry):
+    pending['count'] += entry['count']
+    pending['last_seen'] = entry['last_seen']
+    pending['error_message'] = entry['error_message']
+    pending['samples'] = (pending['samples'] + entry['samples'])[-SAMPLE_SIZE:]
+    return pending
+
+
+def _save(entries):
+    existing = ErrorLog.objects.in_bulk([entry['fingerprint'] for entry in entries], field_name='fingerprint')
+    for entry in entries:
+        latest = entry['samples'][-1]
+        log = existing.get(entry['fingerprint'])
+        if log is None:
+            try:
+                with transaction.atomic():
+                    ErrorLog.objects.create(
+                        fingerprint=entry['fingerprint'],
+                        error_type=entry['error_type'],
+                        error_message=entry['error_message'],
+                        traceback=entry['traceback'],
+                        occurrences=entry['count'],
+                        first_seen=entry['first_seen'],
+                        last_seen=entry['last_seen'],
+                        samples=entry['samples'],
+                        url=latest['url'], method=latest['method'],
+                        ip_address=latest['ip'], user_agent=latest['user_agent'],
+                    )
+                continue
+            except IntegrityError:
+                # Créée entre-temps par un autre worker
+                log = ErrorLog.objects.get(fingerprint=entry['fingerprint'])
+        # Une erreur qui revient après avoir été marquée résolue est rouverte
+        ErrorLog.objects.filter(pk=log.pk).update(
+            occurrences=F('occurrences') + entry['count'],
+            last_seen=entry['last_seen'],
+            error_message=entry['error_message'],
+            traceback=entry['traceback'] or log.traceback,
+            samples=(log.samples + entry['samples'])[-SAMPLE_SIZE:],
+            url=latest['url'], method=latest['method'],
+            ip_address=latest['ip'], user_agent=latest['user_agent'],
+            is_resolved=False,
+        )
+
+
+buffer = MergingBuffer(_save, _merge, max_size=50, max_age=15)
+
+
+def capture_exception(request, exception):
+    """Compte une occurrence de `exception` levée pendant `request` (écrite au prochain vidage)"""
+    key = exception_fingerprint(exception)
+    now = timezone.now()
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR')
+    buffer.add(key, {
+        'fingerprint': key,
+        'error_type': type(exception).__name__[:200],
+        'error_message': str(exception)[:1000],
+        # Formaté une seule fois par empreinte et par vidage
+        'traceback': '' if key in buffer else ''.join(tb.format_exception(exception)),
+        'count': 1,
+        'first_seen': now,
+        'last_seen': now,
+        'samples': [{
+            'at': now.isoformat(),
+            'url': request.path[:500],
+            'method': request.method,
+            'ip': ip,
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+        }],
+    })
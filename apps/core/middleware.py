@@ -1,37 +1,51 @@
-import traceback as tb
+import random
+
 from django.conf import settings
-from django.core.cache import cache
+from django.db import connection
 from django.http import HttpResponse
 
+from . import slow_queries, timing
+from .ratelimit import FixedWindow, RateLimiter, SlidingWindow, TokenBucket
+
 
+# Chemin → (méthodes limitées, algorithme), par IP
 _RATE_LIMITS = {
-    '/accounts/login/':                              (5,  5 * 60),
-    '/projects/creer/':                              (10, 60 * 60),
-    '/contact/':                                     (20, 60 * 60),
-    '/vendors/devenir-prestataire/candidature/':     (10, 60 * 60),
+    '/accounts/login/':                              (('POST',), SlidingWindow(5, 5 * 60)),
+    '/projects/creer/':                              (('POST',), FixedWindow(10, 60 * 60)),
+    '/contact/':                                     (('POST',), FixedWindow(20, 60 * 60)),
+    '/vendors/devenir-prestataire/candidature/':     (('POST',), FixedWindow(10, 60 * 60)),
+    # Autocomplétion : appelée à chaque frappe, mais pas par rafales de robot
+    '/vendors/recherche/suggestions/':               (('GET',), TokenBucket(rate=5, capacity=30)),
 }
 
 
 class RateLimitMiddleware:
+    """
+    Limites par route et par IP (apps/core/ratelimit.py). Seules les routes
+    listées paient un accès au magasin de compteurs ; les autres, une
+    recherche dans un dictionnaire.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.rules = {
+            path: (frozenset(methods), RateLimiter(path, algorithm))
+            for path, (methods, algorithm) in _RATE_LIMITS.items()
+        }
 
     def __call__(self, request):
-        if request.method == 'POST':
-            rule = _RATE_LIMITS.get(request.path)
-            if rule:
-                limit, window = rule
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR', '')
-                key = f'rl:{request.path}:{ip}'
-                count = cache.get(key, 0)
-                if count >= limit:
-                    return HttpResponse('Trop de tentatives. Veuillez réessayer plus tard.', status=429)
-                cache.set(key, count + 1, timeout=window)
+        rule = self.rules.get(request.path)
+        if rule and request.method in rule[0]:
+            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+            ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR', '')
+            if not rule[1].hit(ip):
+                return HttpResponse('Trop de tentatives. Veuillez réessayer plus tard.', status=429)
         return self.get_response(request)
 
 
 class ErrorLoggingMiddleware:
+    """Compte les exceptions non gérées dans le journal d'erreurs (apps/core/error_log.py)"""
+
     def __init__(self, get_response):
         self.get_response = get_response
 
@@ -42,18 +56,40 @@ class ErrorLoggingMiddleware:
         if settings.DEBUG:
             return None
         try:
-            from .models import ErrorLog
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR')
-            ErrorLog.objects.create(
-                url=request.path[:500],
-                method=request.method,
-                error_type=type(exception).__name__,
-                error_message=str(exception)[:1000],
-                traceback=tb.format_exc(),
-                ip_address=ip,
-                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
-            )
+            from .error_log import capture_exception
+            capture_exception(request, exception)
         except Exception:
             pass
         return None
+
+
+class ServerTimingMiddleware:
+    """
+    Durée totale, SQL et gabarits de chaque requête (apps/core/timing.py) :
+    en-tête Server-Timing pour les administrateurs, histogrammes par route
+    pour une fraction des requêtes, requêtes SQL lentes si
+    SLOW_QUERY_THRESHOLD_MS est défini. À placer en tête de MIDDLEWARE pour que
+    la durée couvre les autres middlewares ; l'utilisateur n'est consulté
+    qu'une fois la réponse prête.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measures, token = timing.start()
+        try:
+            with connection.execute_wrapper(measures):
+                response = self.get_response(request)
+        finally:
+            timing.stop(token)
+
+        user = getattr(request, 'user', None)
+        if user is not None and timing.is_admin(user):
+            response['Server-Timing'] = measures.header()
+        match = request.resolver_match
+        if measures.slow_queries:
+            slow_queries.record(match.view_name if match else '', measures.slow_queries)
+        if match and match.view_name and random.random() < getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.1):
+            timing.record(match.view_name, measures)
+        return response
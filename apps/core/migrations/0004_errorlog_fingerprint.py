@@ -0,0 +1,120 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:20
+
+import hashlib
+import re
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée de apps/core/error_log.py au moment de la migration
+SAMPLE_SIZE = 10
+LIBRARY_PREFIX = re.compile(
+    r"^.*?[/\\](?:site-packages|dist-packages|lib[/\\]python\d+(?:\.\d+)?)[/\\]"
+)
+TRACEBACK_FRAME = re.compile(
+    r'^  File "(?P<filename>[^"]+)", line \d+, in (?P<name>.+)$', re.MULTILINE
+)
+
+
+def normalize_path(filename):
+    filename = filename.replace("\\", "/")
+    base_dir = str(settings.BASE_DIR).replace("\\", "/").rstrip("/") + "/"
+    if filename.startswith(base_dir):
+        return filename[len(base_dir) :]
+    return LIBRARY_PREFIX.sub("", filename)
+
+
+def traceback_fingerprint(error_type, text):
+    frames = [
+        f"{normalize_path(m['filename'])}:{m['name']}"
+        for m in TRACEBACK_FRAME.finditer(text)
+    ]
+    return hashlib.sha1("\n".join([error_type] + frames).encode()).hexdigest()
+
+
+def group_by_fingerprint(apps, schema_editor):
+    """Regroupe les lignes existantes par empreinte : la plus récente est gardée"""
+    ErrorLog = apps.get_model("core", "ErrorLog")
+    groups = {}
+    for log in ErrorLog.objects.order_by("first_seen", "pk").iterator():
+        groups.setdefault(
+            traceback_fingerprint(log.error_type, log.traceback), []
+        ).append(log)
+    for fingerprint, logs in groups.items():
+        latest = logs[-1]
+        latest.fingerprint = fingerprint
+        latest.occurrences = len(logs)
+        latest.last_seen = latest.first_seen
+        latest.first_seen = logs[0].first_seen
+        latest.samples = [
+            {
+                "at": log.first_seen.isoformat(),
+                "url": log.url,
+                "method": log.method,
+                "ip": log.ip_address,
+                "user_agent": log.user_agent,
+            }
+            for log in logs[-SAMPLE_SIZE:]
+        ]
+        latest.is_resolved = all(log.is_resolved for log in logs)
+        latest.save()
+        ErrorLog.objects.filter(pk__in=[log.pk for log in logs[:-1]]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_add_site_settings"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="errorlog",
+            old_name="occurred_at",
+            new_name="first_seen",
+        ),
+        migrations.AlterField(
+            model_name="errorlog",
+            name="first_seen",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AddField(
+            model_name="errorlog",
+            name="last_seen",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AddField(
+            model_name="errorlog",
+            name="occurrences",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="errorlog",
+            name="samples",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="errorlog",
+            name="fingerprint",
+            field=models.CharField(default="", max_length=40),
+            preserve_default=False,
+        ),
+        migrations.RunPython(group_by_fingerprint, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="errorlog",
+            name="fingerprint",
+            field=models.CharField(max_length=40, unique=True),
+        ),
+        migrations.AlterModelOptions(
+            name="errorlog",
+            options={
+                "ordering": ["-last_seen"],
+                "verbose_name": "Erreur",
+                "verbose_name_plural": "Erreurs",
+            },
+        ),
+    ]
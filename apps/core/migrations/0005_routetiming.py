@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_errorlog_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RouteTiming",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("route", models.CharField(max_length=200)),
+                ("hour", models.DateTimeField(db_index=True)),
+                ("requests", models.PositiveIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0)),
+                ("db_ms", models.FloatField(default=0)),
+                ("db_queries", models.PositiveIntegerField(default=0)),
+                ("template_ms", models.FloatField(default=0)),
+                ("histogram", models.JSONField(default=list)),
+            ],
+            options={
+                "verbose_name": "Latence par route",
+                "verbose_name_plural": "Latences par route",
+                "ordering": ["-hour", "route"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("route", "hour"), name="route_timing_hour_unique"
+                    )
+                ],
+            },
+        ),
+    ]
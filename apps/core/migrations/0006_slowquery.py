@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_routetiming"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=40)),
+                ("route", models.CharField(blank=True, max_length=200)),
+                ("sql", models.TextField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0)),
+                ("max_ms", models.FloatField(default=0)),
+                ("first_seen", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_seen", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Requête lente",
+                "verbose_name_plural": "Requêtes lentes",
+                "ordering": ["-total_ms"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("fingerprint", "route"),
+                        name="slow_query_shape_route_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_slowquery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VersionCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100, unique=True)),
+                ("value", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Compteur de versions",
+                "verbose_name_plural": "Compteurs de versions",
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Country(models.Model):
@@ -116,8 +117,16 @@ class ContactMessage(models.Model):
 
 
 class ErrorLog(models.Model):
-    """Erreurs applicatives capturées en production"""
-    occurred_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    """
+    Erreurs applicatives capturées en production, une ligne par empreinte
+    (type + pile d'appels, voir apps/core/error_log.py). url, method, ip_address
+    et user_agent décrivent la dernière occurrence ; `samples` les plus récentes.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True)
+    first_seen = models.DateTimeField(default=timezone.now, db_index=True)
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    samples = models.JSONField(default=list, blank=True)
     url = models.CharField(max_length=500)
     method = models.CharField(max_length=10)
     error_type = models.CharField(max_length=200, db_index=True)
@@ -130,12 +139,72 @@ class ErrorLog(models.Model):
     class Meta:
         verbose_name = 'Erreur'
         verbose_name_plural = 'Erreurs'
-        ordering = ['-occurred_at']
+        ordering = ['-last_seen']
 
     def __str__(self):
-        return f"{self.error_type} — {self.url} ({self.occurred_at:%d/%m/%Y %H:%M})"
+        return f"{self.error_type} — {self.url} ({self.last_seen:%d/%m/%Y %H:%M}, ×{self.occurrences})"
 
 
+class RouteTiming(models.Model):
+    """Latences échantillonnées d'une route sur une heure (apps/core/timing.py)"""
+    route = models.CharField(max_length=200)
+    hour = models.DateTimeField(db_index=True)
+    requests = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    db_ms = models.FloatField(default=0)
+    db_queries = models.PositiveIntegerField(default=0)
+    template_ms = models.FloatField(default=0)
+    # Nombre de requêtes par classe de durée (timing.LATENCY_BUCKETS, puis au-delà)
+    histogram = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = 'Latence par route'
+        verbose_name_plural = 'Latences par route'
+        ordering = ['-hour', 'route']
+        constraints = [
+            models.UniqueConstraint(fields=['route', 'hour'], name='route_timing_hour_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.route} ({self.hour:%d/%m/%Y %H}h, {self.requests} requêtes)"
+
+
+class SlowQuery(models.Model):
+    """Requêtes SQL lentes d'une même forme dans une même vue (apps/core/slow_queries.py)"""
+    fingerprint = models.CharField(max_length=40)
+    route = models.CharField(max_length=200, blank=True)
+    sql = models.TextField()
+    count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Requête lente'
+        verbose_name_plural = 'Requêtes lentes'
+        ordering = ['-total_ms']
+        constraints = [
+            models.UniqueConstraint(fields=['fingerprint', 'route'], name='slow_query_shape_route_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.route or '—'} : {self.sql[:80]} (×{self.count})"
+
+
+
+class VersionCounter(models.Model):
+    """Numéro de la dernière version d'un ensemble de données en cache (apps/core/cache_utils.py)"""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Compteur de versions'
+        verbose_name_plural = 'Compteurs de versions'
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
 class SiteSettings(models.Model):
     """Paramètres globaux du site — singleton (une seule ligne, pk=1)."""
     admin_notify_email = models.EmailField(
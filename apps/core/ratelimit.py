@@ -0,0 +1,220 @@
+"""
+Limitation de débit partagée entre les workers, sans requête à la base principale.
+
+Un limiteur associe un algorithme à un magasin de compteurs :
+
+- algorithmes : fenêtre fixe, fenêtre glissante (deux fenêtres fixes, la
+  précédente pondérée par la part qui recouvre encore la dernière période),
+  seau à jetons (GCRA : une seule date « théorique » par clé) ;
+- magasins : le cache Django (cache.add + cache.incr, atomiques avec LocMem,
+  Redis ou Memcached) ou un petit fichier SQLite partagé par les workers
+  (WAL, une seule instruction UPSERT … RETURNING par coup), à préférer avec
+  FileBasedCache dont incr n'est pas atomique.
+
+Le magasin par défaut se choisit avec le setting RATELIMIT_STORE ('cache' ou 'sqlite').
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class CacheStore:
+    """Compteurs dans le cache Django"""
+
+    def incr(self, key, ttl):
+        cache.add(key, 0, ttl)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expiré entre add et incr
+            cache.add(key, 1, ttl)
+            return 1
+
+    def decr(self, key):
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+    def get(self, key):
+        return cache.get(key, 0)
+
+    def take(self, key, interval, capacity, now):
+        """Seau à jetons (GCRA) ; le cache n'a pas de compare-and-set : verrou court par clé"""
+        lock = f'{key}:lock'
+        for _ in range(10):
+            if cache.add(lock, 1, 1):
+                break
+            time.sleep(0.001)
+        else:
+            return False
+        try:
+            tat = max(cache.get(key, now), now) + interval
+            if tat - now > capacity * interval:
+                return False
+            cache.set(key, tat, int(capacity * interval) + 1)
+            return True
+        finally:
+            cache.delete(lock)
+
+
+class SQLiteStore:
+    """
+    Compteurs dans un fichier SQLite local, partagé par les workers d'une même
+    machine. Chaque opération est une instruction atomique ; une connexion par
+    thread et par processus (gunicorn forke après le chargement de l'application).
+    """
+
+    PURGE_PROBABILITY = 0.001
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS counters '
+                '(key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires REAL NOT NULL) WITHOUT ROWID'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(key TEXT PRIMARY KEY, tat REAL NOT NULL, expires REAL NOT NULL) WITHOUT ROWID'
+            )
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _maybe_purge(self, connection, now):
+        if random.random() < self.PURGE_PROBABILITY:
+            connection.execute('DELETE FROM counters WHERE expires < ?', (now,))
+            connection.execute('DELETE FROM buckets WHERE expires < ?', (now,))
+
+    def incr(self, key, ttl):
+        now = time.time()
+        connection = self._connection()
+        self._maybe_purge(connection, now)
+        return connection.execute(
+            'INSERT INTO counters (key, value, expires) VALUES (?1, 1, ?2 + ?3) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = CASE WHEN expires < ?2 THEN 1 ELSE value + 1 END, '
+            'expires = CASE WHEN expires < ?2 THEN ?2 + ?3 ELSE expires END '
+            'RETURNING value',
+            (key, now, ttl),
+        ).fetchone()[0]
+
+    def decr(self, key):
+        self._connection().execute('UPDATE counters SET value = value - 1 WHERE key = ? AND value > 0', (key,))
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expires >= ?', (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def take(self, key, interval, capacity, now):
+        # La mise à jour n'a lieu (et ne retourne une ligne) que si un jeton est disponible
+        row = self._connection().execute(
+            'INSERT INTO buckets (key, tat, expires) VALUES (?1, ?2 + ?3, ?2 + ?3 * ?4) '
+            'ON CONFLICT (key) DO UPDATE SET tat = max(tat, ?2) + ?3, expires = ?2 + ?3 * ?4 '
+            'WHERE max(tat, ?2) + ?3 - ?2 <= ?3 * ?4 '
+            'RETURNING tat',
+            (key, now, interval, capacity),
+        ).fetchone()
+        return row is not None
+
+
+class FixedWindow:
+    """`limit` coups par fenêtre de `window` secondes, remise à zéro à chaque fenêtre"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+
+    def allow(self, store, key, now):
+        bucket = int(now // self.window)
+        return store.incr(f'{key}:{bucket}', self.window) <= self.limit
+
+    def release(self, store, key, now):
+        """Annule le coup compté par allow (coup refusé qui ne doit pas compter)"""
+        store.decr(f'{key}:{int(now // self.window)}')
+
+
+class SlidingWindow(FixedWindow):
+    """`limit` coups sur les `window` dernières secondes (approximation à deux compteurs)"""
+
+    def allow(self, store, key, now):
+        bucket, elapsed = divmod(now, self.window)
+        # Le compteur courant sert encore de « précédent » pendant la fenêtre suivante
+        count = store.incr(f'{key}:{int(bucket)}', self.window * 2)
+        previous = store.get(f'{key}:{int(bucket) - 1}')
+        return previous * (1 - elapsed / self.window) + count <= self.limit
+
+
+class TokenBucket:
+    """`rate` coups par seconde en régime continu, rafales de `capacity` coups"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+    def allow(self, store, key, now):
+        return store.take(key, 1 / self.rate, self.capacity, now)
+
+    def release(self, store, key, now):
+        # Un coup refusé ne prend pas de jeton
+        pass
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name=None):
+    """Magasin partagé du processus : 'cache' ou 'sqlite' (RATELIMIT_SQLITE_PATH)"""
+    name = name or getattr(settings, 'RATELIMIT_STORE', 'cache')
+    if name not in _stores:
+        with _stores_lock:
+            if name not in _stores:
+                if name == 'sqlite':
+                    path = getattr(settings, 'RATELIMIT_SQLITE_PATH', settings.BASE_DIR / '.ratelimit.sqlite3')
+                    _stores[name] = SQLiteStore(path)
+                elif name == 'cache':
+                    _stores[name] = CacheStore()
+                else:
+                    raise ValueError(f'RATELIMIT_STORE inconnu : {name!r}')
+    return _stores[name]
+
+
+class RateLimiter:
+    """
+    Limiteur nommé : `hit(clé)` compte un coup et retourne False s'il dépasse la
+    limite. Par défaut les coups refusés comptent aussi (un client qui insiste
+    reste bloqué) ; avec count_rejected=False, seuls les coups acceptés comptent.
+    """
+
+    def __init__(self, name, algorithm, store=None, count_rejected=True):
+        self.name = name
+        self.algorithm = algorithm
+        self._store = store
+        self.count_rejected = count_rejected
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        store, key = self.store, f'rl:{self.name}:{key}'
+        allowed = self.algorithm.allow(store, key, now)
+        if not allowed and not self.count_rejected:
+            self.algorithm.release(store, key, now)
+        return allowed
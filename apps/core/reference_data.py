@@ -0,0 +1,52 @@
+"""
+Données de référence des formulaires et filtres (pays, villes par pays, types
+de services et d'événements), sérialisées une fois par version en un seul
+fichier JSON servi depuis une URL contenant son empreinte : les pages le
+référencent au lieu de l'intégrer, et le navigateur le garde en cache.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from django.urls import reverse
+
+from apps.core.cache_utils import reference_memo
+from apps.core.models import City, Country
+from apps.projects.models import EventType
+from apps.vendors.models import ServiceType
+
+
+ReferenceBundle = namedtuple('ReferenceBundle', ['digest', 'content', 'data'])
+
+
+def build_reference_data():
+    cities = {}
+    for pk, name, country_id in City.objects.filter(
+        is_active=True, country__isnull=False,
+    ).order_by('name').values_list('pk', 'name', 'country_id'):
+        cities.setdefault(str(country_id), []).append({'id': pk, 'name': name})
+    return {
+        'countries': [
+            {'id': c.id, 'name': str(c)}
+            for c in Country.objects.filter(is_active=True).order_by('display_order', 'name')
+        ],
+        'cities': cities,
+        'service_types': [
+            {'id': pk, 'name': name} for pk, name in ServiceType.objects.order_by('name').values_list('pk', 'name')
+        ],
+        'event_types': [
+            {'id': pk, 'name': name} for pk, name in EventType.objects.order_by('name').values_list('pk', 'name')
+        ],
+    }
+
+
+@reference_memo
+def get_reference_bundle():
+    """(empreinte, JSON encodé, données) de la version courante, calculé une fois par worker"""
+    data = build_reference_data()
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    return ReferenceBundle(hashlib.md5(content).hexdigest()[:12], content, data)
+
+
+def reference_data_url():
+    return reverse('core:reference_data', args=[get_reference_bundle().digest])
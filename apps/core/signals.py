@@ -0,0 +1,8 @@
+"""
+Invalidation des jeux de données en cache (apps/core/cache_utils.py) : chacun
+déclare ses modèles, les signaux sont branchés ici une fois tous déclarés
+"""
+from apps.core.cache_utils import connect_datasets
+
+
+connect_datasets()
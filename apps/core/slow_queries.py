@@ -0,0 +1,90 @@
+"""
+Requêtes SQL lentes, regroupées par forme de requête et par vue.
+
+Activé par le setting SLOW_QUERY_THRESHOLD_MS (durée minimale en ms ; 0 pour
+tout enregistrer, None pour désactiver). La durée de chaque requête est déjà
+mesurée par l'execute_wrapper de ServerTimingMiddleware (apps/core/timing.py) :
+celles qui dépassent le seuil sont gardées avec la requête HTTP, puis comptées
+à la fin de celle-ci sous le nom de la vue.
+
+La forme d'une requête est son SQL sans littéraux (chaînes, nombres,
+paramètres → ?) et avec les listes IN (…) et VALUES (…), (…) réduites : les
+requêtes qui ne diffèrent que par leurs valeurs sont regroupées. Les totaux
+sont fusionnés en mémoire et écrits par lots (SlowQuery).
+"""
+import hashlib
+import re
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .buffers import MergingBuffer
+from .models import SlowQuery
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_ROWS = re.compile(r'\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Forme d'une requête : littéraux et paramètres remplacés par ?, listes réduites"""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_ROWS.sub('VALUES (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _merge(pending, entry):
+    pending['count'] += entry['count']
+    pending['total_ms'] += entry['total_ms']
+    pending['max_ms'] = max(pending['max_ms'], entry['max_ms'])
+    pending['last_seen'] = entry['last_seen']
+    return pending
+
+
+def _save(entries):
+    # Lignes manquantes créées à zéro ; un autre worker peut créer la même au même moment
+    SlowQuery.objects.bulk_create([
+        SlowQuery(
+            fingerprint=entry['fingerprint'], route=entry['route'], sql=entry['sql'],
+            first_seen=entry['first_seen'], last_seen=entry['last_seen'],
+        )
+        for entry in entries
+    ], ignore_conflicts=True)
+    with transaction.atomic():
+        for entry in entries:
+            SlowQuery.objects.filter(fingerprint=entry['fingerprint'], route=entry['route']).update(
+                count=F('count') + entry['count'],
+                total_ms=F('total_ms') + entry['total_ms'],
+                max_ms=Greatest(F('max_ms'), entry['max_ms']),
+                last_seen=entry['last_seen'],
+            )
+
+
+buffer = MergingBuffer(_save, _merge, max_size=200, max_age=60)
+
+
+def record(route, queries):
+    """Compte les requêtes lentes [(sql, durée en ms)] d'une requête HTTP servie par `route`"""
+    now = timezone.now()
+    for sql, duration in queries:
+        shape = normalize(sql)
+        key = hashlib.sha1(shape.encode()).hexdigest()
+        buffer.add((key, route), {
+            'fingerprint': key,
+            'route': route,
+            'sql': shape[:10000],
+            'count': 1,
+            'total_ms': duration,
+            'max_ms': duration,
+            'first_seen': now,
+            'last_seen': now,
+        })
@@ -0,0 +1,11 @@
+from django import template
+
+from apps.core.reference_data import reference_data_url as _reference_data_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def reference_data_url():
+    """URL versionnée du fichier de données de référence (pays, villes, services, événements)"""
+    return _reference_data_url()
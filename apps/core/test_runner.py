@@ -0,0 +1,17 @@
+"""
+Lanceur de tests du projet (setting TEST_RUNNER).
+
+Les requêtes des tests remplissent les tampons d'écriture (latences
+échantillonnées, journaux…) ; ils sont vidés sans écrire avant la suppression
+des bases de test, sinon le vidage à l'arrêt du processus (atexit) les
+écrirait dans la base configurée, celle de développement.
+"""
+from django.test.runner import DiscoverRunner
+
+from .buffers import discard_all
+
+
+class BufferSafeDiscoverRunner(DiscoverRunner):
+    def teardown_databases(self, old_config, **kwargs):
+        discard_all()
+        super().teardown_databases(old_config, **kwargs)
@@ -1,6 +1,29 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
 from django.test import TestCase
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from apps.core.error_log import (
+    buffer as error_log_buffer, capture_exception, exception_fingerprint, traceback_fingerprint,
+)
+from apps.core.buffers import MergingBuffer
+from apps.core.cache_backends import TwoTierCache
+from apps.core.cache_utils import (
+    DATASET_TIMEOUT, bump_version, cached_dataset, connect_datasets, get_cached_event_types,
+    get_cached_service_types, get_reference_version, get_site_settings, version_sequence,
+)
+from apps.core.models import City, Country, ErrorLog, RouteTiming, SlowQuery
+from apps.core.slow_queries import buffer as slow_query_buffer, normalize
+from apps.core.timing import _save as timing_save, buffer as timing_buffer, summarize
+from apps.core.ratelimit import CacheStore, FixedWindow, RateLimiter, SlidingWindow, SQLiteStore, TokenBucket
+from apps.core.reference_data import get_reference_bundle, reference_data_url
 from apps.core.validators import (
     validate_file_mime_type,
     validate_image_file,
@@ -99,3 +122,463 @@ class MIMETypeDetectionTests(TestCase):
         )
         with self.assertRaises(ValidationError):
             validate_image_file(fake_image)
+
+
+class ReferenceDataTests(TestCase):
+    """Tests pour le fichier versionné des données de référence"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.togo = Country.objects.create(name='Togo', code='TG')
+            City.objects.create(name='Lomé', country=self.togo)
+
+    def test_bundle_is_served_with_long_cache_and_etag(self):
+        response = self.client.get(reference_data_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        data = json.loads(response.content)
+        self.assertEqual(data['cities'][str(self.togo.pk)][0]['name'], 'Lomé')
+
+        response = self.client.get(reference_data_url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_city_changes_the_url(self):
+        old_url = reference_data_url()
+        with self.captureOnCommitCallbacks(execute=True):
+            City.objects.create(name='Kara', country=self.togo)
+        self.assertNotEqual(reference_data_url(), old_url)
+        response = self.client.get(old_url)
+        self.assertRedirects(response, reference_data_url(), fetch_redirect_response=False)
+
+    def test_bundle_is_built_once_per_version(self):
+        get_reference_bundle()
+        with self.assertNumQueries(0):
+            get_reference_bundle()
+
+
+class CachedDatasetTests(TestCase):
+    """Tests pour les jeux de données invalidés par leurs modèles"""
+
+    def test_version_sequence_survives_cache_clear(self):
+        first = version_sequence(bump_version('test_version'))
+        cache.clear()
+        self.assertEqual(version_sequence(bump_version('test_version')), first + 1)
+
+    def test_service_types_follow_model_changes(self):
+        from apps.vendors.models import ServiceType
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ServiceType.objects.create(name='Photographe')
+        self.assertIn('Photographe', [s.name for s in get_cached_service_types()])
+        with self.assertNumQueries(0):
+            get_cached_service_types()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.name = 'Photographie'
+            photo.save()
+        self.assertEqual([s.name for s in get_cached_service_types()].count('Photographie'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+        self.assertNotIn('Photographie', [s.name for s in get_cached_service_types()])
+
+    def test_only_dependent_datasets_are_invalidated(self):
+        from apps.projects.models import EventType
+        get_cached_service_types()
+        reference, settings_version = get_reference_version(), get_site_settings.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            EventType.objects.create(name='Baptême')
+        self.assertIn('Baptême', [e.name for e in get_cached_event_types()])
+        self.assertNotEqual(get_reference_version(), reference)
+        self.assertEqual(get_site_settings.version(), settings_version)
+        with self.assertNumQueries(0):
+            get_cached_service_types()
+
+    def test_site_settings(self):
+        self.assertEqual(get_site_settings().admin_notify_email, '')
+        with self.captureOnCommitCallbacks(execute=True):
+            settings_obj = get_site_settings()
+            settings_obj.admin_notify_email = 'admin@example.com'
+            settings_obj.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_site_settings().admin_notify_email, 'admin@example.com')
+        self.assertEqual(get_site_settings.timeout, DATASET_TIMEOUT)
+
+    def test_m2m_changes_invalidate(self):
+        from apps.core import cache_utils
+        from apps.vendors.models import ServiceType, VendorApplication
+        applications = cached_dataset('test_application_services', ['vendors.VendorApplication'])(
+            lambda: list(VendorApplication.service_types.through.objects.values_list('pk', flat=True))
+        )
+        self.addCleanup(cache_utils._datasets.pop, 'test_application_services')
+        connect_datasets()
+        with self.captureOnCommitCallbacks(execute=True):
+            application = VendorApplication.objects.create(name='Ama', description='DJ')
+            dj = ServiceType.objects.create(name='DJ')
+        self.assertEqual(applications(), [])
+
+        # Un ajout M2M, sans save() de la candidature, change la version
+        with self.captureOnCommitCallbacks(execute=True):
+            application.service_types.add(dj)
+        self.assertEqual(len(applications()), 1)
+
+
+class RateLimiterTests(TestCase):
+    """Tests pour les limiteurs de débit, avec les deux magasins de compteurs"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.stores = {'cache': CacheStore(), 'sqlite': SQLiteStore(Path(tmp.name) / 'rl.sqlite3')}
+
+    def _limiter(self, algorithm, **kwargs):
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                yield RateLimiter(f'test-{self._testMethodName}-{name}', algorithm, store, **kwargs)
+
+    def test_fixed_window(self):
+        for limiter in self._limiter(FixedWindow(3, 60)):
+            self.assertEqual([limiter.hit('a', now=6000 + i) for i in range(4)], [True, True, True, False])
+            self.assertTrue(limiter.hit('b', now=6003))
+            self.assertTrue(limiter.hit('a', now=6060))
+
+    def test_sliding_window_weighs_previous_window(self):
+        for limiter in self._limiter(SlidingWindow(4, 60)):
+            for i in range(4):
+                limiter.hit('a', now=6000 + i)
+            # Un quart de la fenêtre suivante écoulé : 4 × 0,75 = 3 coups encore comptés
+            self.assertTrue(limiter.hit('a', now=6075))
+            self.assertFalse(limiter.hit('a', now=6076))
+            # Fenêtre précédente presque sortie : 2 × 0,02 + 2 < 4
+            self.assertTrue(limiter.hit('a', now=6119))
+
+    def test_rejected_hits_can_be_left_uncounted(self):
+        for counted in (True, False):
+            for limiter in self._limiter(SlidingWindow(2, 60), count_rejected=counted):
+                key = f'a-{counted}'
+                for i in range(7):
+                    limiter.hit(key, now=6000 + i)
+                # Mi-fenêtre suivante : 2 × 0,5 + 1 ≤ 2 si les 5 refus n'ont pas compté
+                self.assertEqual(limiter.hit(key, now=6090), not counted)
+
+    def test_token_bucket_allows_bursts_then_rate(self):
+        for limiter in self._limiter(TokenBucket(rate=2, capacity=3)):
+            self.assertEqual([limiter.hit('a', now=100.0) for _ in range(4)], [True, True, True, False])
+            # Un jeton toutes les 0,5 s
+            self.assertFalse(limiter.hit('a', now=100.4))
+            self.assertTrue(limiter.hit('a', now=100.5))
+            self.assertFalse(limiter.hit('a', now=100.6))
+            self.assertTrue(limiter.hit('b', now=100.6))
+
+    def test_sqlite_counters_are_atomic_across_threads(self):
+        limiter = RateLimiter('test-threads', FixedWindow(50, 60), self.stores['sqlite'])
+        results = []
+
+        def worker():
+            results.extend(limiter.hit('a', now=6000) for _ in range(20))
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 50)
+
+
+class RateLimitMiddlewareTests(TestCase):
+    """Tests pour les limites par route"""
+
+    def test_get_route_is_limited_per_ip(self):
+        url = '/vendors/recherche/suggestions/'
+        statuses = [self.client.get(url, {'q': 'dj'}, REMOTE_ADDR='10.2.0.1').status_code for _ in range(60)]
+        # Rafale de 30, puis 5 par seconde
+        self.assertEqual(statuses[:30], [200] * 30)
+        self.assertIn(429, statuses)
+        self.assertEqual(self.client.get(url, {'q': 'dj'}, REMOTE_ADDR='10.2.0.2').status_code, 200)
+
+    def test_only_listed_methods_are_counted(self):
+        for _ in range(25):
+            self.assertNotEqual(self.client.get('/contact/', REMOTE_ADDR='10.2.0.3').status_code, 429)
+
+
+def _fail(value):
+    raise ValueError(f'valeur invalide : {value}')
+
+
+def _fail_elsewhere():
+    raise KeyError('absent')
+
+
+class ErrorLogTests(TestCase):
+    """Tests pour le regroupement des erreurs par empreinte"""
+
+    def setUp(self):
+        error_log_buffer.flush()
+        self.addCleanup(error_log_buffer.flush)
+        self.factory = RequestFactory()
+
+    def _capture(self, func, *args, path='/x/'):
+        try:
+            func(*args)
+        except Exception as exc:
+            capture_exception(self.factory.get(path, REMOTE_ADDR='10.3.0.1'), exc)
+            return exc
+
+    def test_fingerprint_ignores_message_and_line_numbers(self):
+        first, second = self._capture(_fail, 1), self._capture(_fail, 2)
+        self.assertEqual(exception_fingerprint(first), exception_fingerprint(second))
+        self.assertNotEqual(exception_fingerprint(first), exception_fingerprint(self._capture(_fail_elsewhere)))
+        moved = 'Traceback (most recent call last):\n  File "{}", line {}, in _fail\n'
+        self.assertEqual(
+            traceback_fingerprint('ValueError', moved.format(__file__, 10)),
+            traceback_fingerprint('ValueError', moved.format(__file__, 250)),
+        )
+
+    def test_storm_is_one_row_per_fingerprint(self):
+        for i in range(40):
+            self._capture(_fail, i, path=f'/page/{i}/')
+        self._capture(_fail_elsewhere)
+        self.assertEqual(ErrorLog.objects.count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            error_log_buffer.flush()
+        self.assertLess(len(queries), 10)
+
+        log = ErrorLog.objects.get(error_type='ValueError')
+        self.assertEqual(log.occurrences, 40)
+        self.assertEqual(log.url, '/page/39/')
+        self.assertEqual(len(log.samples), 10)
+        self.assertEqual(log.samples[-1]['url'], '/page/39/')
+        self.assertIn('_fail', log.traceback)
+        self.assertEqual(ErrorLog.objects.get(error_type='KeyError').occurrences, 1)
+
+    def test_failed_flush_is_merged_back(self):
+        saved, available = [], [False]
+
+        def save(items):
+            if not available[0]:
+                raise DatabaseError('base injoignable')
+            saved.extend(items)
+        buffer = MergingBuffer(save, lambda pending, item: pending + item, max_size=100, max_age=60)
+        buffer.add('a', 1)
+        buffer.add('b', 1)
+        with self.assertLogs('apps.core.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.add('a', 2)
+        available[0] = True
+        self.assertEqual(buffer.flush(), 2)
+        self.assertCountEqual(saved, [3, 1])
+
+    def test_recurrence_updates_row_and_reopens(self):
+        self._capture(_fail, 1)
+        error_log_buffer.flush()
+        log = ErrorLog.objects.get()
+        log.is_resolved = True
+        log.save()
+
+        self._capture(_fail, 2)
+        self._capture(_fail, 3)
+        error_log_buffer.flush()
+        log.refresh_from_db()
+        self.assertEqual(log.occurrences, 3)
+        self.assertFalse(log.is_resolved)
+        self.assertGreaterEqual(log.last_seen, log.first_seen)
+        self.assertEqual(log.error_message, 'valeur invalide : 3')
+
+
+class ServerTimingTests(TestCase):
+    """Tests pour l'en-tête Server-Timing et les latences par route"""
+
+    def setUp(self):
+        from apps.accounts.models import User
+        timing_buffer.flush()
+        self.addCleanup(timing_buffer.flush)
+        self.admin = User.objects.create_user(username='timing_admin', password='Pass123!', user_type='admin')
+
+    def test_header_only_for_admins(self):
+        response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+
+        self.client.login(username='timing_admin', password='Pass123!')
+        header = self.client.get('/').headers['Server-Timing']
+        self.assertRegex(header, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="SQL \(\d+ requêtes\)", tpl;dur=[\d.]+')
+        # Le rendu de la page est mesuré
+        self.assertNotRegex(header, r'tpl;dur=0\.0;')
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_sampled_requests_feed_route_histogram(self):
+        for _ in range(3):
+            self.client.get('/')
+        self.client.get('/page-inexistante/')
+        timing_buffer.flush()
+
+        timing = RouteTiming.objects.get()
+        self.assertEqual(timing.route, 'core:home')
+        self.assertEqual(timing.requests, 3)
+        self.assertEqual(sum(timing.histogram), 3)
+        self.assertGreater(timing.db_queries, 0)
+
+        self.client.get('/')
+        timing_buffer.flush()
+        [summary] = summarize(RouteTiming.objects.all())
+        self.assertEqual(summary['requests'], 4)
+        self.assertIsNotNone(summary['p95'])
+
+    def test_save_adds_to_rows_created_by_another_worker(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        RouteTiming.objects.create(route='core:home', hour=hour, requests=2, total_ms=40, histogram=[0, 2] + [0] * 8)
+        entry = {
+            'hour': hour, 'requests': 1, 'total_ms': 30.0, 'db_ms': 5.0, 'db_queries': 2, 'template_ms': 10.0,
+            'histogram': [0, 0, 1] + [0] * 7,
+        }
+        timing_save([{**entry, 'route': 'core:home'}, {**entry, 'route': 'core:contact'}])
+        home = RouteTiming.objects.get(route='core:home')
+        self.assertEqual((home.requests, home.total_ms, home.histogram), (3, 70, [0, 2, 1] + [0] * 7))
+        self.assertEqual(RouteTiming.objects.get(route='core:contact').histogram, entry['histogram'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_report_page(self):
+        RouteTiming.objects.create(
+            route='vendors:vendor_list', hour=timezone.now(), requests=10, total_ms=1200,
+            db_ms=300, db_queries=40, template_ms=500, histogram=[0, 0, 0, 5, 5, 0, 0, 0, 0, 0],
+        )
+        self.client.login(username='timing_admin', password='Pass123!')
+        response = self.client.get('/accounts/admin/performance/')
+        self.assertContains(response, 'vendors:vendor_list')
+        self.assertEqual(response.context['routes'][0]['p50'], 100)
+        self.assertEqual(response.context['routes'][0]['p95'], 250)
+
+
+class SlowQueryTests(TestCase):
+    """Tests pour l'enregistrement des requêtes SQL lentes"""
+
+    def setUp(self):
+        slow_query_buffer.flush()
+        self.addCleanup(slow_query_buffer.flush)
+
+    def test_normalize_strips_literals_and_lists(self):
+        self.assertEqual(
+            normalize('SELECT "a"."id" FROM "a" WHERE "a"."name" = \'O\'\'Neil\' AND "a"."n" > 42 LIMIT 21'),
+            'SELECT "a"."id" FROM "a" WHERE "a"."name" = ? AND "a"."n" > ? LIMIT ?',
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM "t3" WHERE "t3"."id" IN (%s, %s,\n %s)'),
+            normalize('SELECT * FROM "t3" WHERE "t3"."id" IN (%s)'),
+        )
+        self.assertEqual(
+            normalize('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (...)',
+        )
+
+    def test_disabled_by_default(self):
+        self.client.get('/')
+        self.assertEqual(len(slow_query_buffer), 0)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_queries_aggregated_per_shape_and_view(self):
+        for _ in range(2):
+            self.client.get('/')
+        self.assertGreater(len(slow_query_buffer), 0)
+        with CaptureQueriesContext(connection) as queries:
+            slow_query_buffer.flush()
+        # Un INSERT groupé, puis un UPDATE par forme dans une transaction (SAVEPOINT / RELEASE)
+        self.assertLessEqual(len(queries), SlowQuery.objects.count() + 3)
+
+        self.assertEqual(set(SlowQuery.objects.values_list('route', flat=True)), {'core:home'})
+        # Mêmes requêtes aux deux visites : une ligne par forme, comptée deux fois
+        top = SlowQuery.objects.order_by('-count').first()
+        self.assertEqual(top.count % 2, 0)
+        self.assertGreaterEqual(top.total_ms, top.max_ms)
+
+        self.client.get('/')
+        slow_query_buffer.flush()
+        top.refresh_from_db()
+        self.assertEqual(top.count % 3, 0)
+
+    def test_row_created_by_another_worker_keeps_its_counts(self):
+        now = timezone.now()
+        SlowQuery.objects.create(
+            fingerprint='y' * 40, route='core:home', sql='SELECT ?', count=2, total_ms=30, max_ms=20,
+        )
+        slow_query_buffer.add(('y' * 40, 'core:home'), {
+            'fingerprint': 'y' * 40, 'route': 'core:home', 'sql': 'SELECT ?', 'count': 1,
+            'total_ms': 25, 'max_ms': 25, 'first_seen': now, 'last_seen': now,
+        })
+        slow_query_buffer.flush()
+        row = SlowQuery.objects.get()
+        self.assertEqual((row.count, row.total_ms, row.max_ms), (3, 55, 25))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_report_page(self):
+        from apps.accounts.models import User
+        User.objects.create_user(username='sql_admin', password='Pass123!', user_type='admin')
+        SlowQuery.objects.create(
+            fingerprint='x' * 40, route='vendors:vendor_list', sql='SELECT ?', count=3, total_ms=90, max_ms=50,
+        )
+        self.client.login(username='sql_admin', password='Pass123!')
+        response = self.client.get('/accounts/admin/performance/sql/')
+        self.assertContains(response, 'vendors:vendor_list')
+        self.assertEqual(response.context['queries'][0].route, 'vendors:vendor_list')
+
+        self.client.post('/accounts/admin/performance/sql/')
+        self.assertFalse(SlowQuery.objects.exclude(route='accounts:admin_slow_query_report').exists())
+
+
+class TwoTierCacheTests(TestCase):
+    """Tests pour le cache à deux niveaux (L2 : le cache LocMem des tests)"""
+
+    def _cache(self, location):
+        return TwoTierCache(location, {'OPTIONS': {
+            'L2': 'default',
+            'LOCAL_PREFIXES': ['ref:'],
+            'IMMUTABLE_PREFIXES': ['grid:'],
+            'MAX_ENTRIES': 3,
+            'GENERATION_INTERVAL': 60,
+        }})
+
+    def setUp(self):
+        from django.core.cache import caches
+        self.l2 = caches['default']
+        self.l2.clear()
+        self.addCleanup(self.l2.clear)
+        self.worker = self._cache(f'{self._testMethodName}-a')
+        self.other = self._cache(f'{self._testMethodName}-b')
+
+    def test_local_keys_are_served_from_memory(self):
+        self.worker.set('ref:types', ['dj', 'traiteur'])
+        self.assertEqual(self.other.get('ref:types'), ['dj', 'traiteur'])
+        # Retirée de L2 : encore servie par L1
+        self.l2.delete('ref:types')
+        self.assertEqual(self.other.get('ref:types'), ['dj', 'traiteur'])
+        stats = self.other.stats()
+        self.assertEqual((stats['l1'], stats['l2']), (1, 1))
+
+    def test_other_keys_bypass_memory(self):
+        self.worker.set('rl:x', 1)
+        self.assertEqual(self.worker.incr('rl:x'), 2)
+        self.assertEqual(self.other.get('rl:x'), 2)
+        self.l2.delete('rl:x')
+        self.assertIsNone(self.worker.get('rl:x'))
+        self.assertEqual(self.worker.stats()['entries'], 0)
+
+    def test_writes_invalidate_other_workers_after_generation_check(self):
+        self.assertEqual(self.other.get('ref:version', 'absent'), 'absent')
+        self.worker.set('ref:version', 'v1')
+        self.assertEqual(self.other.get('ref:version'), 'v1')
+        self.worker.set('ref:version', 'v2')
+        # La génération n'est relue qu'après GENERATION_INTERVAL
+        self.assertEqual(self.other.get('ref:version'), 'v1')
+        self.other._tier.next_check = 0
+        self.assertEqual(self.other.get('ref:version'), 'v2')
+
+    def test_immutable_keys_do_not_bump_generation(self):
+        self.worker.set_many({'grid:a': '<ul/>', 'grid:b': '<ol/>'})
+        self.assertIsNone(self.l2.get('two_tier_cache_generation'))
+        self.assertEqual(self.other.get_many(['grid:a', 'grid:b', 'grid:c']), {'grid:a': '<ul/>', 'grid:b': '<ol/>'})
+
+    def test_lru_is_bounded(self):
+        for key in ('grid:1', 'grid:2', 'grid:3'):
+            self.worker.set(key, key)
+        self.worker.get('grid:1')
+        self.worker.set('grid:4', 'grid:4')
+        self.assertEqual(self.worker.stats()['entries'], 3)
+        self.l2.clear()
+        # grid:2, le moins récemment lu, a été évincé
+        self.assertEqual(self.worker.get_many(['grid:1', 'grid:2', 'grid:3', 'grid:4']),
+                         {'grid:1': 'grid:1', 'grid:3': 'grid:3', 'grid:4': 'grid:4'})
@@ -0,0 +1,217 @@
+"""
+Mesure du temps de réponse par requête : durée totale, rendu des gabarits,
+nombre et durée des requêtes SQL.
+
+- Les requêtes SQL sont comptées par `connection.execute_wrapper`, sans DEBUG ;
+  les plus lentes sont gardées pour apps/core/slow_queries.py.
+- Le rendu des gabarits est chronométré par le moteur TimedDjangoTemplates
+  (settings.TEMPLATES) : seuls les rendus de premier niveau sont comptés, un
+  gabarit rendu depuis un autre ne l'est pas deux fois.
+- Les administrateurs reçoivent les mesures dans l'en-tête Server-Timing
+  (onglet Réseau des outils de développement du navigateur).
+- Une fraction des requêtes (SERVER_TIMING_SAMPLE_RATE) alimente des
+  histogrammes de latence par route et par heure (RouteTiming), écrits par lots.
+"""
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+from .buffers import MergingBuffer
+from .models import RouteTiming
+
+
+# Bornes supérieures des classes de l'histogramme, en ms ; une dernière classe au-delà
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+RETENTION_DAYS = 30
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Mesures d'une requête en cours ; s'installe comme execute_wrapper de la connexion"""
+
+    __slots__ = (
+        'start', 'db_queries', 'db_time', 'template_time', 'template_depth', 'slow_threshold', 'slow_queries',
+    )
+
+    def __init__(self, slow_threshold=None):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # Seuil en ms au-delà duquel une requête SQL est gardée (apps/core/slow_queries.py)
+        self.slow_threshold = slow_threshold
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper : chronomètre chaque requête SQL"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.db_queries += 1
+            if self.slow_threshold is not None and elapsed * 1000 >= self.slow_threshold:
+                self.slow_queries.append((sql, elapsed * 1000))
+
+    def metrics(self):
+        """(total, SQL, gabarits) en ms"""
+        total = (time.perf_counter() - self.start) * 1000
+        db, templates = self.db_time * 1000, self.template_time * 1000
+        return total, db, templates
+
+    def header(self):
+        total, db, templates = self.metrics()
+        return ', '.join([
+            f'total;dur={total:.1f}',
+            f'db;dur={db:.1f};desc="SQL ({self.db_queries} requêtes)"',
+            f'tpl;dur={templates:.1f};desc="Gabarits"',
+        ])
+
+
+class TimedTemplate:
+    """Enveloppe d'un gabarit du moteur Django qui ajoute sa durée de rendu à la requête en cours"""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return self._template.render(context, request)
+        timing.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            timing.template_depth -= 1
+            if not timing.template_depth:
+                timing.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Moteur Django dont les gabarits chronomètrent leur rendu"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _bucket(duration):
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if duration <= bound:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def _merge(pending, entry):
+    for field in ('requests', 'total_ms', 'db_ms', 'db_queries', 'template_ms'):
+        pending[field] += entry[field]
+    pending['histogram'] = [a + b for a, b in zip(pending['histogram'], entry['histogram'])]
+    return pending
+
+
+def _save(entries):
+    # Lignes manquantes créées à zéro ; un autre worker peut créer la même au même moment
+    RouteTiming.objects.bulk_create([
+        RouteTiming(route=entry['route'], hour=entry['hour'], histogram=[0] * len(entry['histogram']))
+        for entry in entries
+    ], ignore_conflicts=True)
+    with transaction.atomic():
+        for entry in entries:
+            rows = RouteTiming.objects.select_for_update().filter(route=entry['route'], hour=entry['hour'])
+            # L'histogramme (JSON) s'additionne en Python, sous le verrou de la ligne
+            histogram = rows.values_list('histogram', flat=True).get()
+            rows.update(
+                requests=F('requests') + entry['requests'],
+                total_ms=F('total_ms') + entry['total_ms'],
+                db_ms=F('db_ms') + entry['db_ms'],
+                db_queries=F('db_queries') + entry['db_queries'],
+                template_ms=F('template_ms') + entry['template_ms'],
+                histogram=[a + b for a, b in zip(histogram, entry['histogram'])],
+            )
+        RouteTiming.objects.filter(hour__lt=timezone.now() - timedelta(days=RETENTION_DAYS)).delete()
+
+
+buffer = MergingBuffer(_save, _merge, max_size=200, max_age=60)
+
+
+def record(route, timing):
+    """Ajoute une requête mesurée à l'histogramme de sa route pour l'heure en cours"""
+    total, db, templates = timing.metrics()
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+    histogram[_bucket(total)] = 1
+    buffer.add((route, hour), {
+        'route': route,
+        'hour': hour,
+        'requests': 1,
+        'total_ms': total,
+        'db_ms': db,
+        'db_queries': timing.db_queries,
+        'template_ms': templates,
+        'histogram': histogram,
+    })
+
+
+def _percentile(histogram, fraction):
+    """Borne supérieure de la classe qui contient le centile demandé (None au-delà de la dernière borne)"""
+    target = sum(histogram) * fraction
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if count and seen >= target:
+            return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+    return None
+
+
+def summarize(rows):
+    """Statistiques par route d'une liste de RouteTiming (plusieurs heures), triées par route"""
+    routes = {}
+    for row in rows:
+        summary = routes.setdefault(row.route, {
+            'route': row.route, 'requests': 0, 'total_ms': 0.0, 'db_ms': 0.0, 'db_queries': 0,
+            'template_ms': 0.0, 'histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+        })
+        _merge(summary, {
+            'requests': row.requests, 'total_ms': row.total_ms, 'db_ms': row.db_ms,
+            'db_queries': row.db_queries, 'template_ms': row.template_ms, 'histogram': row.histogram,
+        })
+    for summary in routes.values():
+        count = summary['requests'] or 1
+        summary.update({
+            'mean_ms': summary['total_ms'] / count,
+            'mean_db_ms': summary['db_ms'] / count,
+            'mean_db_queries': summary['db_queries'] / count,
+            'mean_template_ms': summary['template_ms'] / count,
+            'p50': _percentile(summary['histogram'], 0.5),
+            'p95': _percentile(summary['histogram'], 0.95),
+        })
+    return [routes[route] for route in sorted(routes)]
+
+
+def start():
+    """Commence la mesure d'une requête : retourne (mesures, jeton pour stop)"""
+    timing = RequestTiming(getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None))
+    return timing, _current.set(timing)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def is_admin(user):
+    return user.is_authenticated and getattr(user, 'user_type', None) == 'admin'
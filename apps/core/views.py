@@ -1,11 +1,14 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
 from django.db import connection
 from django.conf import settings
-from apps.vendors.models import VendorProfile
+from apps.vendors.cards import featured_cards
 from apps.core.models import TermsOfService, ContactMessage
 from apps.core.cache_utils import get_cached_service_types
+from apps.core.conditional import make_etag, public_condition, public_pages_version
+from apps.core.reference_data import get_reference_bundle, reference_data_url
 from apps.core.forms import ContactForm
 from apps.core.turnstile import verify_turnstile
 from django.contrib import messages
@@ -21,12 +24,26 @@ def health(request):
 
 
 
+@condition(etag_func=lambda request, digest: get_reference_bundle().digest)
+def reference_data(request, digest):
+    """
+    Données de référence en JSON. L'URL contient l'empreinte du contenu : elle
+    peut être mise en cache un an ; une ancienne empreinte redirige vers la courante.
+    """
+    bundle = get_reference_bundle()
+    if digest != bundle.digest:
+        response = redirect(reference_data_url())
+        response['Cache-Control'] = 'no-cache'
+        return response
+    response = HttpResponse(bundle.content, content_type='application/json')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@public_condition(etag_func=lambda request: make_etag(public_pages_version()))
 def home(request):
     service_types = get_cached_service_types(ordered=True)
-    featured_vendors = VendorProfile.objects.filter(
-        is_active=True,
-        is_featured=True
-    ).prefetch_related('cities', 'service_types', 'images')[:6]
+    featured_vendors = featured_cards(6)
     return render(request, 'core/home.html', {
         'service_types': service_types,
         'featured_vendors': featured_vendors,
@@ -21,8 +21,8 @@ def send_project_confirmation(contact_name, contact_email):
 
 
 def notify_admin_new_project(contact_name, contact_email, contact_phone, event_description, event_date, budget):
-    from apps.core.models import SiteSettings
-    admin_email = SiteSettings.get().admin_notify_email
+    from apps.core.cache_utils import get_site_settings
+    admin_email = get_site_settings().admin_notify_email
     if not admin_email:
         return
 
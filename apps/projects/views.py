@@ -1,21 +1,14 @@
-import json
 from django.shortcuts import render
 from django.contrib import messages
 from django.conf import settings
 from .forms import ProjectCreateForm
 from apps.core.cache_utils import get_cached_service_types
-from apps.core.models import City
 from apps.core.turnstile import verify_turnstile
 from .tasks import send_project_confirmation, notify_admin_new_project
 
 
 def project_create(request):
     """Formulaire public 'J'ai un projet' — aucun compte requis"""
-    cities_by_country = {}
-    for c in City.objects.filter(is_active=True).select_related('country').order_by('name'):
-        if c.country_id:
-            cities_by_country.setdefault(str(c.country_id), []).append({'id': c.id, 'name': c.name})
-
     if request.method == 'POST':
         token = request.POST.get('cf-turnstile-response', '')
         if not verify_turnstile(token):
@@ -50,6 +43,5 @@ def project_create(request):
     return render(request, 'projects/project_create.html', {
         'form': form,
         'service_types': get_cached_service_types(ordered=True),
-        'cities_json': json.dumps(cities_by_country),
         'turnstile_sitekey': settings.TURNSTILE_SITEKEY,
     })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ServiceType, VendorProfile, VendorImage, ContactView
+from .models import ServiceType, VendorProfile, VendorImage, ContactView, ContactViewDaily, SearchQueryLog
 
 
 @admin.register(ServiceType)
@@ -41,3 +41,28 @@ class ContactViewAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(ContactViewDaily)
+class ContactViewDailyAdmin(admin.ModelAdmin):
+    list_display = ['vendor', 'event_type', 'date', 'count']
+    list_filter = ['date', 'event_type']
+    search_fields = ['vendor__business_name']
+    ordering = ['-date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SearchQueryLog)
+class SearchQueryLogAdmin(admin.ModelAdmin):
+    list_display = ['query', 'results_count', 'searched_at']
+    list_filter = ['searched_at']
+    search_fields = ['query', 'normalized_query']
+    readonly_fields = ['query', 'normalized_query', 'results_count', 'filters', 'searched_at']
+
+    def has_add_permission(self, request):
+        return False
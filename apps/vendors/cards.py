@@ -0,0 +1,123 @@
+"""
+Cartes des prestataires pour les listes (accueil, catégories, recherche).
+
+Une carte ne garde que ce qu'affiche la vignette : slug, nom, image déjà
+redimensionnée (et photo de couverture d'origine pour l'accueil), noms des
+services et des villes. Toutes les cartes des prestataires actifs sont
+construites en quatre requêtes étroites, une fois par worker et par version du
+catalogue (modification d'un prestataire, de ses images, services ou villes) :
+les pages de liste n'ont plus de prefetch à faire.
+"""
+import logging
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from easy_thumbnails.files import get_thumbnailer
+
+from apps.core.cache_utils import catalogue_memo
+from .models import VendorImage, VendorProfile
+
+logger = logging.getLogger(__name__)
+
+CARD_THUMBNAIL_ALIAS = 'medium'
+THUMBNAIL_URL_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class VendorCard:
+    """Projection dénormalisée d'un prestataire actif, en lecture seule"""
+
+    __slots__ = (
+        'pk', 'slug', 'business_name', 'is_featured', 'created_at',
+        'image_url', 'cover_url', 'service_names', 'city_names',
+    )
+
+    def __init__(
+        self, pk, slug, business_name, is_featured, created_at, image_url, cover_url, service_names, city_names,
+    ):
+        self.pk = pk
+        self.slug = slug
+        self.business_name = business_name
+        self.is_featured = is_featured
+        self.created_at = created_at
+        self.image_url = image_url
+        self.cover_url = cover_url
+        self.service_names = service_names
+        self.city_names = city_names
+
+    def __repr__(self):
+        return f'<VendorCard {self.pk} {self.slug}>'
+
+
+def _thumbnail_urls(names):
+    """
+    URL des miniatures par chemin d'image. Calculées une fois puis gardées dans
+    le cache partagé : une image ne change pas de chemin, et easy_thumbnails
+    interroge sa table (voire génère la miniature) à chaque appel.
+    """
+    keys = {f'card_thumb:{CARD_THUMBNAIL_ALIAS}:{name}': name for name in names}
+    found = cache.get_many(list(keys))
+    urls = {keys[key]: url for key, url in found.items()}
+    missing = {}
+    for key, name in keys.items():
+        if name in urls:
+            continue
+        try:
+            url = get_thumbnailer(name)[CARD_THUMBNAIL_ALIAS].url
+        except Exception:
+            logger.warning('Miniature impossible pour %s', name, exc_info=True)
+            url = default_storage.url(name)
+        urls[name] = missing[key] = url
+    if missing:
+        cache.set_many(missing, THUMBNAIL_URL_TIMEOUT)
+    return urls
+
+
+@catalogue_memo
+def get_vendor_cards():
+    """Cartes de tous les prestataires actifs, par identifiant"""
+    vendors = list(VendorProfile.objects.filter(is_active=True).values_list(
+        'pk', 'slug', 'business_name', 'is_featured', 'created_at', 'logo',
+    ))
+
+    services = {}
+    for vendor_id, name in VendorProfile.service_types.through.objects.filter(
+        vendorprofile__is_active=True,
+    ).order_by('servicetype__name').values_list('vendorprofile_id', 'servicetype__name'):
+        services.setdefault(vendor_id, []).append(name)
+
+    cities = {}
+    for vendor_id, name in VendorProfile.cities.through.objects.filter(
+        vendorprofile__is_active=True,
+    ).order_by('city__country__name', 'city__name').values_list('vendorprofile_id', 'city__name'):
+        cities.setdefault(vendor_id, []).append(name)
+
+    # Image de couverture, sinon la plus récente (ordre de VendorImage)
+    covers = {}
+    for vendor_id, image in VendorImage.objects.filter(vendor__is_active=True).order_by(
+        'vendor_id', '-is_cover', '-created_at',
+    ).values_list('vendor_id', 'image'):
+        covers.setdefault(vendor_id, image)
+
+    thumbnails = _thumbnail_urls({image for image in covers.values() if image})
+    return {
+        pk: VendorCard(
+            pk, slug, business_name, is_featured, created_at,
+            default_storage.url(logo) if logo else thumbnails.get(covers.get(pk), ''),
+            default_storage.url(covers[pk]) if covers.get(pk) else '',
+            tuple(services.get(pk, ())), tuple(cities.get(pk, ())),
+        )
+        for pk, slug, business_name, is_featured, created_at, logo in vendors
+    }
+
+
+def featured_cards(limit=6):
+    """Prestataires mis en avant, les plus récents d'abord (ordre de VendorProfile)"""
+    featured = [card for card in get_vendor_cards().values() if card.is_featured]
+    featured.sort(key=lambda card: (card.created_at, card.pk), reverse=True)
+    return featured[:limit]
+
+
+def cards_for(ids):
+    """Cartes des identifiants donnés, dans le même ordre (prestataires inactifs ignorés)"""
+    cards = get_vendor_cards()
+    return [cards[pk] for pk in ids if pk in cards]
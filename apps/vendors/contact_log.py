@@ -0,0 +1,66 @@
+"""
+Clics « voir le numéro », écrits par lots comme le journal des recherches.
+
+Chaque lot insère les ContactView (bulk_create) et incrémente dans la même
+transaction les compteurs journaliers ContactViewDaily, que lisent les
+statistiques du tableau de bord et des fiches prestataires. Un prestataire
+supprimé entre le clic et l'écriture fait écarter ses clics ; un type
+d'événement supprimé est remplacé par « non précisé », comme le ferait SET_NULL.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.buffers import BulkBuffer
+from apps.projects.models import EventType
+from .models import ContactView, ContactViewDaily, VendorProfile
+
+
+def _existing(entries):
+    """Entrées dont le prestataire existe encore, type d'événement vidé s'il a disparu"""
+    vendor_ids = set(VendorProfile.objects.filter(
+        pk__in={entry['vendor_id'] for entry in entries},
+    ).values_list('pk', flat=True))
+    event_type_ids = set(EventType.objects.filter(
+        pk__in={entry['event_type_id'] for entry in entries if entry['event_type_id'] is not None},
+    ).values_list('pk', flat=True))
+    return [
+        {**entry, 'event_type_id': entry['event_type_id'] if entry['event_type_id'] in event_type_ids else None}
+        for entry in entries if entry['vendor_id'] in vendor_ids
+    ]
+
+
+def _save(entries):
+    entries = _existing(entries)
+    totals = Counter(
+        (entry['vendor_id'], entry['event_type_id'], timezone.localdate(entry['viewed_at']))
+        for entry in entries
+    )
+    with transaction.atomic():
+        ContactView.objects.bulk_create([ContactView(**entry) for entry in entries])
+        created = []
+        for (vendor_id, event_type_id, date), count in totals.items():
+            updated = ContactViewDaily.objects.filter(
+                vendor_id=vendor_id, event_type_id=event_type_id, date=date,
+            ).update(count=F('count') + count)
+            if not updated:
+                created.append(ContactViewDaily(
+                    vendor_id=vendor_id, event_type_id=event_type_id, date=date, count=count,
+                ))
+        ContactViewDaily.objects.bulk_create(created)
+
+
+buffer = BulkBuffer(_save, max_size=50, max_age=30)
+
+
+def log_contact(vendor_id, event_type_id, ip_address, user_agent, session_key):
+    buffer.add({
+        'vendor_id': vendor_id,
+        'event_type_id': event_type_id,
+        'ip_address': ip_address,
+        'user_agent': user_agent[:500],
+        'session_key': session_key,
+        'viewed_at': timezone.now(),
+    })
@@ -0,0 +1,95 @@
+"""
+Compteurs de facettes (type de service, pays, ville) de la liste des prestataires.
+
+Chaque valeur de facette est un ensemble figé d'identifiants de prestataires
+actifs, construit une fois par worker et par version du catalogue. Les
+compteurs d'une requête sont des intersections en mémoire : aucune requête SQL
+tant que le catalogue ne change pas.
+"""
+from collections import namedtuple
+
+from apps.core.cache_utils import catalogue_memo
+from .models import VendorProfile
+
+
+FacetSets = namedtuple('FacetSets', ['active', 'services', 'countries', 'cities'])
+
+
+def _group(pairs, active):
+    groups = {}
+    for key, vendor_id in pairs:
+        if vendor_id in active:
+            groups.setdefault(key, set()).add(vendor_id)
+    return {key: frozenset(ids) for key, ids in groups.items()}
+
+
+@catalogue_memo
+def get_facet_sets():
+    active = frozenset(VendorProfile.objects.filter(is_active=True).values_list('pk', flat=True))
+    services = VendorProfile.service_types.through.objects.values_list('servicetype_id', 'vendorprofile_id')
+    cities = list(
+        VendorProfile.cities.through.objects.values_list('city_id', 'vendorprofile_id', 'city__country_id')
+    )
+    return FacetSets(
+        active=active,
+        services=_group(services, active),
+        # Même règle que le filtre de la liste : un pays = les villes d'intervention de ce pays
+        countries=_group(((country_id, vendor_id) for _, vendor_id, country_id in cities if country_id), active),
+        cities=_group(((city_id, vendor_id) for city_id, vendor_id, _ in cities), active),
+    )
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _union(sets, keys):
+    result = set()
+    for key in keys:
+        result |= sets.get(key, frozenset())
+    return result
+
+
+def filter_vendor_ids(service_type_ids=(), country_id=None, city_id=None, base=None):
+    """
+    Prestataires actifs correspondant aux filtres (services : l'un ou l'autre ;
+    ville prioritaire sur pays), restreints à `base` si fourni (résultats d'une recherche)
+    """
+    facets = get_facet_sets()
+    ids = set(facets.active) if base is None else facets.active & set(base)
+    services = [pk for pk in map(_as_int, service_type_ids) if pk is not None]
+    if services:
+        ids &= _union(facets.services, services)
+    ids &= _location_set(facets, country_id, city_id, ids)
+    return ids
+
+
+def _location_set(facets, country_id, city_id, default):
+    city_id, country_id = _as_int(city_id), _as_int(country_id)
+    if city_id is not None:
+        return facets.cities.get(city_id, frozenset())
+    if country_id is not None:
+        return facets.countries.get(country_id, frozenset())
+    return default
+
+
+def facet_counts(service_type_ids=(), country_id=None, city_id=None, base=None):
+    """
+    Nombre de prestataires par valeur de facette, sous les autres filtres actifs :
+    les compteurs de services tiennent compte de la localisation et de la
+    recherche, ceux de pays et de villes des services choisis et de la recherche.
+    """
+    facets = get_facet_sets()
+    scope = facets.active if base is None else facets.active & set(base)
+    services = [pk for pk in map(_as_int, service_type_ids) if pk is not None]
+
+    located = scope & _location_set(facets, country_id, city_id, scope)
+    by_service = scope & _union(facets.services, services) if services else scope
+    return {
+        'services': {pk: len(ids & located) for pk, ids in facets.services.items()},
+        'countries': {pk: len(ids & by_service) for pk, ids in facets.countries.items()},
+        'cities': {pk: len(ids & by_service) for pk, ids in facets.cities.items()},
+    }
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.vendors.vectors import build_vectors, vectors_dir
+
+
+class Command(BaseCommand):
+    help = (
+        'Construit les vecteurs TF-IDF de la recherche sémantique '
+        '(reconstruits aussi en arrière-plan si SEARCH_VECTORS_REBUILD_DELAY est défini)'
+    )
+
+    def handle(self, *args, **options):
+        count = build_vectors()
+        self.stdout.write(self.style.SUCCESS(f'{count} prestataire(s) vectorisé(s) dans {vectors_dir()}.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.vendors.similar import CONTACT_DAYS, TOP_K, build_similar_vendors
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcule les « Prestataires similaires » (co-consultations, services et villes en commun). '
+        'À lancer chaque nuit, ex. cron : 30 3 * * * docker compose exec -T web python manage.py build_similar_vendors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=TOP_K, help=f'Voisins par prestataire (défaut : {TOP_K})')
+        parser.add_argument(
+            '--days', type=int, default=CONTACT_DAYS,
+            help=f'Ancienneté maximale des consultations prises en compte (défaut : {CONTACT_DAYS} jours)',
+        )
+
+    def handle(self, *args, **options):
+        count = build_similar_vendors(top_k=options['top'], contact_days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'{count} recommandation(s) enregistrée(s).'))
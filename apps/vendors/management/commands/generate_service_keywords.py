@@ -1,10 +1,49 @@
+import json
+import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
 import requests
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from apps.vendors.models import ServiceType
 
 
+GROQ_ENDPOINT = 'https://api.groq.com/openai/v1/chat/completions'
+
+
+class TokenBucket:
+    """Limiteur de débit partagé entre les threads : `rate` appels par seconde, rafales de `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class Command(BaseCommand):
     help = 'Génère les mots-clés de recherche pour chaque type de service via Groq LLM'
 
@@ -14,10 +53,23 @@ class Command(BaseCommand):
             action='store_true',
             help='Re-génère même si des mots-clés existent déjà',
         )
+        parser.add_argument(
+            '--endpoint',
+            default=getattr(settings, 'GROQ_API_URL', GROQ_ENDPOINT),
+            help='URL compatible OpenAI chat/completions (ex. serveur local de test)',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Appels simultanés (défaut : 4)')
+        parser.add_argument('--rate', type=float, default=2.0, help='Appels par seconde au maximum (défaut : 2)')
+        parser.add_argument('--retries', type=int, default=4, help='Nouvelles tentatives par service (défaut : 4)')
+        parser.add_argument(
+            '--checkpoint',
+            default=str(settings.BASE_DIR / '.service_keywords_checkpoint.json'),
+            help='Fichier de reprise : les services déjà traités sont ignorés à la relance',
+        )
 
     def handle(self, *args, **options):
         api_key = getattr(settings, 'GROQ_API_KEY', '')
-        if not api_key:
+        if not api_key and options['endpoint'] == GROQ_ENDPOINT:
             self.stderr.write(self.style.ERROR('GROQ_API_KEY non configurée dans les settings.'))
             return
 
@@ -26,29 +78,85 @@ class Command(BaseCommand):
         else:
             services = ServiceType.objects.filter(search_keywords='').order_by('name')
 
-        total = services.count()
+        checkpoint_path = Path(options['checkpoint'])
+        checkpoint = self._load_checkpoint(checkpoint_path)
+        pending = [s for s in services if str(s.pk) not in checkpoint]
+        skipped = len(services) - len(pending)
+        if skipped:
+            self.stdout.write(f'{skipped} service(s) déjà traité(s) d\'après {checkpoint_path.name}, ignoré(s).')
+
+        total = len(pending)
         if total == 0:
             self.stdout.write(self.style.SUCCESS('Tous les types de service ont déjà des mots-clés.'))
+            checkpoint_path.unlink(missing_ok=True)
             return
 
+        self.endpoint = options['endpoint']
+        self.api_key = api_key
+        self.retries = options['retries']
+        self.bucket = TokenBucket(options['rate'], capacity=max(options['workers'], 1))
+        self.local = threading.local()
+
         done = 0
-        for i, service in enumerate(services, 1):
-            self.stdout.write(f'{i}/{total} — {service.name}...')
-            try:
-                keywords = self._generate(api_key, service.name)
+        started = time.monotonic()
+        # Les appels HTTP sont parallèles ; les écritures en base restent dans ce thread
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            futures = {pool.submit(self._generate_with_retry, s.name): s for s in pending}
+            for i, future in enumerate(as_completed(futures), 1):
+                service = futures[future]
+                try:
+                    keywords = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f'{i}/{total} — {service.name} → ÉCHEC : {e}'))
+                    continue
                 service.search_keywords = keywords
                 service.save(update_fields=['search_keywords'])
-                self.stdout.write(self.style.SUCCESS(f'  → {keywords[:100]}'))
+                checkpoint[str(service.pk)] = keywords
+                self._save_checkpoint(checkpoint_path, checkpoint)
+                self.stdout.write(self.style.SUCCESS(f'{i}/{total} — {service.name} → {keywords[:100]}'))
                 done += 1
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'  → ÉCHEC : {e}'))
-            if i < total:
-                time.sleep(0.8)
 
         self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS(f'{done}/{total} type(s) traité(s).'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{done}/{total} type(s) traité(s) en {time.monotonic() - started:.1f} s.'
+        ))
+        if done == total:
+            checkpoint_path.unlink(missing_ok=True)
+        else:
+            self.stdout.write(f'Relancer la commande pour reprendre ({checkpoint_path}).')
+
+    @staticmethod
+    def _load_checkpoint(path):
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
 
-    def _generate(self, api_key, service_name):
+    @staticmethod
+    def _save_checkpoint(path, checkpoint):
+        tmp = path.with_name(f'{path.name}.tmp')
+        tmp.write_text(json.dumps(checkpoint, ensure_ascii=False))
+        os.replace(tmp, path)
+
+    def _generate_with_retry(self, service_name):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                return self._generate(service_name)
+            except RetryableError as e:
+                if attempt == self.retries:
+                    raise
+                # Backoff exponentiel avec gigue, ou le délai demandé par l'API (429)
+                delay = e.retry_after if e.retry_after is not None else min(2 ** attempt, 30) * (0.5 + random.random())
+                time.sleep(delay)
+
+    def _session(self):
+        # Une session par thread : connexions réutilisées (keep-alive) sans partage entre threads
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _generate(self, service_name):
         prompt = (
             f'Tu es un assistant pour une marketplace événementielle en Afrique de l\'Ouest (Togo). '
             f'Génère 12 à 15 mots-clés en français qu\'un utilisateur pourrait taper pour rechercher '
@@ -56,20 +164,29 @@ class Command(BaseCommand):
             f'Inclus des synonymes, des variantes avec et sans accents, et des termes courants locaux. '
             f'Réponds uniquement avec les mots-clés séparés par des virgules, en minuscules, sans explication ni ponctuation finale.'
         )
-        resp = requests.post(
-            'https://api.groq.com/openai/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json',
-            },
-            json={
-                'model': 'llama-3.3-70b-versatile',
-                'messages': [{'role': 'user', 'content': prompt}],
-                'temperature': 0.3,
-                'max_tokens': 200,
-            },
-            timeout=15,
-        )
+        try:
+            resp = self._session().post(
+                self.endpoint,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json',
+                },
+                json={
+                    'model': 'llama-3.3-70b-versatile',
+                    'messages': [{'role': 'user', 'content': prompt}],
+                    'temperature': 0.3,
+                    'max_tokens': 200,
+                },
+                timeout=15,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(str(e))
+        if resp.status_code == 429 or resp.status_code >= 500:
+            retry_after = resp.headers.get('Retry-After')
+            raise RetryableError(
+                f'HTTP {resp.status_code}',
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
         resp.raise_for_status()
         raw = resp.json()['choices'][0]['message']['content'].strip().rstrip('.')
         return ', '.join(k.strip().lower() for k in raw.split(',') if k.strip())
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.vendors.search import reset_search_cache_stats, search_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Affiche les compteurs du cache des résultats de recherche'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Remet les compteurs à zéro après affichage')
+
+    def handle(self, *args, **options):
+        stats = search_cache_stats()
+        self.stdout.write(
+            f"Succès : {stats['hits']}  Défauts : {stats['misses']}  "
+            f"Taux de succès : {stats['hit_rate']:.1%}"
+        )
+        if options['reset']:
+            reset_search_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Compteurs remis à zéro.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.vendors.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les vecteurs de recherche plein texte de tous les prestataires (PostgreSQL)'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Base non PostgreSQL : rien à faire.'))
+            return
+        count = update_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f'{count} prestataire(s) indexé(s).'))
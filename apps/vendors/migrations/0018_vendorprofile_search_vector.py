@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS vendors_vendorprofile_search_vector_gin "
+        "ON vendors_vendorprofile USING gin (search_vector)"
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS vendors_vendorprofile_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0017_contactview_event_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vendorprofile",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:05
+
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS vendors_servicetype_name_trgm "
+        "ON vendors_servicetype USING gin (name gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS vendors_servicetype_keywords_trgm "
+        "ON vendors_servicetype USING gin (search_keywords gin_trgm_ops)"
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS vendors_servicetype_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS vendors_servicetype_keywords_trgm")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0018_vendorprofile_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0019_servicetype_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchQueryLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=200, verbose_name="Recherche")),
+                (
+                    "normalized_query",
+                    models.CharField(
+                        db_index=True,
+                        max_length=200,
+                        verbose_name="Recherche normalisée",
+                    ),
+                ),
+                (
+                    "results_count",
+                    models.PositiveIntegerField(verbose_name="Nombre de résultats"),
+                ),
+                (
+                    "filters",
+                    models.JSONField(blank=True, default=dict, verbose_name="Filtres"),
+                ),
+                (
+                    "searched_at",
+                    models.DateTimeField(db_index=True, verbose_name="Date"),
+                ),
+            ],
+            options={
+                "verbose_name": "Recherche",
+                "verbose_name_plural": "Recherches",
+                "ordering": ["-searched_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0020_searchquerylog"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="vendorprofile",
+            index=models.Index(
+                fields=["-is_featured", "-created_at", "-id"],
+                name="vendor_listing_order_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0021_vendorprofile_listing_order_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarVendor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Rang")),
+                ("score", models.FloatField(verbose_name="Score")),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="vendors.vendorprofile",
+                        verbose_name="Prestataire similaire",
+                    ),
+                ),
+                (
+                    "vendor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_links",
+                        to="vendors.vendorprofile",
+                        verbose_name="Prestataire",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Prestataire similaire",
+                "verbose_name_plural": "Prestataires similaires",
+                "ordering": ["vendor", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("vendor", "rank"), name="similar_vendor_rank_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_counts(apps, schema_editor):
+    ContactView = apps.get_model("vendors", "ContactView")
+    ContactViewDaily = apps.get_model("vendors", "ContactViewDaily")
+    rows = (
+        ContactView.objects.annotate(date=TruncDate("viewed_at"))
+        .values("vendor_id", "event_type_id", "date")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    ContactViewDaily.objects.bulk_create(
+        (ContactViewDaily(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+def clear_daily_counts(apps, schema_editor):
+    apps.get_model("vendors", "ContactViewDaily").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0003_email_optional_on_project"),
+        ("vendors", "0022_similarvendor"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="contactview",
+            name="viewed_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Date du clic"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ContactViewDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Jour")),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="Clics")),
+                (
+                    "event_type",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="projects.eventtype",
+                        verbose_name="Type d'événement",
+                    ),
+                ),
+                (
+                    "vendor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="contact_daily",
+                        to="vendors.vendorprofile",
+                        verbose_name="Prestataire",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Clics par jour",
+                "verbose_name_plural": "Clics par jour",
+                "ordering": ["-date"],
+                "indexes": [
+                    models.Index(
+                        fields=["vendor", "date"], name="vendors_con_vendor__36e05d_idx"
+                    ),
+                    models.Index(fields=["date"], name="vendors_con_date_4685fd_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_counts, clear_daily_counts),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:20
+
+from django.db import migrations
+
+# Équivalent SQL de search_index.fold pour les lettres accentuées courantes ;
+# les vecteurs sont ensuite recalculés exactement à chaque modification
+ACCENTS = "àáâãäåçèéêëìíîïñòóôõöùúûüýÿ"
+FOLDED = "aaaaaaceeeeiiiinooooouuuuyy"
+
+
+def _fold(expression):
+    return (
+        f"translate(lower(replace(replace(coalesce({expression}, ''), 'œ', 'oe'), 'æ', 'ae')), "
+        f"'{ACCENTS}', '{FOLDED}')"
+    )
+
+
+def backfill_search_vectors(apps, schema_editor):
+    """Remplit search_vector en une seule requête (mêmes poids que search.update_search_vectors)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    VendorProfile = apps.get_model("vendors", "VendorProfile")
+    ServiceType = apps.get_model("vendors", "ServiceType")
+    vendors = VendorProfile._meta.db_table
+    links = VendorProfile.service_types.through._meta.db_table
+    services = ServiceType._meta.db_table
+    services_text = (
+        f"(SELECT string_agg(s.name || ' ' || replace(s.search_keywords, ',', ' '), ' ') "
+        f"FROM {links} l JOIN {services} s ON s.id = l.servicetype_id "
+        f"WHERE l.vendorprofile_id = v.id)"
+    )
+    schema_editor.execute(
+        f"UPDATE {vendors} v SET search_vector = "
+        f"setweight(to_tsvector('french', {_fold('v.business_name')}), 'A') || "
+        f"setweight(to_tsvector('french', {_fold(services_text)}), 'B') || "
+        f"setweight(to_tsvector('french', {_fold('v.description')}), 'C')"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vendors", "0023_contactviewdaily"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
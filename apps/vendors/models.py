@@ -1,4 +1,6 @@
 from django.db import models
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from PIL import Image
 from io import BytesIO
@@ -106,10 +108,19 @@ class VendorProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Recherche plein texte PostgreSQL (nom, services, description) — tenu à jour
+    # par apps/vendors/search.py::update_search_vectors. L'index GIN est créé par
+    # la migration 0018, uniquement sur PostgreSQL.
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
     class Meta:
         verbose_name = 'Profil prestataire'
         verbose_name_plural = 'Profils prestataires'
         ordering = ['-is_featured', '-created_at']
+        indexes = [
+            # Ordre des listes et curseur du « Voir plus » (is_featured, created_at, id)
+            models.Index(fields=['-is_featured', '-created_at', '-id'], name='vendor_listing_order_idx'),
+        ]
 
     def __str__(self):
         return self.business_name
@@ -370,7 +381,8 @@ class ContactView(models.Model):
     )
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='Adresse IP')
     user_agent = models.TextField(blank=True, verbose_name='User-Agent')
-    viewed_at = models.DateTimeField(auto_now_add=True, verbose_name='Date du clic')
+    # Heure du clic, pas de l'écriture : les clics sont écrits par lots (contact_log.py)
+    viewed_at = models.DateTimeField(default=timezone.now, verbose_name='Date du clic')
     session_key = models.CharField(max_length=40, blank=True, verbose_name='Session')
 
     class Meta:
@@ -383,3 +395,89 @@ class ContactView(models.Model):
 
     def __str__(self):
         return f"{self.vendor.business_name} — {self.viewed_at:%d/%m/%Y %H:%M} ({self.ip_address})"
+
+
+class ContactViewDaily(models.Model):
+    """
+    Nombre de clics par prestataire, type d'événement et jour, tenu à jour à
+    chaque écriture des clics (contact_log.py) : les statistiques lisent cette
+    table plutôt que de compter les ContactView. Toujours agréger par Sum, deux
+    workers peuvent créer chacun une ligne pour la même clé.
+    """
+    vendor = models.ForeignKey(
+        VendorProfile,
+        on_delete=models.CASCADE,
+        related_name='contact_daily',
+        verbose_name='Prestataire',
+    )
+    event_type = models.ForeignKey(
+        'projects.EventType',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Type d'événement",
+    )
+    date = models.DateField(verbose_name='Jour')
+    count = models.PositiveIntegerField(default=0, verbose_name='Clics')
+
+    class Meta:
+        verbose_name = 'Clics par jour'
+        verbose_name_plural = 'Clics par jour'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['vendor', 'date']),
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor_id} — {self.date:%d/%m/%Y} : {self.count}"
+
+
+class SearchQueryLog(models.Model):
+    """Recherche effectuée sur la liste des prestataires (écrite par lots, voir search_log.py)"""
+    query = models.CharField(max_length=200, verbose_name='Recherche')
+    normalized_query = models.CharField(max_length=200, db_index=True, verbose_name='Recherche normalisée')
+    results_count = models.PositiveIntegerField(verbose_name='Nombre de résultats')
+    filters = models.JSONField(default=dict, blank=True, verbose_name='Filtres')
+    searched_at = models.DateTimeField(db_index=True, verbose_name='Date')
+
+    class Meta:
+        verbose_name = 'Recherche'
+        verbose_name_plural = 'Recherches'
+        ordering = ['-searched_at']
+
+    def __str__(self):
+        return f"« {self.query} » — {self.results_count} résultat(s)"
+
+
+class SimilarVendor(models.Model):
+    """
+    Recommandation « Prestataires similaires », recalculée chaque nuit par la
+    commande build_similar_vendors (voir similar.py) ; lue par un seul accès indexé
+    """
+    vendor = models.ForeignKey(
+        VendorProfile,
+        on_delete=models.CASCADE,
+        related_name='similar_links',
+        verbose_name='Prestataire',
+    )
+    similar = models.ForeignKey(
+        VendorProfile,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Prestataire similaire',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Rang')
+    score = models.FloatField(verbose_name='Score')
+
+    class Meta:
+        verbose_name = 'Prestataire similaire'
+        verbose_name_plural = 'Prestataires similaires'
+        ordering = ['vendor', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'rank'], name='similar_vendor_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor_id} → {self.similar_id} (#{self.rank})"
@@ -1,32 +1,237 @@
-from django.db.models import Q
-from .models import VendorProfile, ServiceType
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Greatest
+from .cards import cards_for
+from .models import ServiceType, VendorProfile
+from .search_index import FEATURED_BOOST, fold, get_index, words
+from .vectors import vector_search
+from apps.core.cache_utils import get_catalogue_version, is_version
 
 
-def semantic_search(query, limit=20):
-    """Recherche par mots-clés sur les types de service.
+def _index_backend(query):
+    """Index inversé en mémoire du worker (voir search_index.py)"""
+    return get_index().search(query)
 
-    Trouve les ServiceType dont le nom ou les search_keywords contiennent la requête,
-    puis retourne les prestataires actifs qui ont ces services.
-    Fallback sur le nom et la description des prestataires si aucun service ne correspond.
+
+def _postgres_fuzzy(query):
     """
-    q = query.strip()
-    if not q:
-        return []
+    Tolérance aux fautes de frappe via pg_trgm (index GIN trigrammes sur le nom
+    et les mots-clés des services), classée par similarité
+    """
+    from django.contrib.postgres.search import TrigramWordSimilarity
 
-    matching_services = ServiceType.objects.filter(
-        Q(name__icontains=q) | Q(search_keywords__icontains=q)
+    q = query.strip().lower()
+    similarity = dict(
+        ServiceType.objects.filter(
+            Q(name__trigram_word_similar=q) | Q(search_keywords__trigram_word_similar=q)
+        ).annotate(
+            similarity=Greatest(
+                TrigramWordSimilarity(q, 'name'),
+                TrigramWordSimilarity(q, 'search_keywords'),
+            )
+        ).values_list('pk', 'similarity')
     )
+    if not similarity:
+        return []
+    best = {}
+    links = VendorProfile.service_types.through.objects.filter(
+        servicetype_id__in=similarity, vendorprofile__is_active=True,
+    ).values_list('vendorprofile_id', 'servicetype_id', 'vendorprofile__is_featured', 'vendorprofile__created_at')
+    for vendor_id, service_id, is_featured, created_at in links:
+        key = (similarity[service_id], is_featured, created_at)
+        best[vendor_id] = max(best.get(vendor_id, key), key)
+    return sorted(best, key=best.get, reverse=True)
 
-    if matching_services.exists():
-        return list(
-            VendorProfile.objects.filter(
-                is_active=True,
-                service_types__in=matching_services,
-            ).distinct().prefetch_related('service_types', 'images', 'cities')[:limit]
-        )
 
-    return list(
-        VendorProfile.objects.filter(is_active=True).filter(
-            Q(business_name__icontains=q) | Q(description__icontains=q)
-        ).prefetch_related('service_types', 'images', 'cities')[:limit]
+def _postgres_backend(query):
+    """
+    Recherche plein texte PostgreSQL sur VendorProfile.search_vector (index GIN),
+    classée par ts_rank (× FEATURED_BOOST pour les prestataires mis en avant,
+    comme le backend 'index'), puis recherche approchée par trigrammes si rien ne
+    correspond. Hors PostgreSQL (dev SQLite), repli sur l'index en mémoire.
+    """
+    if connection.vendor != 'postgresql':
+        return _index_backend(query)
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    terms = words(query)
+    if not terms:
+        return []
+    # Les mots ne contiennent que [a-z0-9] : pas d'échappement nécessaire en mode raw
+    tsquery = SearchQuery(' & '.join(f'{t}:*' for t in terms), config='french', search_type='raw')
+    ids = list(
+        VendorProfile.objects.filter(is_active=True, search_vector=tsquery)
+        .annotate(rank=SearchRank(F('search_vector'), tsquery) * Case(
+            When(is_featured=True, then=Value(FEATURED_BOOST)), default=Value(1.0), output_field=FloatField(),
+        ))
+        .order_by('-rank', '-is_featured', '-created_at')
+        .values_list('pk', flat=True)
     )
+    return ids or _postgres_fuzzy(query)
+
+
+def _vectors_backend(query):
+    """Similarité cosinus TF-IDF seule (voir vectors.py)"""
+    return vector_search(query)
+
+
+_BACKENDS = {
+    'index': _index_backend,
+    'postgres': _postgres_backend,
+    'vectors': _vectors_backend,
+}
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_CACHE_TIMEOUT = 15 * 60
+
+
+SEARCH_STATS_KEYS = {'hits': 'search_cache:hits', 'misses': 'search_cache:misses'}
+
+
+def _normalize_query(query):
+    """Sans accents, en minuscules, espaces réduits et mots vides retirés"""
+    return ' '.join(words(query))
+
+
+def _count(stat):
+    """Compteur partagé entre les workers (indicatif : l'incrément n'est pas atomique partout)"""
+    key = SEARCH_STATS_KEYS[stat]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def search_cache_stats():
+    """Succès et défauts du cache des résultats de recherche depuis la dernière remise à zéro"""
+    values = cache.get_many(SEARCH_STATS_KEYS.values())
+    stats = {stat: values.get(key, 0) for stat, key in SEARCH_STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_search_cache_stats():
+    cache.delete_many(list(SEARCH_STATS_KEYS.values()))
+
+
+def ranked_vendor_ids(query, version=None):
+    """
+    Identifiants des prestataires correspondant à la requête, du plus pertinent
+    au moins pertinent. La liste (des identifiants, pas des objets) est mise en
+    cache par requête normalisée et par version du catalogue : « Traiteur » et
+    « traiteur  » partagent l'entrée, et toute modification du catalogue
+    l'invalide. Voir `search_cache_stats()` pour les compteurs.
+    """
+    normalized = _normalize_query(query)
+    if not normalized:
+        return []
+    backend_name = getattr(settings, 'VENDOR_SEARCH_BACKEND', 'index')
+    version = version or get_catalogue_version()
+    digest = hashlib.md5(normalized.encode()).hexdigest()
+    cache_key = f'search:{version}:{backend_name}:{digest}'
+
+    ids = cache.get(cache_key)
+    if ids is None:
+        _count('misses')
+        # Sans correspondance lexicale ni approchée, repli sur la similarité sémantique
+        ids = _BACKENDS[backend_name](query) or vector_search(query)
+        cache.set(cache_key, ids, SEARCH_CACHE_TIMEOUT)
+    else:
+        _count('hits')
+    return ids
+
+
+def _hydrate(ids):
+    vendors = VendorProfile.objects.filter(
+        pk__in=ids, is_active=True,
+    ).prefetch_related('service_types', 'images', 'cities').in_bulk()
+    return [vendors[pk] for pk in ids if pk in vendors]
+
+
+def search_page(query, cursor=None, page_size=SEARCH_PAGE_SIZE, vendor_ids=None):
+    """
+    Une page de résultats : (cartes des prestataires, curseur suivant ou None, nombre total).
+    `vendor_ids` restreint les résultats (filtres de services et de localisation).
+
+    Le curseur « version:position » garde la version du catalogue de la première
+    page, pour parcourir la même liste classée tant qu'elle est en cache.
+    """
+    version, offset = None, 0
+    if cursor:
+        version, _, position = cursor.rpartition(':')
+        try:
+            offset = max(int(position), 0)
+        except ValueError:
+            version, offset = None, 0
+        if version and not is_version(version):
+            version = None
+    version = version or get_catalogue_version()
+
+    ids = ranked_vendor_ids(query, version)
+    if vendor_ids is not None:
+        ids = [pk for pk in ids if pk in vendor_ids]
+    page_ids = ids[offset:offset + page_size]
+    next_cursor = f'{version}:{offset + page_size}' if offset + page_size < len(ids) else None
+    return cards_for(page_ids), next_cursor, len(ids)
+
+
+def semantic_search(query, limit=20):
+    """Recherche par mots-clés sur les types de service.
+
+    Trouve les ServiceType dont le nom ou les search_keywords contiennent les termes
+    de la requête (sans accents, au singulier, en préfixe), puis retourne les
+    prestataires actifs qui ont ces services, classés par pertinence.
+    Fallback sur le nom et la description des prestataires si aucun service ne correspond,
+    puis sur les vecteurs TF-IDF (build_search_vectors) si rien ne correspond encore.
+
+    Le moteur est choisi par le setting VENDOR_SEARCH_BACKEND ('index', 'postgres' ou 'vectors') :
+    dans les deux cas, seule la page de résultats est chargée depuis la base.
+    """
+    ids = ranked_vendor_ids(query)[:limit]
+    return _hydrate(ids) if ids else []
+
+
+def update_search_vectors(vendor_ids=None):
+    """
+    Recalcule VendorProfile.search_vector (PostgreSQL uniquement).
+
+    Nom (poids A), services et leurs mots-clés (B), description (C), avec la
+    configuration 'french'. Les textes sont repliés (sans accents) côté Python
+    pour que « gâteau » et « gateau » donnent le même lexème.
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+
+    from django.contrib.postgres.search import SearchVector
+
+    vendors = VendorProfile.objects.all()
+    if vendor_ids is not None:
+        vendors = vendors.filter(pk__in=vendor_ids)
+    rows = list(vendors.values_list('pk', 'business_name', 'description'))
+
+    services = {}
+    links = VendorProfile.service_types.through.objects.filter(
+        vendorprofile_id__in=[pk for pk, _, _ in rows]
+    ).values_list('vendorprofile_id', 'servicetype__name', 'servicetype__search_keywords')
+    for vendor_id, name, keywords in links:
+        services.setdefault(vendor_id, []).append(f"{name} {keywords.replace(',', ' ')}")
+
+    def _vector(text, weight):
+        return SearchVector(Value(fold(text), output_field=TextField()), config='french', weight=weight)
+
+    for pk, business_name, description in rows:
+        VendorProfile.objects.filter(pk=pk).update(
+            search_vector=(
+                _vector(business_name, 'A')
+                + _vector(' '.join(services.get(pk, [])), 'B')
+                + _vector(description, 'C')
+            )
+        )
+    return len(rows)
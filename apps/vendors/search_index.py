@@ -0,0 +1,393 @@
+"""
+Index inversé en mémoire pour la recherche de prestataires
+
+Chaque worker garde sa propre copie de l'index, construite depuis la base au
+premier appel. Les modifications faites dans le worker sont appliquées
+incrémentalement (voir apps/vendors/signals.py) ; les autres workers détectent
+le changement de version du catalogue et reconstruisent leur copie.
+"""
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+from apps.core.cache_utils import get_catalogue_version, version_sequence
+
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+_STOP_WORDS = frozenset({
+    'a', 'au', 'aux', 'avec', 'd', 'de', 'des', 'du', 'en', 'et', 'l', 'la',
+    'le', 'les', 'ou', 'par', 'pour', 'sur', 'un', 'une',
+})
+
+
+def fold(text):
+    """Minuscules, sans accents : 'Gâteau' → 'gateau'"""
+    text = unicodedata.normalize('NFKD', text or '').lower()
+    text = text.replace('œ', 'oe').replace('æ', 'ae')
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(word):
+    """
+    Racinisation française légère (d'après le « minimal stemmer » de Savoy) :
+    pluriels et féminins, sans toucher aux mots courts
+    """
+    if len(word) < 6:
+        return word
+    if word.endswith('x'):
+        if word.endswith('aux') and not word.endswith('eaux'):
+            return word[:-2] + 'l'
+        return word[:-1]
+    if word.endswith('s'):
+        word = word[:-1]
+    if word.endswith('r'):
+        word = word[:-1]
+    if word.endswith('e'):
+        word = word[:-1]
+    if len(word) > 1 and word[-1] == word[-2] and word[-1].isalpha():
+        word = word[:-1]
+    return word
+
+
+def words(text):
+    """Texte brut → mots repliés, sans mots vides"""
+    return [w for w in _WORD_RE.findall(fold(text)) if w not in _STOP_WORDS]
+
+
+def tokenize(text):
+    """Texte brut → liste de termes normalisés (repliés, racinisés, sans mots vides)"""
+    return [stem(w) for w in words(text)]
+
+
+def trigrams(term):
+    """Trigrammes d'un terme, complété comme pg_trgm : 'dj' → {'  d', ' dj', 'dj '}"""
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Similarité minimale (Jaccard sur les trigrammes), comme pg_trgm.similarity_threshold
+FUZZY_THRESHOLD = 0.3
+
+
+# Pondération BM25 : paramètres usuels, poids par champ et bonus « mis en avant »
+BM25_K1 = 1.2
+BM25_B = 0.75
+FIELD_WEIGHTS = {'services': 3.0, 'name': 2.0, 'description': 1.0}
+FEATURED_BOOST = 1.5
+
+
+def _service_text(name, search_keywords):
+    return f"{name} {(search_keywords or '').replace(',', ' ')}"
+
+
+def _bm25(tf, df, n, length, avg_length):
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    norm = 1 - BM25_B + BM25_B * length / (avg_length or 1)
+    return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+
+class SearchIndex:
+    """Index terme → identifiants, pour les types de services et les prestataires actifs"""
+
+    def __init__(self):
+        self.version = None
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._service_terms = {}     # terme → {service_id}
+        self._service_docs = {}      # service_id → {termes}
+        self._name_terms = {}        # terme → {vendor_id}, nom du prestataire
+        self._desc_terms = {}        # terme → {vendor_id}, description
+        self._name_docs = {}         # vendor_id → Counter(termes du nom)
+        self._desc_docs = {}         # vendor_id → Counter(termes de la description)
+        self._name_length = 0        # somme des longueurs, pour la longueur moyenne
+        self._desc_length = 0
+        self._service_vendors = {}   # service_id → {vendor_id actifs}
+        self._vendor_services = {}   # vendor_id → {service_id}
+        self._sort_keys = {}         # vendor_id → clé de tri (mis en avant, date)
+        self._service_vocab = None
+        self._service_grams = None   # trigramme → {termes de services}
+        self._vendor_vocab = None
+
+    # ── Construction ──
+
+    def build(self, version):
+        """Reconstruit l'index complet : trois requêtes, quelle que soit la taille du catalogue"""
+        from .models import ServiceType, VendorProfile
+
+        with self.lock:
+            self._reset()
+            for pk, name, keywords in ServiceType.objects.values_list('pk', 'name', 'search_keywords'):
+                self._index_service(pk, name, keywords)
+            vendors = VendorProfile.objects.filter(is_active=True).values_list(
+                'pk', 'business_name', 'description', 'is_featured', 'created_at'
+            )
+            for pk, business_name, description, is_featured, created_at in vendors:
+                self._index_vendor(pk, business_name, description, is_featured, created_at)
+            links = VendorProfile.service_types.through.objects.filter(
+                vendorprofile__is_active=True
+            ).values_list('vendorprofile_id', 'servicetype_id')
+            for vendor_id, service_id in links:
+                self._link(vendor_id, service_id)
+            self.version = version
+
+    def _index_service(self, pk, name, keywords):
+        terms = set(tokenize(_service_text(name, keywords)))
+        self._service_docs[pk] = terms
+        for term in terms:
+            self._service_terms.setdefault(term, set()).add(pk)
+        self._service_vocab = None
+
+    def _index_vendor(self, pk, business_name, description, is_featured, created_at):
+        name = Counter(tokenize(business_name))
+        desc = Counter(tokenize(description))
+        self._name_docs[pk] = name
+        self._desc_docs[pk] = desc
+        self._name_length += sum(name.values())
+        self._desc_length += sum(desc.values())
+        for term in name:
+            self._name_terms.setdefault(term, set()).add(pk)
+        for term in desc:
+            self._desc_terms.setdefault(term, set()).add(pk)
+        self._sort_keys[pk] = (is_featured, created_at)
+        self._vendor_services.setdefault(pk, set())
+        self._vendor_vocab = None
+
+    def _link(self, vendor_id, service_id):
+        if vendor_id in self._sort_keys:
+            self._vendor_services[vendor_id].add(service_id)
+            self._service_vendors.setdefault(service_id, set()).add(vendor_id)
+
+    @staticmethod
+    def _unindex(pk, terms, postings):
+        for term in terms:
+            ids = postings.get(term)
+            if ids is not None:
+                ids.discard(pk)
+                if not ids:
+                    del postings[term]
+
+    # ── Mises à jour incrémentales ──
+
+    def remove_service(self, pk):
+        with self.lock:
+            self._unindex(pk, self._service_docs.pop(pk, ()), self._service_terms)
+            for vendor_id in self._service_vendors.pop(pk, ()):
+                self._vendor_services[vendor_id].discard(pk)
+            self._service_vocab = None
+
+    def refresh_service(self, pk):
+        from .models import ServiceType
+
+        with self.lock:
+            self._unindex(pk, self._service_docs.pop(pk, ()), self._service_terms)
+            row = ServiceType.objects.filter(pk=pk).values_list('name', 'search_keywords').first()
+            if row is None:
+                self.remove_service(pk)
+            else:
+                self._index_service(pk, *row)
+
+    def remove_vendor(self, pk):
+        with self.lock:
+            name = self._name_docs.pop(pk, Counter())
+            desc = self._desc_docs.pop(pk, Counter())
+            self._name_length -= sum(name.values())
+            self._desc_length -= sum(desc.values())
+            self._unindex(pk, name, self._name_terms)
+            self._unindex(pk, desc, self._desc_terms)
+            for service_id in self._vendor_services.pop(pk, ()):
+                self._service_vendors.get(service_id, set()).discard(pk)
+            self._sort_keys.pop(pk, None)
+            self._vendor_vocab = None
+
+    def refresh_vendor(self, pk):
+        from .models import VendorProfile
+
+        with self.lock:
+            self.remove_vendor(pk)
+            row = VendorProfile.objects.filter(pk=pk, is_active=True).values_list(
+                'business_name', 'description', 'is_featured', 'created_at'
+            ).first()
+            if row is None:
+                return
+            self._index_vendor(pk, *row)
+            for service_id in VendorProfile.service_types.through.objects.filter(
+                vendorprofile_id=pk
+            ).values_list('servicetype_id', flat=True):
+                self._link(pk, service_id)
+
+    # ── Recherche ──
+
+    def _ensure_vocab(self):
+        if self._service_vocab is None:
+            self._service_vocab = sorted(self._service_terms)
+            self._service_grams = {}
+            for term in self._service_vocab:
+                for gram in trigrams(term):
+                    self._service_grams.setdefault(gram, []).append(term)
+        if self._vendor_vocab is None:
+            self._vendor_vocab = sorted(self._name_terms.keys() | self._desc_terms.keys())
+
+    @staticmethod
+    def _expand(term, vocab):
+        """Termes du vocabulaire commençant par `term`"""
+        i = bisect_left(vocab, term)
+        j = i
+        while j < len(vocab) and vocab[j].startswith(term):
+            j += 1
+        return vocab[i:j]
+
+    @staticmethod
+    def _ids(expanded, *postings):
+        ids = set()
+        for term in expanded:
+            for index in postings:
+                ids |= index.get(term, set())
+        return ids
+
+    def _match_services(self, terms):
+        result = None
+        for term in terms:
+            ids = self._ids(self._expand(term, self._service_vocab), self._service_terms)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        vendor_ids = set()
+        for service_id in result:
+            vendor_ids |= self._service_vendors.get(service_id, set())
+        return vendor_ids
+
+    def _match_vendors(self, terms):
+        result = None
+        for term in terms:
+            ids = self._ids(self._expand(term, self._vendor_vocab), self._name_terms, self._desc_terms)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def _fuzzy_services(self, terms):
+        """
+        Types de services proches de la requête malgré les fautes de frappe
+        ('fotographe', 'traiter') : {service_id: similarité moyenne sur les termes}
+        """
+        totals = Counter()
+        for term in terms:
+            grams = trigrams(term)
+            shared = Counter(
+                candidate for gram in grams for candidate in self._service_grams.get(gram, ())
+            )
+            best = {}
+            for candidate, n in shared.items():
+                similarity = n / (len(grams) + len(trigrams(candidate)) - n)
+                if similarity < FUZZY_THRESHOLD:
+                    continue
+                for service_id in self._service_terms[candidate]:
+                    best[service_id] = max(best.get(service_id, 0), similarity)
+            totals.update(best)
+        return {
+            service_id: total / len(terms)
+            for service_id, total in totals.items()
+            if total / len(terms) >= FUZZY_THRESHOLD
+        }
+
+    def _scores(self, terms, candidates):
+        """
+        Score BM25 de chaque candidat, sommé sur les champs services (nombre de
+        services du prestataire contenant le terme), nom et description
+        """
+        n = len(self._sort_keys) or 1
+        avg_services = sum(len(s) for s in self._vendor_services.values()) / n
+        avg_name = self._name_length / n
+        avg_desc = self._desc_length / n
+        scores = dict.fromkeys(candidates, 0.0)
+
+        for term in terms:
+            service_terms = self._expand(term, self._service_vocab)
+            vendor_terms = self._expand(term, self._vendor_vocab)
+            services = self._ids(service_terms, self._service_terms)
+            df = {
+                'services': len(self._ids(services, self._service_vendors)),
+                'name': len(self._ids(vendor_terms, self._name_terms)),
+                'description': len(self._ids(vendor_terms, self._desc_terms)),
+            }
+            for pk in candidates:
+                vendor_services = self._vendor_services[pk]
+                name = self._name_docs[pk]
+                desc = self._desc_docs[pk]
+                fields = (
+                    ('services', len(vendor_services & services), len(vendor_services), avg_services),
+                    ('name', sum(name[t] for t in vendor_terms), sum(name.values()), avg_name),
+                    ('description', sum(desc[t] for t in vendor_terms), sum(desc.values()), avg_desc),
+                )
+                for field, tf, length, avg_length in fields:
+                    if tf:
+                        scores[pk] += FIELD_WEIGHTS[field] * _bm25(tf, df[field], n, length, avg_length)
+
+        for pk in candidates:
+            if self._sort_keys[pk][0]:
+                scores[pk] *= FEATURED_BOOST
+        return scores
+
+    def search(self, query):
+        """
+        Identifiants des prestataires actifs correspondant à la requête,
+        du plus pertinent au moins pertinent (BM25, prestataires mis en avant favorisés)
+
+        Tous les termes doivent apparaître dans le nom ou les mots-clés d'un même
+        type de service ; à défaut, dans le nom ou la description du prestataire ;
+        à défaut encore, on tolère les fautes de frappe sur les services et les
+        résultats sont alors classés par similarité.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            self._ensure_vocab()
+
+            vendor_ids = self._match_services(terms) or self._match_vendors(terms)
+            if vendor_ids:
+                scores = self._scores(terms, vendor_ids)
+            else:
+                scores = {}
+                for service_id, similarity in self._fuzzy_services(terms).items():
+                    for vendor_id in self._service_vendors.get(service_id, ()):
+                        scores[vendor_id] = max(scores.get(vendor_id, 0), similarity)
+            return sorted(scores, key=lambda pk: (scores[pk],) + self._sort_keys[pk], reverse=True)
+
+
+_index = SearchIndex()
+
+
+def get_index():
+    """Index du worker courant, reconstruit si le catalogue a changé ailleurs"""
+    version = get_catalogue_version()
+    if _index.version != version:
+        with _index.lock:
+            if _index.version != version:
+                _index.build(version)
+    return _index
+
+
+def apply_change(new_version, change):
+    """
+    Applique une modification du catalogue à l'index local sans le reconstruire,
+    seulement s'il était exactement à la version précédente : si un autre
+    worker a changé le catalogue entre-temps, cette modification-là manquerait
+    à l'index, qui est alors marqué à reconstruire à la prochaine recherche.
+    """
+    with _index.lock:
+        sequence = version_sequence(new_version)
+        if (
+            _index.version is not None and sequence is not None
+            and version_sequence(_index.version) == sequence - 1
+        ):
+            change(_index)
+            _index.version = new_version
+        else:
+            _index.version = None
@@ -0,0 +1,29 @@
+"""
+Journal des recherches, écrit par lots pour ne pas ajouter d'écriture en base
+à chaque recherche. Sert au rapport des recherches sans résultat (admin).
+"""
+from django.utils import timezone
+
+from apps.core.buffers import BulkBuffer
+from .models import SearchQueryLog
+from .search_index import words
+
+
+def _save(entries):
+    SearchQueryLog.objects.bulk_create([SearchQueryLog(**entry) for entry in entries])
+
+
+buffer = BulkBuffer(_save, max_size=50, max_age=60)
+
+
+def log_search(query, results_count, filters=None):
+    normalized = ' '.join(words(query))
+    if not normalized:
+        return
+    buffer.add({
+        'query': query[:200],
+        'normalized_query': normalized[:200],
+        'results_count': results_count,
+        'filters': filters or {},
+        'searched_at': timezone.now(),
+    })
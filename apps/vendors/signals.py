@@ -0,0 +1,149 @@
+"""
+Invalidation du catalogue : toute modification d'un prestataire ou d'un type de
+service change la version du catalogue (partagée entre les workers), met à
+jour l'index de recherche du worker courant et les vecteurs plein texte, et
+prévoit la reconstruction des vecteurs TF-IDF
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.core.cache_utils import bump_catalogue_version
+from apps.core.models import City, Country
+from . import search_index
+from .models import ServiceType, VendorApplication, VendorImage, VendorProfile
+from .search import update_search_vectors
+from .vectors import schedule_rebuild
+
+
+def _catalogue_changed(change, vendor_ids=None):
+    """
+    `change` reçoit l'index de recherche local ; `vendor_ids` (ou une fonction
+    qui les retourne) désigne les prestataires dont le vecteur doit être recalculé
+    """
+    def _apply():
+        search_index.apply_change(bump_catalogue_version(), change)
+        ids = vendor_ids() if callable(vendor_ids) else vendor_ids
+        if ids:
+            update_search_vectors(ids)
+        schedule_rebuild()
+    transaction.on_commit(_apply)
+
+
+def _touch_vendors(vendor_ids):
+    """
+    Avance updated_at des prestataires dont la fiche change sans passer par
+    save() (photos, services, villes) : c'est le validateur HTTP de vendor_detail
+    """
+    if vendor_ids:
+        VendorProfile.objects.filter(pk__in=vendor_ids).update(updated_at=timezone.now())
+
+
+def _service_vendor_ids(service_pk):
+    return lambda: list(
+        VendorProfile.service_types.through.objects.filter(
+            servicetype_id=service_pk
+        ).values_list('vendorprofile_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ServiceType)
+def service_type_saved(sender, instance, **kwargs):
+    _catalogue_changed(
+        lambda index: index.refresh_service(instance.pk),
+        _service_vendor_ids(instance.pk),
+    )
+
+
+@receiver(pre_delete, sender=ServiceType)
+def service_type_deleting(sender, instance, **kwargs):
+    # Les liens M2M disparaissent avec le service : on retient les prestataires concernés
+    instance._vendor_ids = _service_vendor_ids(instance.pk)()
+
+
+@receiver(post_delete, sender=ServiceType)
+def service_type_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    _catalogue_changed(
+        lambda index: index.remove_service(pk),
+        getattr(instance, '_vendor_ids', None),
+    )
+
+
+@receiver(post_save, sender=VendorProfile)
+def vendor_saved(sender, instance, **kwargs):
+    _catalogue_changed(lambda index: index.refresh_vendor(instance.pk), [instance.pk])
+
+
+@receiver(post_delete, sender=VendorProfile)
+def vendor_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    _catalogue_changed(lambda index: index.remove_vendor(pk))
+
+
+@receiver(m2m_changed, sender=VendorProfile.service_types.through)
+def vendor_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if reverse and action == 'pre_clear':
+        # instance est un ServiceType dont tous les prestataires vont être retirés
+        instance._vendor_ids = _service_vendor_ids(instance.pk)()
+        return
+    if action == 'pre_clear':
+        return
+    if reverse and action == 'post_clear':
+        pk = instance.pk
+
+        def _change(index):
+            index.remove_service(pk)
+            index.refresh_service(pk)
+        vendor_ids = getattr(instance, '_vendor_ids', None)
+    else:
+        vendor_ids = set(pk_set or ()) if reverse else {instance.pk}
+        _touch_vendors(vendor_ids)
+
+        def _change(index):
+            for vendor_id in vendor_ids:
+                index.refresh_vendor(vendor_id)
+
+    _catalogue_changed(_change, vendor_ids)
+
+
+@receiver(m2m_changed, sender=VendorProfile.cities.through)
+def vendor_cities_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Les villes ne sont pas indexées pour la recherche, mais comptent pour les facettes
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            _touch_vendors([instance.pk])
+        elif pk_set:
+            _touch_vendors(pk_set)
+        _catalogue_changed(lambda index: None)
+
+
+@receiver(post_save, sender=VendorImage)
+@receiver(post_delete, sender=VendorImage)
+def vendor_image_changed(sender, instance, **kwargs):
+    # Sans effet sur la recherche ; invalide les fragments et projections qui affichent les photos
+    _touch_vendors([instance.vendor_id])
+    _catalogue_changed(lambda index: None)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def location_changed(sender, instance, **kwargs):
+    # Noms de villes des cartes et facettes par lieu ; une ville supprimée en
+    # cascade quitte les prestataires sans m2m_changed
+    _catalogue_changed(lambda index: None)
+
+
+@receiver(post_save, sender=VendorApplication)
+@receiver(post_delete, sender=VendorApplication)
+def vendor_application_changed(sender, instance, created=False, **kwargs):
+    # Le numéro WhatsApp de la candidature sert de repli au prestataire créé
+    # (_contact_directory) ; une nouvelle candidature sans profil n'affiche rien
+    if created and not instance.vendor_profile_id:
+        return
+    _catalogue_changed(lambda index: None)
@@ -0,0 +1,154 @@
+"""
+« Prestataires similaires » : recommandations précalculées chaque nuit.
+
+Trois similarités cosinus entre prestataires actifs, mélangées :
+- co-consultation : deux prestataires dont les coordonnées ont été demandées
+  par le même visiteur (même session, sinon même IP) ;
+- types de service en commun ;
+- villes d'intervention en commun.
+
+Chaque relation est une matrice creuse (groupe × prestataire) : visiteur,
+service ou ville. Le produit XᵀX est calculé d'un bloc avec numpy, en joignant
+les membres de chaque groupe deux à deux, sans requête par prestataire. Les
+`TOP_K` meilleurs voisins de chaque prestataire sont écrits dans SimilarVendor.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.cache_utils import bump_version
+from .models import ContactView, SimilarVendor, VendorProfile
+
+
+TOP_K = 6
+CONTACT_DAYS = 180
+# Au-delà, un « visiteur » est un robot ou une IP partagée : il ne dit rien de la similarité
+MAX_VENDORS_PER_VISITOR = 30
+WEIGHTS = {'contacts': 0.6, 'services': 0.3, 'cities': 0.1}
+# Change à chaque recalcul : fait partie de l'ETag de vendor_detail
+SIMILAR_VERSION_KEY = 'similar_vendors_version'
+
+
+def _cooccurrences(groups, members, size):
+    """
+    Produit XᵀX d'une matrice binaire creuse donnée par ses couples (groupe,
+    membre), membres numérotés de 0 à size - 1 : retourne (clés i * size + j,
+    nombre de groupes communs) hors diagonale, et le nombre de groupes de chaque membre.
+    """
+    pairs = np.unique(np.stack([groups, members]), axis=1) if len(groups) else np.zeros((2, 0), dtype=np.int64)
+    groups, members = pairs
+    degree = np.bincount(members, minlength=size)
+
+    # Couples triés par groupe : chaque élément est joint à tous les membres de son groupe
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(groups)])
+    group_start = np.repeat(starts, lengths)
+    group_length = np.repeat(lengths, lengths)
+
+    left = np.repeat(members, group_length)
+    first_partner = np.repeat(group_start, group_length)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(group_length) - group_length, group_length)
+    right = members[first_partner + offsets]
+
+    off_diagonal = left != right
+    keys, counts = np.unique(left[off_diagonal] * size + right[off_diagonal], return_counts=True)
+    return keys, counts, degree
+
+
+def _cosine(groups, members, size):
+    keys, counts, degree = _cooccurrences(groups, members, size)
+    left, right = np.divmod(keys, size)
+    return keys, counts / np.sqrt(degree[left] * degree[right])
+
+
+def _encode(values):
+    """Numérote des identifiants quelconques (clés de visiteur, pk) de 0 à n - 1"""
+    _, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.int64)
+
+
+def compute_similarities(top_k=TOP_K, contact_days=CONTACT_DAYS, weights=WEIGHTS):
+    """Liste de (vendor_id, similar_id, rang, score) pour tous les prestataires actifs"""
+    vendor_ids = np.array(
+        sorted(VendorProfile.objects.filter(is_active=True).values_list('pk', flat=True)), dtype=np.int64,
+    )
+    size = len(vendor_ids)
+    if size < 2:
+        return []
+
+    def relation(rows):
+        """(groupes, membres) d'une liste de couples (clé de groupe, vendor_id), prestataires actifs seulement"""
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        keys, vendors = zip(*rows)
+        vendors = np.array(vendors, dtype=np.int64)
+        positions = np.searchsorted(vendor_ids, vendors).clip(max=size - 1)
+        active = vendor_ids[positions] == vendors
+        return _encode(keys)[active], positions[active]
+
+    since = timezone.now() - timedelta(days=contact_days)
+    views = ContactView.objects.filter(viewed_at__gte=since, vendor__is_active=True)
+    visitors, members = relation([
+        (f's:{session}' if session else f'i:{ip}', vendor_id)
+        for vendor_id, session, ip in views.values_list('vendor_id', 'session_key', 'ip_address')
+        if session or ip
+    ])
+    if len(visitors):
+        pairs = np.unique(np.stack([visitors, members]), axis=1)
+        visited = np.bincount(pairs[0])
+        keep = visited[pairs[0]] <= MAX_VENDORS_PER_VISITOR
+        visitors, members = pairs[0][keep], pairs[1][keep]
+
+    relations = {
+        'contacts': (visitors, members),
+        'services': relation(list(
+            VendorProfile.service_types.through.objects.values_list('servicetype_id', 'vendorprofile_id')
+        )),
+        'cities': relation(list(VendorProfile.cities.through.objects.values_list('city_id', 'vendorprofile_id'))),
+    }
+
+    # Somme pondérée des trois matrices creuses, sur l'union de leurs clés
+    all_keys, all_scores = [], []
+    for name, (groups, group_members) in relations.items():
+        keys, scores = _cosine(groups, group_members, size)
+        all_keys.append(keys)
+        all_scores.append(scores * weights[name])
+    keys, inverse = np.unique(np.concatenate(all_keys), return_inverse=True)
+    if not len(keys):
+        return []
+    scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+    left, right = np.divmod(keys, size)
+
+    # top_k par ligne : tri par prestataire puis score décroissant, rang dans chaque ligne
+    order = np.lexsort((right, -scores, left))
+    left, right, scores = left[order], right[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    rank = np.arange(len(left)) - np.repeat(starts, np.diff(np.r_[starts, len(left)]))
+    keep = rank < top_k
+    return list(zip(
+        vendor_ids[left[keep]].tolist(), vendor_ids[right[keep]].tolist(),
+        (rank[keep] + 1).tolist(), scores[keep].round(6).tolist(),
+    ))
+
+
+def build_similar_vendors(**options):
+    """Recalcule et remplace toute la table SimilarVendor ; retourne le nombre de liens"""
+    rows = compute_similarities(**options)
+    with transaction.atomic():
+        SimilarVendor.objects.all().delete()
+        SimilarVendor.objects.bulk_create(
+            [SimilarVendor(vendor_id=v, similar_id=s, rank=r, score=score) for v, s, r, score in rows],
+            batch_size=1000,
+        )
+        transaction.on_commit(lambda: bump_version(SIMILAR_VERSION_KEY))
+    return len(rows)
+
+
+def similar_vendor_ids(vendor_id, limit=TOP_K):
+    """Voisins précalculés d'un prestataire, par rang (un accès à l'index unique vendor, rank)"""
+    return list(
+        SimilarVendor.objects.filter(vendor_id=vendor_id, rank__lte=limit)
+        .order_by('rank').values_list('similar_id', flat=True)
+    )
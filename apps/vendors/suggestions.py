@@ -0,0 +1,63 @@
+"""
+Suggestions de recherche (autocomplétion) : tableau trié de clés repliées,
+interrogé par dichotomie. Reconstruit dans chaque worker quand le catalogue change.
+"""
+from bisect import bisect_left
+from django.urls import reverse
+
+from apps.core.cache_utils import catalogue_memo
+from .models import ServiceType, VendorProfile
+from .search_index import words
+
+
+SUGGESTION_LIMIT = 5
+
+
+def _keys(label):
+    """Clés d'une entrée : le libellé complet puis chaque fin commençant par un mot"""
+    parts = words(label)
+    return {' '.join(parts[i:]) for i in range(len(parts))}
+
+
+@catalogue_memo
+def _entries():
+    """Liste triée de (clé, type, ordre, libellé, lien) ; type 0 = service, 1 = prestataire"""
+    entries = set()
+    for pk, name, keywords in ServiceType.objects.values_list('pk', 'name', 'search_keywords'):
+        link = f"{reverse('vendors:vendor_list')}?service_types={pk}"
+        sources = [name] + [k for k in (keywords or '').split(',') if k.strip()]
+        for source in sources:
+            for key in _keys(source):
+                entries.add((key, 0, name, name, link))
+    vendors = VendorProfile.objects.filter(is_active=True).values_list('business_name', 'slug')
+    for business_name, slug in vendors:
+        link = reverse('vendors:vendor_detail', args=[slug])
+        for key in _keys(business_name):
+            entries.add((key, 1, business_name, business_name, link))
+    entries = sorted(entries)
+    return [e[0] for e in entries], entries
+
+
+def normalize_prefix(prefix):
+    return ' '.join(words(prefix))
+
+
+def suggest(prefix, limit=SUGGESTION_LIMIT):
+    """Services puis prestataires dont un mot commence par `prefix` (sans accents)"""
+    prefix = normalize_prefix(prefix)
+    if not prefix:
+        return {'services': [], 'vendors': []}
+    keys, entries = _entries()
+    found = ({}, {})
+    i = bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix):
+        _, kind, _, label, link = entries[i]
+        if len(found[kind]) < limit:
+            found[kind].setdefault(link, label)
+        elif len(found[1 - kind]) >= limit:
+            break
+        i += 1
+    return {
+        'services': [{'name': label, 'url': link} for link, label in found[0].items()],
+        'vendors': [{'name': label, 'url': link} for link, label in found[1].items()],
+    }
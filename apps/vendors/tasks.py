@@ -50,8 +50,8 @@ def send_vendor_message(vendor_name, vendor_email, subject, body, reply_url):
 
 
 def notify_admin_new_application(name, business_name, service_types_str, email, whatsapp):
-    from apps.core.models import SiteSettings
-    admin_email = SiteSettings.get().admin_notify_email
+    from apps.core.cache_utils import get_site_settings
+    admin_email = get_site_settings().admin_notify_email
     if not admin_email:
         return
 
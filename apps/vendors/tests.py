@@ -1,3 +1,925 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from pathlib import Path
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from PIL import Image
+from apps.accounts.models import User
+from apps.ads.models import Advertisement
+from apps.core.cache_utils import bump_catalogue_version, get_catalogue_version
+from apps.core.models import City, Country
+from apps.projects.models import EventType
+from apps.vendors.cards import featured_cards, get_vendor_cards
+from apps.vendors.contact_log import buffer as contact_log_buffer
+from apps.vendors.facets import facet_counts, get_facet_sets
+from apps.vendors.models import (
+    ContactView, ContactViewDaily, SearchQueryLog, ServiceType, SimilarVendor, VendorApplication, VendorImage,
+    VendorProfile,
+)
+from apps.vendors.search import reset_search_cache_stats, search_cache_stats, search_page, semantic_search
+from apps.vendors import search_index
+from apps.vendors.search_index import fold, stem, tokenize
+from apps.vendors.search_log import buffer as search_log_buffer
+from apps.vendors.similar import _cooccurrences, build_similar_vendors
+from apps.vendors.suggestions import suggest
+from apps.vendors.vectors import REBUILD_LOCK_KEY, build_vectors, schedule_rebuild, vector_search
+from apps.vendors.views import _category_cursor, _top_vendors_by_category
 
-# Create your tests here.
+
+class NormalizationTests(TestCase):
+    """Tests pour la normalisation des termes de recherche"""
+
+    def test_fold_removes_accents_and_case(self):
+        self.assertEqual(fold('Gâteau Crème Brûlée'), 'gateau creme brulee')
+
+    def test_stem_groups_plural_and_singular(self):
+        self.assertEqual(stem('gateaux'), stem('gateau'))
+        self.assertEqual(stem('photographes'), stem('photographe'))
+        self.assertEqual(stem('traiteurs'), stem('traiteur'))
+
+    def test_tokenize_drops_stop_words(self):
+        self.assertEqual(tokenize('Salle de mariage'), ['salle', stem('mariage')])
+
+
+class SemanticSearchTests(TestCase):
+    """Tests pour la recherche de prestataires via l'index en mémoire"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pastry = ServiceType.objects.create(
+                name='Pâtisserie', search_keywords='gâteau, gateaux, dessert'
+            )
+            self.dj = ServiceType.objects.create(name='DJ', search_keywords='musique, sono')
+            self.baker = VendorProfile.objects.create(
+                business_name='Chez Aminata', description='Pièces montées', is_active=True
+            )
+            self.baker.service_types.add(self.pastry)
+            self.inactive = VendorProfile.objects.create(
+                business_name='Gâteaux Fermés', description='Fermé', is_active=False
+            )
+            self.inactive.service_types.add(self.pastry)
+
+    def test_accent_insensitive_service_match(self):
+        self.assertEqual(semantic_search('gateau'), [self.baker])
+        self.assertEqual(semantic_search('GÂTEAUX'), [self.baker])
+
+    def test_prefix_match(self):
+        self.assertEqual(semantic_search('patis'), [self.baker])
+
+    def test_fallback_on_vendor_name_and_description(self):
+        self.assertEqual(semantic_search('aminata'), [self.baker])
+        self.assertEqual(semantic_search('pieces montees'), [self.baker])
+
+    def test_no_match(self):
+        self.assertEqual(semantic_search('photographe'), [])
+        self.assertEqual(semantic_search('   '), [])
+
+    def test_index_follows_catalogue_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.baker.service_types.add(self.dj)
+        self.assertEqual(semantic_search('sono'), [self.baker])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.baker.is_active = False
+            self.baker.save()
+        self.assertEqual(semantic_search('gateau'), [])
+
+    def test_index_rebuilt_when_another_worker_changed_catalogue(self):
+        semantic_search('gateau')
+        index = search_index.get_index()
+        bump_catalogue_version()  # modification faite par un autre worker, absente de cet index
+        search_index.apply_change(bump_catalogue_version(), lambda index: None)
+        self.assertIsNone(index.version)
+
+        semantic_search('gateau')
+        search_index.apply_change(bump_catalogue_version(), lambda index: None)
+        self.assertEqual(index.version, get_catalogue_version())
+
+    def test_search_does_not_query_matching_tables(self):
+        semantic_search('gateau')
+        # Une requête pour la page, trois pour les prefetch
+        with self.assertNumQueries(4):
+            semantic_search('dessert')
+
+    @override_settings(VENDOR_SEARCH_BACKEND='postgres')
+    def test_postgres_backend_falls_back_outside_postgresql(self):
+        self.assertEqual(semantic_search('gateau'), [self.baker])
+
+    def test_typo_tolerance_ranked_by_similarity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ServiceType.objects.create(name='Photographe', search_keywords='photo, shooting')
+            photographer = VendorProfile.objects.create(
+                business_name='Studio Lumière', description='Portraits', is_active=True
+            )
+            photographer.service_types.add(photo)
+        self.assertEqual(semantic_search('fotographe'), [photographer])
+        self.assertEqual(semantic_search('gatau'), [self.baker])
+
+
+class SearchRankingTests(TestCase):
+    """Tests pour le classement BM25 et la pagination des résultats"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dj = ServiceType.objects.create(name='DJ', search_keywords='musique, sono')
+            self.vendors = []
+            for i in range(5):
+                vendor = VendorProfile.objects.create(
+                    business_name=f'Ambiance {i}', description='Soirées', is_active=True
+                )
+                vendor.service_types.add(self.dj)
+                self.vendors.append(vendor)
+            self.named = VendorProfile.objects.create(
+                business_name='Sono Max', description='Musique et sono pour mariages', is_active=True
+            )
+            self.named.service_types.add(self.dj)
+
+    def test_more_fields_matching_ranks_first(self):
+        self.assertEqual(semantic_search('sono')[0], self.named)
+
+    def test_featured_vendor_is_boosted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendors[0].is_featured = True
+            self.vendors[0].save()
+        results = semantic_search('dj')
+        self.assertEqual(results[0], self.vendors[0])
+
+    def test_cursor_pagination_walks_the_ranked_list(self):
+        first, cursor, total = search_page('dj', page_size=4)
+        self.assertEqual(total, 6)
+        self.assertEqual(len(first), 4)
+        second, next_cursor, _ = search_page('dj', cursor=cursor, page_size=4)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(next_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_next_pages_reuse_cached_ranking(self):
+        _, cursor, _ = search_page('dj', page_size=4)
+        # Classement en cache, cartes en mémoire
+        with self.assertNumQueries(0):
+            search_page('dj', cursor=cursor, page_size=4)
+
+    def test_next_pages_keep_first_page_version(self):
+        _, cursor, _ = search_page('dj', page_size=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            VendorProfile.objects.create(business_name='DJ Nouveau', description='-', is_active=True)
+        reset_search_cache_stats()
+        search_page('dj', cursor=cursor, page_size=4)
+        stats = search_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 0))
+        search_page('dj', cursor='1.zz:4', page_size=4)
+        self.assertEqual(search_cache_stats()['misses'], 1)
+
+    def test_normalized_queries_share_cache_entry(self):
+        reset_search_cache_stats()
+        semantic_search('Sono')
+        semantic_search('  SONO ')
+        self.assertEqual(search_cache_stats()['misses'], 1)
+        self.assertEqual(search_cache_stats()['hits'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.named.save()
+        semantic_search('sono')
+        self.assertEqual(search_cache_stats()['misses'], 2)
+
+    def test_vendor_list_search_links_next_page(self):
+        self.addCleanup(search_log_buffer.flush)
+        response = self.client.get('/vendors/', {'search': 'dj'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['search_total'], 6)
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_next_page_link_keeps_filters(self):
+        self.addCleanup(search_log_buffer.flush)
+        lome = City.objects.create(name='Lomé', country=Country.objects.create(name='Togo', code='TG'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(21):
+                vendor = VendorProfile.objects.create(business_name=f'DJ Lomé {i}', description='-', is_active=True)
+                vendor.service_types.add(self.dj)
+                vendor.cities.add(lome)
+        response = self.client.get('/vendors/', {'search': 'dj', 'city_id': lome.pk})
+        self.assertEqual(response.context['search_total'], 21)
+        link = response.context['next_page_query']
+        self.assertIn(f'city_id={lome.pk}', link)
+        self.assertContains(response, f'href="?{escape(link)}"')
+
+        second = self.client.get(f'/vendors/?{link}')
+        self.assertEqual(second.context['search_total'], 21)
+        self.assertEqual(len(second.context['search_results']), 1)
+        self.assertEqual(second.context['search_results'][0].city_names, ('Lomé',))
+        self.assertEqual(second.context['next_page_query'], '')
+
+
+class SuggestionTests(TestCase):
+    """Tests pour l'autocomplétion de la recherche"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pastry = ServiceType.objects.create(name='Pâtisserie', search_keywords='gâteau, dessert')
+            self.vendor = VendorProfile.objects.create(
+                business_name='Délices de Lomé', slug='delices-de-lome', is_active=True
+            )
+            VendorProfile.objects.create(business_name='Délices Fermés', slug='delices-fermes', is_active=False)
+
+    def test_prefix_matches_services_keywords_and_vendor_names(self):
+        self.assertEqual([s['name'] for s in suggest('GÂT')['services']], ['Pâtisserie'])
+        self.assertEqual([s['name'] for s in suggest('pat')['services']], ['Pâtisserie'])
+        self.assertEqual(suggest('deli')['vendors'], [
+            {'name': 'Délices de Lomé', 'url': '/vendors/delices-de-lome/'},
+        ])
+        self.assertEqual([v['name'] for v in suggest('lome')['vendors']], ['Délices de Lomé'])
+        self.assertEqual(suggest('  '), {'services': [], 'vendors': []})
+
+    def test_suggestions_follow_catalogue_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceType.objects.create(name='Photographe')
+        self.assertEqual([s['name'] for s in suggest('photo')['services']], ['Photographe'])
+
+    def test_endpoint_etag(self):
+        url = '/vendors/recherche/suggestions/'
+        response = self.client.get(url, {'q': 'pati'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['services'][0]['name'], 'Pâtisserie')
+        self.assertIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.client.get(url, {'q': 'Pâti'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pastry.save()
+        response = self.client.get(url, {'q': 'pati'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class VectorSearchTests(TestCase):
+    """Tests pour le classement sémantique TF-IDF hors ligne"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(SEARCH_VECTORS_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            decor = ServiceType.objects.create(name='Décoration', search_keywords='fleurs, ballons')
+            self.tailor = VendorProfile.objects.create(
+                business_name='Atelier Kenté',
+                description='Tenues traditionnelles et pagnes tissés pour cérémonies coutumières',
+                is_active=True,
+            )
+            self.decorator = VendorProfile.objects.create(
+                business_name='Déco Plus', description='Anniversaires et baptêmes', is_active=True
+            )
+            self.decorator.service_types.add(decor)
+        build_vectors()
+
+    def test_related_words_without_shared_keyword(self):
+        # « traditionnel » et « coutume » n'apparaissent pas tels quels
+        self.assertEqual(vector_search('mariage traditionnel coutume')[0], self.tailor.pk)
+        self.assertEqual(vector_search('zzz'), [])
+
+    def test_semantic_search_falls_back_on_vectors(self):
+        self.assertEqual(semantic_search('mariage traditionnel coutume'), [self.tailor])
+
+    def test_new_build_is_picked_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tailor.is_active = False
+            self.tailor.save()
+        build_vectors()
+        self.assertNotIn(self.tailor.pk, vector_search('tenues traditionnelles'))
+
+
+    @override_settings(SEARCH_VECTORS_REBUILD_DELAY=3600)
+    def test_rebuild_scheduled_once_for_several_changes(self):
+        self.addCleanup(cache.delete, REBUILD_LOCK_KEY)
+        before = set(threading.enumerate())
+        schedule_rebuild()
+        schedule_rebuild()
+        timers = [t for t in threading.enumerate() if t not in before and isinstance(t, threading.Timer)]
+        for timer in timers:
+            timer.cancel()
+        self.assertEqual(len(timers), 1)
+
+
+class SearchLogTests(TestCase):
+    """Tests pour le journal des recherches écrit par lots"""
+
+    def setUp(self):
+        # Entrées laissées par les autres tests de vues
+        search_log_buffer.flush()
+        SearchQueryLog.objects.all().delete()
+        self.addCleanup(search_log_buffer.flush)
+        with self.captureOnCommitCallbacks(execute=True):
+            dj = ServiceType.objects.create(name='DJ', search_keywords='musique')
+            vendor = VendorProfile.objects.create(business_name='Sono Max', description='Soirées', is_active=True)
+            vendor.service_types.add(dj)
+
+    def test_searches_are_buffered_then_bulk_written(self):
+        with self.assertNumQueries(0):
+            for query in ('DJ', 'dj ', 'Sonorisation plage'):
+                search_log_buffer.add({
+                    'query': query, 'normalized_query': fold(query).strip(), 'results_count': 0,
+                    'filters': {}, 'searched_at': timezone.now(),
+                })
+        self.assertEqual(SearchQueryLog.objects.count(), 0)
+        self.assertEqual(search_log_buffer.flush(), 3)
+        self.assertEqual(SearchQueryLog.objects.count(), 3)
+
+    def test_vendor_list_logs_first_page_and_report_lists_zero_results(self):
+        self.client.get('/vendors/', {'search': 'DJ'})
+        self.client.get('/vendors/', {'search': 'Château gonflable', 'city_id': '3'})
+        self.client.get('/vendors/', {'search': 'dj', 'cursor': 'abc:20'})
+        search_log_buffer.flush()
+        zero = SearchQueryLog.objects.get(results_count=0)
+        self.assertEqual(zero.normalized_query, 'chateau gonflable')
+        self.assertEqual(zero.filters, {'city_id': '3'})
+        self.assertEqual(SearchQueryLog.objects.count(), 2)
+
+        admin = User.objects.create_user(username='admin', password='Pass123!', user_type='admin')
+        self.client.force_login(admin)
+        response = self.client.get('/accounts/admin/searches/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['normalized_query'] for row in response.context['zero_queries']], ['chateau gonflable'])
+        self.assertEqual(response.context['total_searches'], 2)
+
+    def test_repeated_search_is_logged_again(self):
+        first = self.client.get('/vendors/', {'search': 'DJ'})
+        self.assertFalse(first.has_header('ETag'))
+        self.client.get('/vendors/', {'search': 'DJ'}, HTTP_IF_NONE_MATCH='"*"')
+        search_log_buffer.flush()
+        self.assertEqual(SearchQueryLog.objects.count(), 2)
+
+
+class FacetCountTests(TestCase):
+    """Tests pour les compteurs de facettes de la liste des prestataires"""
+
+    def setUp(self):
+        togo = Country.objects.create(name='Togo', code='TG')
+        benin = Country.objects.create(name='Bénin', code='BJ')
+        self.lome = City.objects.create(name='Lomé', country=togo)
+        self.cotonou = City.objects.create(name='Cotonou', country=benin)
+        self.togo, self.benin = togo, benin
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dj = ServiceType.objects.create(name='DJ', search_keywords='musique')
+            self.cake = ServiceType.objects.create(name='Pâtisserie', search_keywords='gâteau')
+            for name, service, city, active in (
+                ('Sono Lomé', self.dj, self.lome, True),
+                ('Sono Cotonou', self.dj, self.cotonou, True),
+                ('Gâteaux Lomé', self.cake, self.lome, True),
+                ('Sono Fermée', self.dj, self.lome, False),
+            ):
+                vendor = VendorProfile.objects.create(business_name=name, description='-', is_active=active)
+                vendor.service_types.add(service)
+                vendor.cities.add(city)
+
+    def test_counts_follow_the_other_filters(self):
+        counts = facet_counts()
+        self.assertEqual(counts['services'], {self.dj.pk: 2, self.cake.pk: 1})
+        self.assertEqual(counts['cities'], {self.lome.pk: 2, self.cotonou.pk: 1})
+
+        counts = facet_counts(country_id=str(self.togo.pk))
+        self.assertEqual(counts['services'], {self.dj.pk: 1, self.cake.pk: 1})
+        self.assertEqual(counts['countries'], {self.togo.pk: 2, self.benin.pk: 1})
+
+        counts = facet_counts(service_type_ids=[str(self.dj.pk)])
+        self.assertEqual(counts['countries'], {self.togo.pk: 1, self.benin.pk: 1})
+
+    def test_counts_follow_catalogue_changes_without_queries(self):
+        facet_counts()
+        with self.assertNumQueries(0):
+            facet_counts(city_id=str(self.lome.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            VendorProfile.objects.get(business_name='Sono Cotonou').cities.add(self.lome)
+        self.assertEqual(facet_counts()['cities'][self.lome.pk], 3)
+
+    def test_search_results_are_filtered_and_counted(self):
+        self.addCleanup(search_log_buffer.flush)
+        response = self.client.get('/vendors/', {'search': 'sono', 'city_id': self.lome.pk})
+        self.assertEqual(response.context['search_total'], 1)
+        counts = {country['id']: count for country, count in response.context['country_facets']}
+        self.assertEqual(counts[self.benin.pk], 1)
+
+
+class GenerateKeywordsCommandTests(TestCase):
+    """Tests pour generate_service_keywords contre un serveur local"""
+
+    def setUp(self):
+        self.calls = []
+        calls = self.calls
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                prompt = body['messages'][0]['content']
+                calls.append(prompt)
+                # Première tentative pour le DJ : erreur temporaire, à réessayer
+                if '"DJ"' in prompt and sum('"DJ"' in c for c in calls) == 1:
+                    self.send_response(503)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                name = prompt.split('"')[1].lower()
+                payload = json.dumps({'choices': [{'message': {'content': f'{name}, Mot Clé.'}}]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.endpoint = f'http://127.0.0.1:{server.server_port}/v1/chat/completions'
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = Path(tmp.name) / 'checkpoint.json'
+
+        self.dj = ServiceType.objects.create(name='DJ')
+        self.cake = ServiceType.objects.create(name='Pâtisserie')
+
+    def run_command(self, *args):
+        call_command(
+            'generate_service_keywords', '--endpoint', self.endpoint, '--rate', '100',
+            '--checkpoint', str(self.checkpoint), *args, stdout=StringIO(),
+        )
+
+    def test_generates_with_retry_and_removes_checkpoint(self):
+        self.run_command()
+        self.dj.refresh_from_db()
+        self.cake.refresh_from_db()
+        self.assertEqual(self.dj.search_keywords, 'dj, mot clé')
+        self.assertEqual(self.cake.search_keywords, 'pâtisserie, mot clé')
+        self.assertEqual(len(self.calls), 3)
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_checkpoint_skips_finished_services(self):
+        self.checkpoint.write_text(json.dumps({str(self.dj.pk): 'dj'}))
+        self.run_command('--force')
+        self.assertEqual(len(self.calls), 1)
+        self.assertIn('Pâtisserie', self.calls[0])
+
+
+class CategoryListTests(TestCase):
+    """Tests pour la liste par catégories (six premiers prestataires par type de service)"""
+
+    def setUp(self):
+        togo = Country.objects.create(name='Togo', code='TG')
+        self.lome = City.objects.create(name='Lomé', country=togo)
+        kara = City.objects.create(name='Kara', country=togo)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services = [ServiceType.objects.create(name=f'Service {i}') for i in range(4)]
+            for i in range(8):
+                vendor = VendorProfile.objects.create(
+                    business_name=f'Prestataire {i}', description='-', is_active=True, is_featured=(i == 0)
+                )
+                vendor.service_types.add(*self.services)
+                vendor.cities.add(self.lome, kara)
+
+    def test_six_per_category_featured_first(self):
+        categories = _top_vendors_by_category(self.services)
+        self.assertEqual(len(categories), 4)
+        for category in categories:
+            names = [v.business_name for v in category['vendors']]
+            self.assertEqual(names, ['Prestataire 0'] + [f'Prestataire {i}' for i in range(7, 2, -1)])
+
+    def test_location_filter_does_not_duplicate_vendors(self):
+        categories = _top_vendors_by_category(self.services, country_id=str(self.lome.country_id))
+        names = [v.business_name for v in categories[0]['vendors']]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(names), 6)
+
+    def test_query_count_does_not_depend_on_category_count(self):
+        # Uniquement le classement (facettes et cartes déjà en mémoire)
+        get_facet_sets()
+        get_vendor_cards()
+        with self.assertNumQueries(1):
+            _top_vendors_by_category(self.services)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(4, 10):
+                service = ServiceType.objects.create(name=f'Service {i}')
+                service.vendors.add(*VendorProfile.objects.all())
+        services = list(ServiceType.objects.all())
+        get_facet_sets()
+        get_vendor_cards()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(_top_vendors_by_category(services)), 10)
+
+    def test_grid_fragment_is_cached_until_catalogue_changes(self):
+        response = self.client.get('/vendors/', {'city_id': self.lome.pk})
+        self.assertContains(response, 'Prestataire 7')
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/vendors/', {'city_id': self.lome.pk, 'service_types': []})
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/vendors/', {'city_id': self.lome.pk})
+        self.assertEqual(len(cold), len(warm))
+        self.assertFalse(any('ROW_NUMBER' in q['sql'] for q in warm.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            VendorProfile.objects.filter(business_name='Prestataire 7').first().save()
+        with CaptureQueriesContext(connection) as refreshed:
+            self.client.get('/vendors/', {'city_id': self.lome.pk})
+        self.assertTrue(any('ROW_NUMBER' in q['sql'] for q in refreshed.captured_queries))
+
+
+    def test_unmatched_service_filter_does_not_cache_empty_grid(self):
+        for value in ('', 'abc', '999999'):
+            response = self.client.get('/vendors/', {'service_types': value})
+            self.assertNotContains(response, 'Prestataire 7')
+        self.assertContains(self.client.get('/vendors/'), 'Prestataire 7')
+        response = self.client.get('/vendors/', {'service_types': [self.services[1].pk, 'abc']})
+        self.assertContains(response, 'Prestataire 7')
+
+
+class CategoryLoadMoreTests(TestCase):
+    """Tests pour le « Voir plus » d'une catégorie (pagination par clé)"""
+
+    def setUp(self):
+        togo = Country.objects.create(name='Togo', code='TG')
+        self.lome = City.objects.create(name='Lomé', country=togo)
+        self.kara = City.objects.create(name='Kara', country=togo)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service = ServiceType.objects.create(name='Traiteur')
+            for i in range(30):
+                vendor = VendorProfile.objects.create(
+                    business_name=f'Traiteur {i:02d}', description='-', is_active=True, is_featured=(i % 10 == 0)
+                )
+                vendor.service_types.add(self.service)
+                vendor.cities.add(self.lome if i % 2 else self.kara)
+
+    def _names(self, html):
+        return re.findall(r'Traiteur \d\d', html)
+
+    def test_pages_follow_the_preview_without_duplicates(self):
+        category = _top_vendors_by_category([self.service])[0]
+        self.assertEqual(category['total'], 30)
+        seen = [v.business_name for v in category['vendors']]
+        url = reverse('vendors:category_vendors', args=[self.service.pk])
+        cursor = category['next_cursor']
+        while cursor:
+            page = self.client.get(url, {'after': cursor}).json()
+            seen += self._names(page['html'])
+            cursor = page['next_cursor']
+
+        expected = [
+            v.business_name for v in VendorProfile.objects.order_by('-is_featured', '-created_at', '-pk')
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_location_filter_applies_to_following_pages(self):
+        category = _top_vendors_by_category([self.service], city_id=str(self.lome.pk))[0]
+        self.assertEqual(category['total'], 15)
+        url = reverse('vendors:category_vendors', args=[self.service.pk])
+        page = self.client.get(url, {'after': category['next_cursor'], 'city_id': self.lome.pk}).json()
+        names = self._names(page['html'])
+        self.assertEqual(len(names), 9)
+        self.assertTrue(all(int(name[-2:]) % 2 for name in names))
+        self.assertIsNone(page['next_cursor'])
+
+    def test_invalid_cursor_is_rejected(self):
+        url = reverse('vendors:category_vendors', args=[self.service.pk])
+        self.assertEqual(self.client.get(url, {'after': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_query_count_does_not_depend_on_depth(self):
+        url = reverse('vendors:category_vendors', args=[self.service.pk])
+        last = VendorProfile.objects.order_by('-is_featured', '-created_at', '-pk')
+        get_vendor_cards()
+        for vendor in (last[5], last[17]):
+            with self.assertNumQueries(1):
+                self.client.get(url, {'after': _category_cursor(vendor)})
+
+
+class VendorCardTests(TestCase):
+    """Tests pour la projection des cartes prestataires"""
+
+    def setUp(self):
+        togo = Country.objects.create(name='Togo', code='TG')
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor = VendorProfile.objects.create(
+                business_name='Studio Lumière', description='-', is_active=True, is_featured=True,
+            )
+            self.vendor.service_types.add(
+                ServiceType.objects.create(name='Vidéo'), ServiceType.objects.create(name='Photographie'),
+            )
+            self.vendor.cities.add(City.objects.create(name='Lomé', country=togo))
+            VendorProfile.objects.create(business_name='Inactif', description='-', is_active=False)
+
+    def _image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(buffer, 'JPEG')
+        return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_cards_hold_only_listing_fields(self):
+        cards = get_vendor_cards()
+        self.assertEqual(list(cards), [self.vendor.pk])
+        card = cards[self.vendor.pk]
+        self.assertEqual(card.slug, self.vendor.slug)
+        self.assertEqual(card.service_names, ('Photographie', 'Vidéo'))
+        self.assertEqual(card.city_names, ('Lomé',))
+        self.assertEqual((card.image_url, card.cover_url), ('', ''))
+        self.assertFalse(hasattr(card, '__dict__'))
+
+    def test_city_changes_refresh_cards(self):
+        get_vendor_cards()
+        city = City.objects.get(name='Lomé')
+        with self.captureOnCommitCallbacks(execute=True):
+            city.name = 'Lomé Centre'
+            city.save()
+        self.assertEqual(get_vendor_cards()[self.vendor.pk].city_names, ('Lomé Centre',))
+        with self.captureOnCommitCallbacks(execute=True):
+            city.delete()
+        self.assertEqual(get_vendor_cards()[self.vendor.pk].city_names, ())
+
+    def test_new_image_refreshes_cards_with_thumbnail(self):
+        get_vendor_cards()
+        with override_settings(MEDIA_ROOT=self.media.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                VendorImage.objects.create(vendor=self.vendor, image=self._image(), is_cover=True)
+            url = get_vendor_cards()[self.vendor.pk].image_url
+        self.assertIn('cover', url)
+        self.assertIn('600x600', url)
+
+    def test_home_keeps_full_cover_and_first_service(self):
+        with override_settings(MEDIA_ROOT=self.media.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.vendor.logo = self._image()
+                self.vendor.save()
+                VendorImage.objects.create(vendor=self.vendor, image=self._image(), is_cover=True)
+            card = get_vendor_cards()[self.vendor.pk]
+            response = self.client.get('/')
+        self.assertNotIn('600x600', card.cover_url)
+        self.assertContains(response, f'src="{card.cover_url}"')
+        self.assertNotContains(response, f'src="{card.image_url}"')
+        self.assertContains(response, '<span class="vcard-tag">Photographie</span>', count=1)
+        self.assertNotContains(response, '<span class="vcard-tag">Vidéo')
+
+    def test_home_renders_featured_cards_without_vendor_queries(self):
+        self.assertEqual(featured_cards(), [get_vendor_cards()[self.vendor.pk]])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertContains(response, 'Studio Lumière')
+        self.assertFalse(any('vendors_vendor' in q['sql'] for q in queries.captured_queries))
+
+
+class ConditionalGetTests(TestCase):
+    """Tests pour les réponses 304 (ETag / Last-Modified) des pages publiques"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor = VendorProfile.objects.create(business_name='Sono Max', description='-', is_active=True)
+        self.url = reverse('vendors:vendor_detail', args=[self.vendor.slug])
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_vendor_detail_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self._revalidate(self.url, response).status_code, 304)
+        # Last-Modified ne suivrait pas les publicités ni les prestataires similaires
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_csrf_token_comes_from_cookie_not_page(self):
+        response = self.client.get(self.url)
+        token = response.cookies['csrftoken'].value
+        self.assertNotContains(response, token)
+
+    def test_not_modified_skips_profile_queries(self):
+        response = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self._revalidate(self.url, response)
+        self.assertEqual(len([q for q in queries.captured_queries if 'vendors_' in q['sql']]), 1)
+
+    def test_new_image_or_ad_changes_validator(self):
+        response = self.client.get(self.url)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), 'blue').save(buffer, 'JPEG')
+        with override_settings(MEDIA_ROOT=self.media.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                VendorImage.objects.create(
+                    vendor=self.vendor, image=SimpleUploadedFile('p.jpg', buffer.getvalue(), content_type='image/jpeg'),
+                )
+            response = self._revalidate(self.url, response)
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Advertisement.objects.create(
+                zone=Advertisement.VENDOR_DETAIL, image='ads/a.jpg', alt_text='Pub',
+                start_date=timezone.localdate(), end_date=timezone.localdate(),
+            )
+        self.assertEqual(self._revalidate(self.url, response).status_code, 200)
+
+    def test_listing_is_keyed_by_catalogue_and_query(self):
+        url = reverse('vendors:vendor_list')
+        response = self.client.get(url)
+        self.assertEqual(self._revalidate(url, response).status_code, 304)
+        self.assertEqual(self._revalidate(f'{url}?country_id=1', response).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            VendorProfile.objects.create(business_name='Nouveau', description='-', is_active=True)
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+    def test_authenticated_users_always_get_full_page(self):
+        User.objects.create_user(username='client', password='Pass123!', user_type='client')
+        self.client.login(username='client', password='Pass123!')
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"x"').status_code, 200)
+
+
+class SimilarVendorTests(TestCase):
+    """Tests pour les « Prestataires similaires » précalculés"""
+
+    def setUp(self):
+        togo = Country.objects.create(name='Togo', code='TG')
+        lome = City.objects.create(name='Lomé', country=togo)
+        kara = City.objects.create(name='Kara', country=togo)
+        with self.captureOnCommitCallbacks(execute=True):
+            dj, photo = ServiceType.objects.create(name='DJ'), ServiceType.objects.create(name='Photographe')
+            self.vendors = {}
+            for name, service, city in [
+                ('DJ Lomé', dj, lome), ('DJ Kara', dj, kara),
+                ('Photo Lomé', photo, lome), ('Photo Kara', photo, kara),
+            ]:
+                vendor = VendorProfile.objects.create(business_name=name, description='-', is_active=True)
+                vendor.service_types.add(service)
+                vendor.cities.add(city)
+                self.vendors[name] = vendor
+
+    def _view(self, name, session='', ip=None):
+        ContactView.objects.create(vendor=self.vendors[name], session_key=session, ip_address=ip)
+
+    def _similar(self, name):
+        return list(
+            SimilarVendor.objects.filter(vendor=self.vendors[name]).values_list('similar__business_name', flat=True)
+        )
+
+    def test_cooccurrences_match_dense_product(self):
+        groups = np.array([0, 0, 0, 1, 1, 2, 2, 2, 0])
+        members = np.array([0, 1, 3, 1, 3, 0, 2, 3, 1])
+        keys, counts, degree = _cooccurrences(groups, members, 4)
+        dense = np.zeros((3, 4), dtype=int)
+        dense[groups, members] = 1
+        expected = dense.T @ dense
+        np.fill_diagonal(expected, 0)
+        result = np.zeros((4, 4), dtype=int)
+        result[np.divmod(keys, 4)] = counts
+        np.testing.assert_array_equal(result, expected)
+        np.testing.assert_array_equal(degree, dense.sum(axis=0))
+
+    def test_shared_services_then_cities_without_contacts(self):
+        build_similar_vendors()
+        self.assertEqual(self._similar('DJ Lomé'), ['DJ Kara', 'Photo Lomé'])
+
+    def test_co_viewed_vendors_rank_first(self):
+        for i in range(3):
+            self._view('DJ Lomé', session=f's{i}')
+            self._view('Photo Kara', session=f's{i}')
+        # Sans session, le visiteur est reconnu à son IP
+        self._view('DJ Lomé', ip='10.0.0.1')
+        self._view('Photo Lomé', ip='10.0.0.1')
+        build_similar_vendors()
+        self.assertEqual(self._similar('DJ Lomé'), ['Photo Kara', 'Photo Lomé', 'DJ Kara'])
+
+    def test_inactive_vendors_are_never_recommended(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendors['DJ Kara'].is_active = False
+            self.vendors['DJ Kara'].save()
+        build_similar_vendors()
+        self.assertNotIn('DJ Kara', self._similar('DJ Lomé'))
+        self.assertFalse(SimilarVendor.objects.filter(vendor=self.vendors['DJ Kara']).exists())
+
+    def test_detail_page_reads_recommendations_in_one_query(self):
+        build_similar_vendors()
+        get_vendor_cards()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vendors:vendor_detail', args=[self.vendors['DJ Lomé'].slug]))
+        self.assertContains(response, 'Prestataires similaires')
+        self.assertContains(response, 'DJ Kara')
+        self.assertEqual(len([q for q in queries.captured_queries if 'vendors_similarvendor' in q['sql']]), 1)
+
+
+class RevealContactTests(TestCase):
+    """Tests pour la révélation du numéro WhatsApp"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event_type = EventType.objects.create(name='Mariage')
+            self.vendor = VendorProfile.objects.create(
+                business_name='DJ Kofi', description='-', is_active=True, whatsapp='+228 90 00 00 00',
+            )
+        self.url = reverse('vendors:reveal_contact', args=[self.vendor.slug])
+        contact_log_buffer.flush()
+        self.addCleanup(contact_log_buffer.flush)
+
+    def _reveal(self, ip, **body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json', REMOTE_ADDR=ip)
+
+    def test_reveal_buffers_click_without_queries(self):
+        self._reveal('10.1.0.1')
+        with self.assertNumQueries(0):
+            response = self._reveal('10.1.0.1', event_type_id=self.event_type.pk)
+        self.assertEqual(response.json(), {'whatsapp': '+228 90 00 00 00'})
+        self.assertFalse(ContactView.objects.exists())
+        self.assertEqual(contact_log_buffer.flush(), 2)
+        self.assertEqual(ContactView.objects.latest('pk').event_type, self.event_type)
+
+    def test_application_number_change_refreshes_directory(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            vendor = VendorProfile.objects.create(business_name='Traiteur Afi', description='-', is_active=True)
+            application = VendorApplication.objects.create(
+                name='Afi', description='-', whatsapp='+228 92 00 00 00', vendor_profile=vendor,
+            )
+        url = reverse('vendors:reveal_contact', args=[vendor.slug])
+
+        def reveal():
+            return self.client.post(url, '{}', content_type='application/json', REMOTE_ADDR='10.1.0.10')
+        self.assertEqual(reveal().json(), {'whatsapp': '+228 92 00 00 00'})
+        with self.captureOnCommitCallbacks(execute=True):
+            application.whatsapp = '+228 93 00 00 00'
+            application.save()
+        self.assertEqual(reveal().json(), {'whatsapp': '+228 93 00 00 00'})
+
+    def test_new_application_keeps_catalogue_version(self):
+        version = get_catalogue_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            VendorApplication.objects.create(name='Kossi', description='-', whatsapp='+228 94 00 00 00')
+        self.assertEqual(get_catalogue_version(), version)
+
+    def test_flush_maintains_daily_rollup(self):
+        for ip in ('10.1.0.5', '10.1.0.6', '10.1.0.5'):
+            self._reveal(ip, event_type_id=self.event_type.pk)
+        self._reveal('10.1.0.5')
+        contact_log_buffer.flush()
+        self._reveal('10.1.0.7', event_type_id=self.event_type.pk)
+        contact_log_buffer.flush()
+        rows = ContactViewDaily.objects.filter(vendor=self.vendor).values_list('event_type_id', 'date', 'count')
+        today = timezone.localdate()
+        self.assertCountEqual(rows, [(self.event_type.pk, today, 4), (None, today, 1)])
+
+    def test_flush_skips_vendors_and_event_types_deleted_meanwhile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = VendorProfile.objects.create(
+                business_name='Photo Ama', description='-', is_active=True, whatsapp='+228 91 00 00 00',
+            )
+        self._reveal('10.1.0.9', event_type_id=self.event_type.pk)
+        self.client.post(
+            reverse('vendors:reveal_contact', args=[other.slug]), '{}',
+            content_type='application/json', REMOTE_ADDR='10.1.0.9',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+            self.event_type.delete()
+        contact_log_buffer.flush()
+        self.assertEqual(list(ContactView.objects.values_list('vendor_id', 'event_type_id')), [(self.vendor.pk, None)])
+        self.assertEqual(list(ContactViewDaily.objects.values_list('vendor_id', 'count')), [(self.vendor.pk, 1)])
+
+    def test_admin_statistics_read_the_rollup(self):
+        admin = User.objects.create_user(username='admin', password='Pass123!', user_type='admin')
+        self.client.force_login(admin)
+        for _ in range(3):
+            self._reveal('10.1.0.8')
+        contact_log_buffer.flush()
+        ContactViewDaily.objects.create(
+            vendor=self.vendor, date=timezone.localdate() - timedelta(days=40), count=5,
+        )
+        response = self.client.get(reverse('accounts:admin_vendor_detail', args=[self.vendor.pk]))
+        self.assertEqual(response.context['contact_views_total'], 8)
+        self.assertEqual(response.context['contact_views_30d'], 3)
+        dashboard = self.client.get(reverse('accounts:admin_dashboard'))
+        self.assertEqual([v.views_7d for v in dashboard.context['top_contacted_vendors']], [3])
+
+    def test_limit_per_ip(self):
+        for _ in range(100):
+            self.assertEqual(self._reveal('10.1.0.2').status_code, 200)
+        self.assertEqual(self._reveal('10.1.0.2').status_code, 429)
+        self.assertEqual(self._reveal('10.1.0.3').status_code, 200)
+
+    def test_unknown_or_inactive_vendor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.is_active = False
+            self.vendor.save()
+        self.assertEqual(self._reveal('10.1.0.4').status_code, 404)
+        self.assertEqual(len(contact_log_buffer), 0)
@@ -5,6 +5,8 @@ app_name = 'vendors'
 
 urlpatterns = [
     path('', views.vendor_list, name='vendor_list'),
+    path('recherche/suggestions/', views.vendor_suggestions, name='vendor_suggestions'),
+    path('categorie/<int:service_type_id>/suite/', views.category_vendors, name='category_vendors'),
     path('devenir-prestataire/', views.vendor_pitch, name='vendor_pitch'),
     path('devenir-prestataire/candidature/', views.vendor_signup, name='vendor_signup'),
     path('devenir-prestataire/candidature/portfolio/<str:token>/', views.vendor_signup_portfolio, name='vendor_signup_portfolio'),
@@ -0,0 +1,212 @@
+"""
+Classement sémantique hors ligne : vecteurs TF-IDF de n-grammes hachés.
+
+Chaque prestataire actif est représenté par les racines de ses mots et les
+trigrammes de caractères de son nom, de ses services (avec leurs mots-clés) et
+de sa description. Les trigrammes rapprochent des mots de même famille
+(« traditionnel » / « tradition », « mariage » / « marié ») sans qu'ils aient
+la même racine.
+
+La matrice (creuse, format CSR, lignes normalisées) est construite par la
+commande build_search_vectors et écrite sur disque en fichiers .npy séparés ;
+chaque worker les ouvre en mmap_mode='r' : les pages sont partagées par le
+système entre les workers au lieu d'être copiées.
+
+Si SEARCH_VECTORS_REBUILD_DELAY est défini, la matrice est aussi reconstruite
+en arrière-plan après une modification du catalogue (vendors/signals.py) ou
+quand elle n'existe pas encore (premier démarrage) : les modifications faites
+pendant ce délai sont regroupées dans une seule reconstruction, faite par un
+seul worker à la fois.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import VendorProfile
+from .search_index import stem, trigrams, words
+
+
+DIMENSIONS = 2 ** 18
+MIN_SCORE = 0.12
+MAX_RESULTS = 200
+_ARRAYS = ('ids', 'indptr', 'indices', 'data', 'rows', 'idf')
+_CURRENT = 'CURRENT'
+REBUILD_LOCK_KEY = 'search_vectors_rebuild'
+
+logger = logging.getLogger(__name__)
+
+
+def _features(text):
+    """Caractéristiques hachées (indice → occurrences) : racines et trigrammes"""
+    counts = Counter()
+    for word in words(text):
+        counts[zlib.crc32(f'w:{stem(word)}'.encode()) % DIMENSIONS] += 1
+        for gram in trigrams(word):
+            counts[zlib.crc32(f'g:{gram}'.encode()) % DIMENSIONS] += 1
+    return counts
+
+
+def _vendor_texts():
+    services = {}
+    links = VendorProfile.service_types.through.objects.filter(
+        vendorprofile__is_active=True,
+    ).values_list('vendorprofile_id', 'servicetype__name', 'servicetype__search_keywords')
+    for vendor_id, name, keywords in links:
+        services.setdefault(vendor_id, []).append(f"{name} {(keywords or '').replace(',', ' ')}")
+    vendors = VendorProfile.objects.filter(is_active=True).order_by('pk')
+    for pk, business_name, description in vendors.values_list('pk', 'business_name', 'description'):
+        yield pk, ' '.join([business_name, *services.get(pk, []), description or ''])
+
+
+def vectors_dir():
+    return Path(getattr(settings, 'SEARCH_VECTORS_DIR', settings.BASE_DIR / '.search_vectors'))
+
+
+def build_vectors(directory=None):
+    """Calcule la matrice TF-IDF et la publie atomiquement ; retourne le nombre de prestataires"""
+    directory = Path(directory or vectors_dir())
+    ids, docs = [], []
+    for pk, text in _vendor_texts():
+        ids.append(pk)
+        docs.append(_features(text))
+
+    df = np.zeros(DIMENSIONS, dtype=np.float32)
+    for counts in docs:
+        df[list(counts)] += 1
+    idf = (np.log((1 + len(docs)) / (1 + df)) + 1).astype(np.float32)
+
+    indptr = [0]
+    indices, data = [], []
+    for counts in docs:
+        cols = np.fromiter(counts, dtype=np.int32, count=len(counts))
+        cols.sort()
+        tf = np.array([1 + math.log(counts[c]) for c in cols], dtype=np.float32)
+        weights = tf * idf[cols]
+        norm = np.linalg.norm(weights)
+        indices.append(cols)
+        data.append(weights / norm if norm else weights)
+        indptr.append(indptr[-1] + len(cols))
+
+    indptr = np.array(indptr, dtype=np.int64)
+    arrays = {
+        'ids': np.array(ids, dtype=np.int64),
+        'indptr': indptr,
+        'indices': np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+        'data': np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+        # Ligne de chaque valeur non nulle : permet un produit matrice-vecteur par np.bincount
+        'rows': np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(indptr)),
+        'idf': idf,
+    }
+
+    # Nouvelle génération dans son propre répertoire, puis bascule de CURRENT
+    # (os.replace est atomique) : un worker ne lit jamais une matrice à moitié écrite
+    generation = f'{time.time_ns()}-{os.getpid()}'
+    target = directory / generation
+    target.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(target / f'{name}.npy', array)
+    (target / 'meta.json').write_text(json.dumps({'dimensions': DIMENSIONS, 'vendors': len(ids)}))
+    tmp = directory / f'{_CURRENT}.{generation}'
+    tmp.write_text(generation)
+    os.replace(tmp, directory / _CURRENT)
+
+    # On garde la génération précédente : un worker peut encore la lire
+    previous = sorted(p for p in directory.iterdir() if p.is_dir() and p.name != generation)
+    for old in previous[:-1]:
+        shutil.rmtree(old, ignore_errors=True)
+    return len(ids)
+
+
+class VectorIndex:
+    """Matrice chargée en mémoire partagée (mmap) pour une génération donnée"""
+
+    def __init__(self, path):
+        self.arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in _ARRAYS}
+
+    def query_vector(self, query):
+        counts = _features(query)
+        if not counts:
+            return None
+        idf = self.arrays['idf']
+        cols = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        weights = np.array([1 + math.log(counts[c]) for c in cols], dtype=np.float32) * idf[cols]
+        norm = np.linalg.norm(weights)
+        if not norm:
+            return None
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[cols] = weights / norm
+        return vector
+
+    def search(self, query, min_score=MIN_SCORE, limit=MAX_RESULTS):
+        """Identifiants classés par similarité cosinus décroissante (un seul passage vectorisé)"""
+        ids = self.arrays['ids']
+        vector = self.query_vector(query)
+        if vector is None or not len(ids):
+            return []
+        a = self.arrays
+        scores = np.bincount(a['rows'], weights=a['data'] * vector[a['indices']], minlength=len(ids))
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return ids[order].tolist()
+
+
+_lock = threading.Lock()
+_loaded = {'generation': None, 'index': None}
+
+
+def get_vector_index():
+    """Index de la génération courante, rechargé quand la commande en publie une nouvelle"""
+    directory = vectors_dir()
+    try:
+        generation = (directory / _CURRENT).read_text().strip()
+    except FileNotFoundError:
+        schedule_rebuild()
+        return None
+    if _loaded['generation'] != generation:
+        with _lock:
+            if _loaded['generation'] != generation:
+                _loaded['index'] = VectorIndex(directory / generation)
+                _loaded['generation'] = generation
+    return _loaded['index']
+
+
+def _rebuild():
+    try:
+        build_vectors()
+    except Exception:
+        logger.exception('Reconstruction des vecteurs de recherche impossible')
+    finally:
+        connection.close()
+
+
+def schedule_rebuild():
+    """
+    Reconstruit la matrice dans SEARCH_VECTORS_REBUILD_DELAY secondes, dans un
+    thread du worker ; sans effet si une reconstruction est déjà prévue (verrou
+    dans le cache partagé) ou si le délai n'est pas défini
+    """
+    delay = getattr(settings, 'SEARCH_VECTORS_REBUILD_DELAY', None)
+    if delay is None or not cache.add(REBUILD_LOCK_KEY, True, delay):
+        return
+    timer = threading.Timer(delay, _rebuild)
+    timer.daemon = True
+    timer.start()
+
+
+def vector_search(query):
+    index = get_vector_index()
+    return index.search(query) if index else []
@@ -1,32 +1,189 @@
+import hashlib
 import json
+from datetime import datetime
+from urllib.parse import urlencode
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST, condition
 from django.contrib import messages
 from django.conf import settings
 from django.core import signing
-from .models import VendorProfile, ContactView, VendorApplication, ServiceType
-from apps.core.cache_utils import get_cached_service_types, get_cached_event_types
-from apps.core.models import City, Country
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from .models import VendorProfile, VendorApplication, ServiceType
+from apps.core.cache_utils import (
+    catalogue_memo, get_cached_service_types, get_cached_event_types, get_catalogue_version, get_version,
+)
+from apps.core.conditional import make_etag, public_condition, public_pages_version
+from apps.core.ratelimit import RateLimiter, SlidingWindow
+from apps.core.reference_data import get_reference_bundle
 from apps.core.turnstile import verify_turnstile
+from .cards import cards_for, get_vendor_cards
+from .contact_log import log_contact
+from .facets import facet_counts, filter_vendor_ids
+from .similar import SIMILAR_VERSION_KEY, similar_vendor_ids
+from .suggestions import normalize_prefix, suggest
 from .tasks import send_application_confirmation, notify_admin_new_application, send_vendor_message
 
 
-def _build_cities_json():
-    cities_by_country = {}
-    for c in City.objects.filter(is_active=True).select_related('country').order_by('name'):
-        if c.country_id:
-            cities_by_country.setdefault(str(c.country_id), []).append({'id': c.id, 'name': c.name})
-    return json.dumps(cities_by_country)
+CATEGORY_PREVIEW_SIZE = 6
+CATEGORY_PAGE_SIZE = 12
 
 
-def _build_countries_list_json():
-    return json.dumps([
-        {'id': c.id, 'name': str(c)}
-        for c in Country.objects.filter(is_active=True).order_by('display_order', 'name')
-    ])
+def _located_vendors(country_id, city_id):
+    """
+    Sous-requête des prestataires de la ville (prioritaire) ou du pays, ou None.
+    Sous-requête plutôt qu'une jointure : un prestataire présent dans plusieurs
+    villes du pays ne doit apparaître qu'une fois.
+    """
+    if city_id.isdigit():
+        return VendorProfile.objects.filter(cities__id=city_id).values('pk')
+    if country_id.isdigit():
+        return VendorProfile.objects.filter(cities__country_id=country_id).values('pk')
+    return None
 
 
+def _category_cursor(vendor):
+    """Curseur signé après `vendor` dans l'ordre (mis en avant, date de création, id) décroissant"""
+    return signing.dumps(
+        [int(vendor.is_featured), vendor.created_at.isoformat(), vendor.pk], salt='vendors-category-page',
+    )
+
+
+def _top_vendors_by_category(service_types, country_id='', city_id='', per_category=CATEGORY_PREVIEW_SIZE):
+    """
+    Les `per_category` premiers prestataires actifs de chaque type de service
+    (mis en avant puis plus récents), en une requête classée par ROW_NUMBER()
+    sur la table de liaison ; les cartes viennent de la projection en mémoire.
+    """
+    links = VendorProfile.service_types.through.objects.filter(
+        servicetype_id__in=[s.id for s in service_types],
+        vendorprofile__is_active=True,
+    )
+    located = _located_vendors(country_id, city_id)
+    if located is not None:
+        links = links.filter(vendorprofile__in=located)
+    ranked = links.annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=F('servicetype_id'),
+            order_by=[
+                F('vendorprofile__is_featured').desc(),
+                F('vendorprofile__created_at').desc(),
+                F('vendorprofile_id').desc(),
+            ],
+        )
+    ).filter(rank__lte=per_category).values_list('servicetype_id', 'vendorprofile_id', 'rank')
+
+    by_service = {}
+    for service_id, vendor_id, rank in ranked:
+        by_service.setdefault(service_id, []).append((rank, vendor_id))
+    if not by_service:
+        return []
+    totals = facet_counts(country_id=country_id, city_id=city_id)['services']
+
+    categories = []
+    for service_type in service_types:
+        if service_type.id not in by_service:
+            continue
+        preview = cards_for(pk for _, pk in sorted(by_service[service_type.id]))
+        if not preview:
+            continue
+        total = totals.get(service_type.id, len(preview))
+        categories.append({
+            'service_type': service_type,
+            'vendors': preview,
+            'total': total,
+            'next_cursor': _category_cursor(preview[-1]) if total > len(preview) else None,
+        })
+    return categories
+
+
+CATEGORY_GRID_TIMEOUT = 60 * 60
+
+
+def _category_grid(service_types, filtered, country_id, city_id):
+    """
+    Grille des catégories rendue en HTML, en cache par jeu de filtres normalisé
+    et par version du catalogue : un succès évite les requêtes et le rendu.
+    La clé est tirée des types de services effectivement affichés : un filtre
+    (`filtered`) qui n'en retient aucun donne une grille vide, jamais mise en cache.
+    """
+    if filtered and not service_types:
+        return ''
+    services = sorted(str(s.id) for s in service_types) if filtered else []
+    # La ville prime sur le pays (voir _top_vendors_by_category)
+    location = f'city={city_id}' if city_id.isdigit() else f'country={country_id if country_id.isdigit() else ""}'
+    digest = hashlib.md5(f"services={','.join(services)}|{location}".encode()).hexdigest()
+    cache_key = f'vendor_grid:{get_catalogue_version()}:{digest}'
+
+    html = cache.get(cache_key)
+    if html is None:
+        vendors_by_category = _top_vendors_by_category(service_types, country_id, city_id)
+        location = {'country_id': country_id, 'city_id': city_id}
+        html = render_to_string('vendors/_category_grid.html', {
+            'vendors_by_category': vendors_by_category,
+            'location_query': urlencode({k: v for k, v in location.items() if v}),
+        }) if vendors_by_category else ''
+        cache.set(cache_key, html, CATEGORY_GRID_TIMEOUT)
+    return mark_safe(html)
+
+
+def category_vendors(request, service_type_id):
+    """
+    « Voir plus » d'une catégorie : page suivante en fragment HTML de cartes.
+    Pagination par clé (mis en avant, date de création, id) : le coût ne
+    dépend pas de la profondeur, contrairement à un OFFSET.
+    """
+    try:
+        featured, created_at, last_pk = signing.loads(
+            request.GET.get('after', ''), salt='vendors-category-page',
+        )
+        created_at = datetime.fromisoformat(created_at)
+    except (signing.BadSignature, ValueError, TypeError):
+        return JsonResponse({'error': 'Curseur invalide'}, status=400)
+
+    vendors = VendorProfile.objects.filter(is_active=True, service_types=service_type_id)
+    located = _located_vendors(request.GET.get('country_id', ''), request.GET.get('city_id', ''))
+    if located is not None:
+        vendors = vendors.filter(pk__in=located)
+    vendors = vendors.filter(
+        Q(is_featured__lt=bool(featured))
+        | Q(is_featured=bool(featured), created_at__lt=created_at)
+        | Q(is_featured=bool(featured), created_at=created_at, pk__lt=last_pk)
+    ).order_by('-is_featured', '-created_at', '-pk')
+
+    page = cards_for(vendors.values_list('pk', flat=True)[:CATEGORY_PAGE_SIZE + 1])
+    has_more = len(page) > CATEGORY_PAGE_SIZE
+    page = page[:CATEGORY_PAGE_SIZE]
+    return JsonResponse({
+        'html': render_to_string('vendors/_vendor_cards.html', {'vendors': page}),
+        'next_cursor': _category_cursor(page[-1]) if has_more else None,
+    })
+
+
+def _facet_context(service_types, countries, counts):
+    """Compteurs de facettes prêts pour le gabarit (chips, liste des pays, villes en JS)"""
+    return {
+        'service_facets': [(s, counts['services'].get(s.id, 0)) for s in service_types],
+        'country_facets': [(c, counts['countries'].get(c['id'], 0)) for c in countries],
+        'city_counts_json': json.dumps({str(pk): n for pk, n in counts['cities'].items()}),
+    }
+
+
+def _vendor_list_etag(request):
+    # Première page d'une recherche : toujours servie, pour qu'elle soit journalisée (log_search)
+    if request.GET.get('search', '').strip() and not request.GET.get('cursor'):
+        return None
+    return make_etag(public_pages_version(), request.get_full_path())
+
+
+@public_condition(etag_func=_vendor_list_etag)
 def vendor_list(request):
     """Liste publique des prestataires — catégories ou résultats de recherche"""
     service_type_ids = request.GET.getlist('service_types')
@@ -40,9 +197,8 @@ def vendor_list(request):
         'service_types': all_service_types,
         'selected_service_types': service_type_ids,
         'search_query': search,
-        'total_vendors': VendorProfile.objects.filter(is_active=True).count(),
-        'countries': Country.objects.filter(is_active=True).order_by('display_order', 'name'),
-        'cities_json': _build_cities_json(),
+        'total_vendors': len(get_vendor_cards()),
+        'countries': get_reference_bundle().data['countries'],
         'selected_country_id': country_id,
         'selected_city_id': city_id,
         'breadcrumbs': [
@@ -51,12 +207,33 @@ def vendor_list(request):
         ],
     }
 
+    filters = (service_type_ids, country_id, city_id)
     if search:
-        from .search import semantic_search
-        results = semantic_search(search, limit=20)
+        from .search import ranked_vendor_ids, search_page
+        cursor = request.GET.get('cursor')
+        matches = ranked_vendor_ids(search)
+        allowed = filter_vendor_ids(*filters, base=matches) if any(filters) else None
+        results, next_cursor, total = search_page(search, cursor, vendor_ids=allowed)
+        if not cursor:
+            from .search_log import log_search
+            log_search(search, total, {
+                key: value for key, value in (
+                    ('service_types', service_type_ids), ('country_id', country_id), ('city_id', city_id),
+                ) if value
+            })
+        # Lien « Voir plus » : mêmes filtres que la page courante, seul le curseur change
+        next_page_query = ''
+        if next_cursor:
+            params = request.GET.copy()
+            params['cursor'] = next_cursor
+            next_page_query = params.urlencode()
         return render(request, 'vendors/vendor_list.html', {
             **base_context,
+            **_facet_context(all_service_types, base_context['countries'], facet_counts(*filters, base=matches)),
             'search_results': results,
+            'search_total': total,
+            'next_cursor': next_cursor,
+            'next_page_query': next_page_query,
             'is_search': True,
         })
 
@@ -65,26 +242,50 @@ def vendor_list(request):
     else:
         active_service_types = all_service_types
 
-    vendors_by_category = []
-    for service_type in active_service_types:
-        qs = VendorProfile.objects.filter(is_active=True, service_types=service_type)
-        if city_id:
-            qs = qs.filter(cities__id=city_id)
-        elif country_id:
-            qs = qs.filter(cities__country_id=country_id)
-        qs = qs.prefetch_related(
-            'cities', 'service_types', 'images'
-        ).order_by('-is_featured', '-created_at').distinct()[:6]
-        if qs.exists():
-            vendors_by_category.append({'service_type': service_type, 'vendors': qs})
-
     return render(request, 'vendors/vendor_list.html', {
         **base_context,
-        'vendors_by_category': vendors_by_category,
+        **_facet_context(all_service_types, base_context['countries'], facet_counts(*filters)),
+        'category_grid': _category_grid(active_service_types, bool(service_type_ids), country_id, city_id),
         'is_search': False,
     })
 
 
+def _suggestions_etag(request):
+    prefix = normalize_prefix(request.GET.get('q', ''))
+    return hashlib.md5(f'{get_catalogue_version()}:{prefix}'.encode()).hexdigest()
+
+
+@cache_control(public=True, max_age=300)
+@condition(etag_func=_suggestions_etag)
+def vendor_suggestions(request):
+    """Autocomplétion de la recherche : types de services et prestataires pour un préfixe"""
+    return JsonResponse(suggest(request.GET.get('q', '')))
+
+
+def _vendor_updated_at(request, slug):
+    """
+    Date de dernière modification de la fiche (photos, services et villes
+    l'avancent aussi, voir signals._touch_vendors), lue une fois par requête
+    """
+    if not hasattr(request, '_vendor_updated_at'):
+        request._vendor_updated_at = VendorProfile.objects.filter(
+            slug=slug, is_active=True,
+        ).values_list('updated_at', flat=True).first()
+    return request._vendor_updated_at
+
+
+def _vendor_detail_etag(request, slug):
+    updated_at = _vendor_updated_at(request, slug)
+    if updated_at is None:
+        return None
+    return make_etag(slug, updated_at.isoformat(), public_pages_version(), get_version(SIMILAR_VERSION_KEY))
+
+
+# Pas de Last-Modified : l'ETag dépend aussi du catalogue, des publicités et des
+# prestataires similaires, que updated_at ne suit pas. Le jeton CSRF est lu
+# dans le cookie : la page revalidée (304) peut être plus ancienne que lui.
+@ensure_csrf_cookie
+@public_condition(etag_func=_vendor_detail_etag)
 def vendor_detail(request, slug):
     """Détails publics d'un prestataire"""
     vendor = get_object_or_404(
@@ -96,6 +297,7 @@ def vendor_detail(request, slug):
     )
     context = {
         'vendor': vendor,
+        'similar_vendors': cards_for(similar_vendor_ids(vendor.pk)),
         'event_types': get_cached_event_types(),
         'breadcrumbs': [
             {'title': 'Accueil', 'url': 'core:home'},
@@ -112,21 +314,33 @@ def vendor_detail_by_pk(request, pk):
     return redirect('vendors:vendor_detail', slug=vendor.slug, permanent=True)
 
 
-@require_POST
-def reveal_contact(request, slug):
-    """Trace le clic en base et retourne le numéro WhatsApp"""
-    from django.utils import timezone
-    from datetime import timedelta
-    from apps.projects.models import EventType
+@catalogue_memo
+def _contact_directory():
+    """slug → (id, numéro WhatsApp) des prestataires actifs, celui de la candidature à défaut"""
+    vendors = VendorProfile.objects.filter(is_active=True).values_list(
+        'slug', 'pk', 'whatsapp', 'source_application__whatsapp',
+    )
+    return {
+        slug: (pk, whatsapp or application_whatsapp or None)
+        for slug, pk, whatsapp, application_whatsapp in vendors
+    }
 
-    vendor = get_object_or_404(VendorProfile, slug=slug, is_active=True)
 
-    whatsapp = vendor.whatsapp
-    if not whatsapp:
-        try:
-            whatsapp = vendor.source_application.whatsapp
-        except Exception:
-            whatsapp = None
+# 100 révélations par IP et par heure ; les clics refusés ne prolongent pas le blocage
+reveal_limiter = RateLimiter('reveal', SlidingWindow(100, 60 * 60), count_rejected=False)
+
+
+@require_POST
+def reveal_contact(request, slug):
+    """
+    Trace le clic et retourne le numéro WhatsApp. Prestataire, limite par IP et
+    type d'événement sont lus en mémoire ou dans le cache, et le clic est écrit
+    par lots (contact_log.py) : aucune requête SQL pendant la requête HTTP.
+    """
+    try:
+        vendor_id, whatsapp = _contact_directory()[slug]
+    except KeyError:
+        raise Http404
 
     if not whatsapp:
         return JsonResponse({'error': 'Aucun numéro disponible'}, status=404)
@@ -134,22 +348,20 @@ def reveal_contact(request, slug):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR')
 
-    # Rate limit : 100 révélations par IP par heure
-    one_hour_ago = timezone.now() - timedelta(hours=1)
-    if ContactView.objects.filter(ip_address=ip, viewed_at__gte=one_hour_ago).count() >= 100:
+    if not reveal_limiter.hit(ip):
         return JsonResponse({'error': 'Limite atteinte, réessayez dans une heure.'}, status=429)
 
     try:
         body = json.loads(request.body or b'{}')
     except ValueError:
         body = {}
-    event_type = EventType.objects.filter(pk=body.get('event_type_id')).first()
+    event_types = {str(event_type.pk): event_type.pk for event_type in get_cached_event_types()}
 
-    ContactView.objects.create(
-        vendor=vendor,
-        event_type=event_type,
+    log_contact(
+        vendor_id=vendor_id,
+        event_type_id=event_types.get(str(body.get('event_type_id'))),
         ip_address=ip,
-        user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
         session_key=request.session.session_key or '',
     )
 
@@ -159,8 +371,6 @@ def reveal_contact(request, slug):
 def vendor_signup(request):
     """Formulaire public de candidature prestataire (étape 1 : infos + logo)"""
     service_types = ServiceType.objects.all().order_by('name')
-    cities_json = _build_cities_json()
-    countries_list_json = _build_countries_list_json()
 
     locations_json_val = '[]'
 
@@ -241,8 +451,6 @@ def vendor_signup(request):
 
     return render(request, 'vendors/vendor_signup.html', {
         'service_types': service_types,
-        'cities_json': cities_json,
-        'countries_list_json': countries_list_json,
         'locations_json': locations_json_val,
         'turnstile_sitekey': settings.TURNSTILE_SITEKEY,
         'breadcrumbs': [
@@ -16,6 +16,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Third party
     'easy_thumbnails',
     # LysAngels apps
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,7 +44,8 @@ ROOT_URLCONF = 'lysangels.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, avec la durée de rendu comptée dans l'en-tête Server-Timing
+        'BACKEND': 'apps.core.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +66,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'lysangels.wsgi.application'
 
+# Vide les tampons d'écriture avant la suppression des bases de test (apps/core/test_runner.py)
+TEST_RUNNER = 'apps.core.test_runner.BufferSafeDiscoverRunner'
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -137,6 +143,30 @@ CACHES = {
     }
 }
 
+# Compteurs des limites de débit (apps/core/ratelimit.py) : 'cache' ou 'sqlite'
+# (fichier local partagé par les workers, atomique quel que soit le cache)
+RATELIMIT_STORE = config('RATELIMIT_STORE', default='cache')
+RATELIMIT_SQLITE_PATH = BASE_DIR / '.ratelimit.sqlite3'
+
+# Part des requêtes comptées dans les latences par route (apps/core/timing.py)
+SERVER_TIMING_SAMPLE_RATE = config('SERVER_TIMING_SAMPLE_RATE', default=0.1, cast=float)
+
+# Requêtes SQL plus longues que ce seuil (ms) regroupées par forme et par vue
+# (apps/core/slow_queries.py) ; vide = désactivé, 0 = toutes les requêtes
+SLOW_QUERY_THRESHOLD_MS = config(
+    'SLOW_QUERY_THRESHOLD_MS', default='', cast=lambda value: float(value) if value not in (None, '') else None,
+)
+
+# Recherche de prestataires : 'index' (index inversé en mémoire, tout SGBD),
+# 'postgres' (plein texte + GIN, repli sur 'index' hors PostgreSQL)
+# ou 'vectors' (TF-IDF seul, aussi utilisé en repli quand rien ne correspond)
+VENDOR_SEARCH_BACKEND = config('VENDOR_SEARCH_BACKEND', default='index')
+# Matrices TF-IDF écrites par `manage.py build_search_vectors`, lues en mmap par les workers
+SEARCH_VECTORS_DIR = BASE_DIR / '.search_vectors'
+# Délai (s) avant leur reconstruction automatique après une modification du
+# catalogue ; None = seulement par la commande (dev, tests)
+SEARCH_VECTORS_REBUILD_DELAY = None
+
 # Cloudflare Turnstile anti-bot
 TURNSTILE_SITEKEY = config('TURNSTILE_SITEKEY')
 TURNSTILE_SECRET  = config('TURNSTILE_SECRET')
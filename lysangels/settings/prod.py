@@ -22,6 +22,13 @@ DATABASES = {
 }
 
 
+# Recherche — plein texte PostgreSQL (vecteurs remplis par la migration vendors 0024 puis à chaque
+# modification ; `manage.py update_search_vectors` pour tout recalculer à la main)
+VENDOR_SEARCH_BACKEND = os.environ.get('VENDOR_SEARCH_BACKEND', 'postgres')
+# Vecteurs TF-IDF (repli de la recherche) reconstruits en arrière-plan, sans bloquer le démarrage
+SEARCH_VECTORS_REBUILD_DELAY = 60
+
+
 # Security
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 SECURE_SSL_REDIRECT = False
@@ -36,14 +43,36 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 SECURE_REFERRER_POLICY = 'same-origin'
 
 
-# Cache — répertoire persistant dans le projet (survit aux redémarrages)
+# Cache — répertoire persistant dans le projet (survit aux redémarrages), derrière
+# un LRU en mémoire de chaque worker pour les clés lues à chaque requête
+# (apps/core/cache_backends.py) : données de référence et versions deviennent
+# des lectures de dictionnaire, le répertoire n'est relu qu'une fois par seconde
 CACHES = {
     'default': {
+        'BACKEND': 'apps.core.cache_backends.TwoTierCache',
+        'LOCATION': 'lysangels-l1',
+        'OPTIONS': {
+            'L2': 'shared',
+            'LOCAL_PREFIXES': [
+                'service_types', 'event_types', 'site_settings',
+                'catalogue_version', 'reference_version', 'ads_version', 'similar_vendors_version',
+            ],
+            # Clés versionnées ou par chemin de fichier : leur valeur ne change jamais
+            'IMMUTABLE_PREFIXES': ['dataset:', 'card_thumb:', 'vendor_grid:'],
+            'MAX_ENTRIES': 2000,
+            'L1_TIMEOUT': 300,
+            'GENERATION_INTERVAL': 1,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': str(BASE_DIR / '.cache'),
-    }
+    },
 }
 
+# FileBasedCache n'a pas d'incrément atomique : compteurs de débit dans SQLite
+RATELIMIT_STORE = 'sqlite'
+
 
 # Static files — servis par Caddy
 STATIC_URL = '/static/'